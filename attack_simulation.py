@@ -1,7 +1,10 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from collections import defaultdict
-from sklearn.metrics import mean_absolute_error, mean_squared_error
+
+from metrics import mean_absolute_error, mean_squared_error
+from swarm_state import SwarmState
+from visualization import SwarmPlot
 
 # === Класс DroneNode ===
 class DroneNode:
@@ -122,23 +125,9 @@ rmse_rec  = np.sqrt(mse_rec)
 fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
 
 # --- Subplot 1: позиции и GNSS / INS / Recovered ---
-ax1.set_title("SwarmRaft: Positions & GNSS Spoofing")
-for d in drones:
-    ax1.scatter(*d.x_true, color='green', s=100, zorder=1, label='True' if d.id==0 else "")
-    ax1.scatter(*d.x_ins,  color='red',   marker='^', s=100, zorder=2, label='INS'  if d.id==0 else "")
-    ax1.scatter(*final_attacked[d.id], color='black', marker='*', s=120, zorder=3,
-                label='Recovered' if d.id==0 else "")
-    ax1.plot( d.z_gnss[0], d.z_gnss[1],
-              marker='x', markersize=14, markeredgewidth=3,
-              color='blue', zorder=4, label='GNSS' if d.id==0 else "" )
-    ax1.text(d.x_true[0]+0.3, d.x_true[1]+0.3, f"D{d.id}", fontsize=9, zorder=5)
-for fid in faulty_attacked:
-    fp = final_attacked[fid]
-    ax1.text(fp[0], fp[1]-1, "FAULT", color='crimson', fontsize=10,
-             ha='center', zorder=5)
-ax1.set_xlim(0,22); ax1.set_ylim(0,22)
-ax1.grid(True); ax1.set_aspect('equal', 'box')
-ax1.legend(loc='upper right')
+# Каждый слой (True, INS, Recovered, GNSS, FAULT) — одна коллекция, см. visualization.py
+SwarmPlot(ax1, N, extent=(0, 22, 0, 22), title="SwarmRaft: Positions & GNSS Spoofing").update(
+    SwarmState.from_drones(drones), final_attacked, faulty_attacked)
 
 # --- Subplot 2: bar-chart ошибок ---
 ax2.set_title("Error Comparison")
@@ -0,0 +1,180 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import kernels
+from instrumentation import Instrumentation
+from leader_node import LeaderNode
+from swarm_state import SwarmState
+
+PHASES = ("ranging", "fusion", "voting", "detection", "recovery")
+DEFAULT_N = [5, 10, 50, 100, 500, 1000, 2000, 5000, 10000]
+DEFAULT_FRACTIONS = [0.0, 0.1, 0.25, 0.5]
+
+
+def estimate_bytes(n, k=None, dim=2, backend=None):
+    """
+    Грубая оценка пиковой памяти шага консенсуса: тензор фьюзинга и ~6 временных массивов той же формы.
+    Для бэкендов без материализации тензора — веса alpha, голоса и маски на пару (~2 float64)
+    плюс бюджет временных массивов плиток (tiled).
+    """
+    pairs = n * (n if k is None else k)
+    kernel = kernels.get_backend(backend)
+    if not kernel.materializes_fused:
+        return 2 * pairs * 8 + getattr(kernel, "memory_budget", 0)
+    return 6 * pairs * dim * 8
+
+
+def _run_case(positions, n_attacked, f, k, bias, backend):
+    """Один шаг: генерация состояния (ranging) и step_consensus; возвращает (время ranging, лидер, инструментация)."""
+    t0 = time.perf_counter()
+    state = SwarmState.generate(positions, k=k)
+    ranging = time.perf_counter() - t0
+    state.z_gnss[:n_attacked] += np.array([bias, -bias])
+    instrumentation = Instrumentation()
+    leader = LeaderNode(state, instrumentation=instrumentation, backend=backend)
+    leader.T = 2 * np.sqrt(leader.gnss_var + leader.range_noise_std ** 2)
+    leader.step_consensus(f=f)
+    return ranging, leader, instrumentation
+
+
+def bench_case(n, attack_fraction, k=None, repeats=3, bias=15.0, seed=0, backend=None):
+    """
+    Замер одной точки (N, доля атакованных): время каждой фазы step_consensus и ranging, пиковая память.
+    Время меряется без tracemalloc (он замедляет каждое выделение памяти), пик памяти — отдельным
+    прогоном того же первого повтора.
+    :param backend: бэкенд ядра консенсуса (см. kernels)
+    :return: словарь с минимальным по повторам временем фаз (с) и пиковой памятью (байт)
+    """
+    f = max(int(round(attack_fraction * n)), 1)
+    n_attacked = int(round(attack_fraction * n))
+    best = {phase: np.inf for phase in PHASES}
+    counters = {}
+
+    def positions(r):
+        np.random.seed(seed + r)
+        return np.random.rand(n, 2) * 20 * np.sqrt(n / 5)
+
+    for r in range(repeats):
+        ranging, leader, instrumentation = _run_case(positions(r), n_attacked, f, k, bias, backend)
+        record = instrumentation.records[-1]
+        counters = record["counters"]
+        best["ranging"] = min(best["ranging"], ranging)
+        for phase in PHASES[1:]:
+            best[phase] = min(best[phase], record["phases"][phase])
+
+    tracemalloc.start()
+    try:
+        _run_case(positions(0), n_attacked, f, k, bias, backend)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "N": n, "attack_fraction": attack_fraction, "k": k, "f": f, "backend": leader.backend.name,
+        "num_faulty": counters.get("nodes_flagged", 0),
+        "pairs_evaluated": counters.get("pairs_evaluated", 0),
+        **{f"{phase}_s": best[phase] for phase in PHASES},
+        "total_s": sum(best.values()),
+        "peak_bytes": peak,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(n_values=DEFAULT_N, fractions=DEFAULT_FRACTIONS, k=None, repeats=3, mem_budget=4e9, backend=None):
+    """
+    Полный свип бенчмарка. Точки, чья оценка памяти превышает mem_budget, пропускаются.
+    :return: словарь {"meta": ..., "results": [...]}
+    """
+    results = []
+    for n in n_values:
+        for fraction in fractions:
+            if estimate_bytes(n, k, backend=backend) > mem_budget:
+                results.append({"N": n, "attack_fraction": fraction, "k": k, "skipped": "memory budget"})
+                print(f"N={n:>6} attack={fraction:.2f}: skipped (estimated memory over budget)")
+                continue
+            row = bench_case(n, fraction, k=k, repeats=repeats, backend=backend)
+            results.append(row)
+            print(f"N={n:>6} attack={fraction:.2f}: total={row['total_s'] * 1e3:9.2f} ms, "
+                  + ", ".join(f"{p}={row[p + '_s'] * 1e3:.2f}" for p in PHASES)
+                  + f", peak={row['peak_bytes'] / 2 ** 20:.1f} MiB")
+    meta = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeats": repeats,
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(current, baseline, tolerance=0.2, min_seconds=1e-3):
+    """
+    Сравнение с сохранённым baseline (точки сопоставляются по N, доле атакованных, k и бэкенду):
+    регрессия — фаза медленнее более чем на tolerance (и на min_seconds в абсолюте, чтобы не ловить шум)
+    или пиковая память больше более чем на tolerance.
+    :return: список строк с описанием регрессий
+    """
+    def key(row):
+        return row["N"], row["attack_fraction"], row.get("k"), row.get("backend")
+
+    base = {key(r): r for r in baseline["results"] if "skipped" not in r}
+    regressions = []
+    for row in current["results"]:
+        old = base.get(key(row))
+        if old is None or "skipped" in row:
+            continue
+        for metric in [p + "_s" for p in PHASES] + ["total_s"]:
+            if row[metric] > old[metric] * (1 + tolerance) and row[metric] - old[metric] > min_seconds:
+                regressions.append(f"N={row['N']} attack={row['attack_fraction']} backend={row['backend']}: {metric} "
+                                   f"{old[metric] * 1e3:.2f} -> {row[metric] * 1e3:.2f} ms")
+        if row["peak_bytes"] > old["peak_bytes"] * (1 + tolerance):
+            regressions.append(f"N={row['N']} attack={row['attack_fraction']} backend={row['backend']}: peak_bytes "
+                               f"{old['peak_bytes']} -> {row['peak_bytes']}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling benchmark for SwarmRaft consensus hot paths")
+    parser.add_argument("--n_values", type=int, nargs="+", default=DEFAULT_N)
+    parser.add_argument("--fractions", type=float, nargs="+", default=DEFAULT_FRACTIONS)
+    parser.add_argument("--k", type=int, default=None, help="benchmark neighbor-limited (sparse) consensus")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--backend", default=None, help="consensus kernel backend: numpy, numba, tiled or auto")
+    parser.add_argument("--mem_budget_gb", type=float, default=4.0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.n_values, args.fractions, k=args.k, repeats=args.repeats,
+                            mem_budget=args.mem_budget_gb * 1e9, backend=args.backend)
+    with open(args.output, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"\n✅ Results saved as: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare(report, json.load(fh), tolerance=args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) vs {args.baseline}:")
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print(f"\nNo regressions vs {args.baseline}")
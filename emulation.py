@@ -0,0 +1,419 @@
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from instrumentation import Histogram
+from leader_node import LeaderNode
+from spatial_index import neighbor_graph
+from swarm_state import SwarmState
+
+STREAMS = ("gnss", "ins", "range")
+OPEN, STOP = 0, 1      # ячейки control: открытый кадр, флаг остановки
+WRITES = len(STREAMS)  # столбец produced с числом публикаций блока
+ALIGN = 64
+POLL_S = 1e-3          # максимальный сон процесса-дрона между проверками кадра
+
+
+def buffer_layout(n, dim, workers, slots, width=None):
+    """
+    Раскладка общего сегмента памяти: имя -> (форма, dtype). Кольца — первая ось slots:
+    кадр f лежит в слоте f % slots, строки дрона пишет только процесс-владелец.
+    :param width: число столбцов графа соседей K; None — полный ranging, расстояния (N, N)
+    """
+    ring = (slots, n)
+    layout = {
+        "x_true": (ring + (dim,), np.float64),
+        "z_gnss": (ring + (dim,), np.float64),
+        "x_ins": (ring + (dim,), np.float64),
+        "ranges": (ring + (n if width is None else width,), np.float64),
+        "t_gnss": (ring, np.float64),
+        "t_ins": (ring, np.float64),
+        "t_range": (ring, np.float64),
+        # seqlock слота группы: счётчик записей растёт монотонно — нечётный, пока запись идёт, чётный после;
+        # frames — номер кадра, записанного в слот (-1 — пусто). Повторная запись того же кадра меняет счётчик
+        "stamps": ((slots, workers), np.int64),
+        "frames": ((slots, workers), np.int64),
+        "produced": ((workers, len(STREAMS) + 1), np.int64),
+        "control": ((2,), np.int64),
+        "origin": ((n, dim), np.float64),    # траектория x_true(t) = origin + velocity * (t - t0)
+        "velocity": ((n, dim), np.float64),
+    }
+    if width is not None:
+        layout["neighbors"] = ((n, width), np.int64)
+    return layout
+
+
+class SharedSwarmBuffer:
+    def __init__(self, layout, name=None):
+        """
+        Кольцевые буферы измерений роя в одном сегменте multiprocessing.shared_memory: массивы
+        фиксированного dtype по раскладке buffer_layout, выровненные по 64 байта.
+        :param layout: словарь имя -> (форма, dtype)
+        :param name: имя существующего сегмента (None — создать новый)
+        """
+        offsets, size = {}, 0
+        for key, (shape, dtype) in layout.items():
+            offsets[key] = size
+            size += -(-int(np.prod(shape)) * np.dtype(dtype).itemsize // ALIGN) * ALIGN
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=max(size, 1))
+        self.arrays = {key: np.ndarray(shape, dtype, buffer=self.shm.buf, offset=offsets[key])
+                       for key, (shape, dtype) in layout.items()}
+        if self.owner:
+            self.arrays["stamps"][:] = 0
+            self.arrays["frames"][:] = -1
+            self.arrays["control"][:] = 0
+            self.arrays["produced"][:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        self.arrays = {}  # представления держат буфер: без них close() не сможет освободить отображение
+        try:
+            self.shm.close()
+        except BufferError:  # снимки ещё ссылаются на сегмент — отображение освободится вместе с ними
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+
+def _drone_worker(name, layout, worker, rows, rates, noise, spoofed, spoof_offset, seed, t0):
+    """
+    Процесс группы дронов rows: измерения каждого потока со своей частотой, публикация блока строк
+    в открытый лидером кадр (при новом измерении или смене кадра).
+    """
+    np.random.seed(seed)
+    buffer = SharedSwarmBuffer(layout, name)
+    a = buffer.arrays
+    lo, hi = rows
+    block = slice(lo, hi)
+    gnss_std, ins_std, drift_std, range_std = noise
+    sparse = "neighbors" in a
+    periods = [1.0 / rate for rate in rates]
+    latest = {key: np.array(a[key][0, block]) for key in ("z_gnss", "x_ins", "ranges")}
+    times = {stream: np.zeros(hi - lo) for stream in STREAMS}
+    bias = np.zeros((hi - lo, a["origin"].shape[1]))
+    counts = a["produced"][worker]
+
+    def true_positions(t, idx=block):
+        return a["origin"][idx] + a["velocity"][idx] * (t - t0)
+
+    def sample(stream, t):
+        x = true_positions(t)
+        if stream == "gnss":
+            latest["z_gnss"][:] = x + np.random.normal(0, gnss_std, size=x.shape)
+            latest["z_gnss"][spoofed] += spoof_offset
+        elif stream == "ins":
+            bias[:] += np.random.normal(0, drift_std, size=bias.shape)
+            latest["x_ins"][:] = x + bias + np.random.normal(0, ins_std, size=x.shape)
+        elif sparse:
+            # Строка i — расстояния от соседей до дрона i (ranging двусторонний, пишет владелец i)
+            neighbors = a["neighbors"][block]
+            diff = x[:, None, :] - true_positions(t, neighbors)
+            dist = np.sqrt(np.einsum("ijk,ijk->ij", diff, diff))
+            latest["ranges"][:] = np.where(neighbors >= 0, dist + np.random.normal(0, range_std, size=dist.shape),
+                                           np.nan)
+        else:
+            # Строка j — измерения дрона j до всех (как ranges[j, i] в SwarmState)
+            diff = x[:, None, :] - true_positions(t, slice(None))[None, :, :]
+            dist = np.sqrt(np.einsum("ijk,ijk->ij", diff, diff))
+            dist += np.random.normal(0, range_std, size=dist.shape)
+            dist[np.arange(hi - lo), np.arange(lo, hi)] = np.nan
+            latest["ranges"][:] = dist
+        times[stream][:] = t
+
+    def publish(frame, t):
+        slot = frame % len(a["stamps"])
+        a["stamps"][slot, worker] += 1
+        a["frames"][slot, worker] = frame
+        a["x_true"][slot, block] = true_positions(t)
+        for key, values in latest.items():
+            a[key][slot, block] = values
+        for stream in STREAMS:
+            a["t_" + stream][slot, block] = times[stream]
+        a["stamps"][slot, worker] += 1
+        counts[WRITES] += 1
+
+    next_due = [time.monotonic()] * len(STREAMS)
+    written = -1
+    try:
+        while not a["control"][STOP]:
+            now = time.monotonic()
+            fresh = False
+            for s, stream in enumerate(STREAMS):
+                if now >= next_due[s]:
+                    sample(stream, now)
+                    counts[s] += 1
+                    fresh = True
+                    # Отставший поток не догоняет пропущенные измерения
+                    next_due[s] = max(next_due[s] + periods[s], now)
+            frame = int(a["control"][OPEN])
+            if fresh or frame != written:
+                publish(frame, now)
+                written = frame
+            time.sleep(max(min(min(next_due) - time.monotonic(), POLL_S), 0.0))
+    finally:
+        counts = a = None
+        buffer.close()
+
+
+class Snapshot:
+    def __init__(self, state, frame, stamps, read_time, staleness):
+        self.state = state          # SwarmState — представления слота кадра, без копирования
+        self.frame = frame
+        self.stamps = stamps        # счётчики seqlock слота на момент чтения
+        self.read_time = read_time
+        self.staleness = staleness  # {поток: (N,) возраст измерения на момент чтения, с}
+
+
+class DroneEmulation:
+    def __init__(self, positions, velocities=None, workers=2, gnss_rate=10.0, ins_rate=50.0, range_rate=5.0,
+                 slots=4, radius=None, k=None, spoofed=(), spoof_offset=(15.0, -15.0), gnss_noise_std=1.0,
+                 ins_noise_std=0.5, ins_drift_std=0.01, range_noise_std=0.2, seed=None):
+        """
+        Эмуляция роя в отдельных процессах: каждый процесс-дрон (группа дронов) выдаёт GNSS/INS/ranging
+        со своими частотами и пишет их в кольцевые буферы shared_memory; лидер каждую эпоху открывает
+        новый кадр и читает последний согласованный кадр (все группы дописали, seqlock не изменился)
+        как SwarmState без копирования и без сериализации. Считает пропускную способность
+        производителей и потребителя и устаревание измерений.
+        :param positions: начальные истинные позиции, (N, d)
+        :param velocities: скорости, (N, d) (по умолчанию нули)
+        :param workers: число процессов-дронов
+        :param gnss_rate: частота GNSS, Гц
+        :param ins_rate: частота INS, Гц
+        :param range_rate: частота ranging, Гц
+        :param slots: размер колец (кадров); >= 2
+        :param radius: дальность ranging (граф соседей фиксируется по начальным позициям)
+        :param k: максимальное число соседей
+        :param spoofed: индексы дронов с подменой GNSS
+        :param spoof_offset: смещение подменённого GNSS
+        :param seed: базовый seed процессов-дронов (None — из глобального np.random)
+        """
+        if slots < 2:
+            raise ValueError("slots must be at least 2: the leader reads one frame while drones write the next")
+        self.origin = np.array(positions, dtype=float)
+        self.velocity = np.zeros_like(self.origin) if velocities is None else np.array(velocities, dtype=float)
+        n = len(self.origin)
+        self.workers = min(workers, n)
+        self.rates = (gnss_rate, ins_rate, range_rate)
+        self.slots = slots
+        self.neighbors = None if radius is None and k is None else neighbor_graph(self.origin, radius=radius, k=k)
+        self.spoofed = np.zeros(n, dtype=bool)
+        self.spoofed[list(spoofed)] = True
+        self.spoof_offset = np.asarray(spoof_offset, dtype=float)
+        self.noise = (gnss_noise_std, ins_noise_std, ins_drift_std, range_noise_std)
+        self.seed = seed
+        self.bounds = np.linspace(0, n, self.workers + 1).astype(int)  # строки процесса w: bounds[w]:bounds[w+1]
+        self.layout = buffer_layout(n, self.origin.shape[1], self.workers, slots,
+                                    width=None if self.neighbors is None else self.neighbors.shape[1])
+        self.buffer = None
+        self.processes = []
+        self.frame = 0
+        self.prev_position = self.origin.copy()  # оценки лидера с прошлой эпохи
+        self.started = None
+        self.consumed = 0        # прочитанные кадры
+        self.bytes_read = 0      # объём прочитанных кадров (без копирования), байт
+        self.torn = 0            # кадры, изменённые писателем во время чтения
+        self.fallbacks = 0       # эпохи, когда открытый кадр не был готов и взят более старый
+        self.missed = 0          # эпохи без единого готового кадра (например, процессы-дроны ещё стартуют)
+        self.staleness = {stream: Histogram() for stream in STREAMS}
+        self.step_time = Histogram()
+
+    @property
+    def n(self):
+        return len(self.origin)
+
+    def start(self):
+        """Создаёт сегмент общей памяти и запускает процессы-дроны."""
+        self.buffer = SharedSwarmBuffer(self.layout)
+        a = self.buffer.arrays
+        a["origin"][:] = self.origin
+        a["velocity"][:] = self.velocity
+        if self.neighbors is not None:
+            a["neighbors"][:] = self.neighbors
+        a["ranges"][:] = np.nan
+        seed = np.random.randint(2 ** 31) if self.seed is None else self.seed
+        t0 = time.monotonic()
+        for w in range(self.workers):
+            lo, hi = self.bounds[w], self.bounds[w + 1]
+            child_seed = int(np.random.SeedSequence(seed, spawn_key=(w,)).generate_state(1)[0])
+            process = multiprocessing.Process(
+                target=_drone_worker, daemon=True,
+                args=(self.buffer.name, self.layout, w, (lo, hi), self.rates, self.noise, self.spoofed[lo:hi],
+                      self.spoof_offset, child_seed, t0))
+            process.start()
+            self.processes.append(process)
+        self.started = time.monotonic()
+        return self
+
+    def stop(self):
+        """Останавливает процессы-дронов и освобождает общую память."""
+        if self.buffer is None:
+            return
+        self.buffer.arrays["control"][STOP] = 1
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._final_produced = self.buffer.arrays["produced"].copy()
+        self._elapsed = time.monotonic() - self.started
+        self.processes = []
+        self.buffer.close()
+        self.buffer = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def advance(self):
+        """
+        Открывает следующий кадр: процессы-дроны начинают писать в него, прежний кадр завершается.
+        :return: номер завершаемого кадра
+        """
+        self.frame += 1
+        self.buffer.arrays["control"][OPEN] = self.frame
+        return self.frame - 1
+
+    def _complete(self, frame):
+        """
+        Счётчики seqlock слота кадра frame, если все группы дописали именно этот кадр, иначе None.
+        Счётчики читаются до проверки номера кадра: перезапись после чтения заметит consistent.
+        """
+        if frame < 0:
+            return None
+        a, slot = self.buffer.arrays, frame % self.slots
+        stamps = a["stamps"][slot].copy()
+        if (stamps % 2).any() or (a["frames"][slot] != frame).any():
+            return None
+        return stamps
+
+    def snapshot(self, frame, timeout=0.1):
+        """
+        Последний согласованный кадр не новее frame: ждёт до timeout, пока все группы допишут frame,
+        иначе берёт самый новый готовый из кольца.
+        :return: Snapshot или None, если готового кадра нет
+        """
+        deadline = time.monotonic() + timeout
+        while self._complete(frame) is None and time.monotonic() < deadline:
+            time.sleep(POLL_S / 10)
+        for candidate in range(frame, max(frame - self.slots + 1, -1), -1):
+            stamps = self._complete(candidate)
+            if stamps is not None:
+                break
+        else:
+            return None
+        self.fallbacks += candidate != frame
+        frame = candidate
+        a, slot = self.buffer.arrays, frame % self.slots
+        now = time.monotonic()
+        state = SwarmState(a["x_true"][slot], a["z_gnss"][slot], a["x_ins"][slot], self.prev_position,
+                           a["ranges"][slot], neighbors=None if self.neighbors is None else a["neighbors"])
+        staleness = {stream: now - a["t_" + stream][slot] for stream in STREAMS}
+        return Snapshot(state, frame, stamps, now, staleness)
+
+    def consistent(self, snapshot):
+        """
+        Слот кадра не перезаписывался с момента snapshot (проверка seqlock после использования): счётчики
+        записей не изменились — в том числе при повторной записи того же кадра.
+        """
+        return bool((self.buffer.arrays["stamps"][snapshot.frame % self.slots] == snapshot.stamps).all())
+
+    def run(self, epochs, rate=10.0, f=1, T=None, timeout=None, **leader_kwargs):
+        """
+        Лидер с частотой rate: открывает кадр, читает готовый кадр без копирования и выполняет консенсус.
+        Кадр, перезаписанный во время шага, считается разорванным и шаг повторяется по новому чтению.
+        :param epochs: число эпох
+        :param rate: частота лидера, Гц
+        :param f: макс. число неисправных узлов
+        :param T: порог голосования (None — как у LeaderNode)
+        :param timeout: ожидание готовности кадра, с (по умолчанию половина периода)
+        :param leader_kwargs: параметры LeaderNode (backend, recovery_method, ...)
+        :return: генератор словарей метрик по эпохам
+        """
+        period = 1.0 / rate
+        timeout = period / 2 if timeout is None else timeout
+        next_epoch = time.monotonic() + period
+        for epoch in range(epochs):
+            now = time.monotonic()
+            if now < next_epoch:
+                time.sleep(next_epoch - now)
+            next_epoch = max(next_epoch, now) + period  # после перерасхода эпохи не догоняются
+            frame = self.advance()
+            for _ in range(self.slots):
+                snapshot = self.snapshot(frame, timeout)
+                if snapshot is None:
+                    break
+                start = time.perf_counter()
+                leader = LeaderNode(snapshot.state, **leader_kwargs)
+                if T is not None:
+                    leader.T = T
+                final_positions, faulty = leader.step_consensus(f=f)
+                elapsed = time.perf_counter() - start
+                if self.consistent(snapshot):
+                    break
+                self.torn += 1
+            if snapshot is None:
+                self.missed += 1
+                continue
+
+            state = snapshot.state
+            final = np.array([final_positions[i] for i in state.ids])
+            self.prev_position[:] = final
+            flagged = np.zeros(state.n, dtype=bool)
+            flagged[list(faulty)] = True
+            self.consumed += 1
+            self.bytes_read += sum(getattr(state, name).nbytes for name in ("x_true", "z_gnss", "x_ins", "ranges"))
+            self.step_time.observe(elapsed)
+            for stream, age in snapshot.staleness.items():
+                self.staleness[stream].observe(float(age.max()))
+            err_final = (final - state.x_true).ravel()
+            yield {
+                "Epoch": epoch,
+                "Frame": snapshot.frame,
+                "Num_Faulty": int(flagged.sum()),
+                "Detected": int((flagged & self.spoofed).sum()),
+                "False_Alarms": int((flagged & ~self.spoofed).sum()),
+                "MAE_Recovered": float(np.abs(err_final).mean()),
+                **{f"Staleness_{stream}_s": float(age.max()) for stream, age in snapshot.staleness.items()},
+                "Step_Time_s": elapsed,
+            }
+
+    def report(self):
+        """
+        Пропускная способность производителей (измерений дронов в секунду по потокам) и потребителя
+        (кадров и строк дронов в секунду), разорванные кадры, возраст измерений (максимум по рою в кадре).
+        """
+        if self.buffer is not None:
+            produced, elapsed = self.buffer.arrays["produced"].copy(), time.monotonic() - self.started
+        else:
+            produced, elapsed = self._final_produced, self._elapsed
+        rows = np.diff(self.bounds)
+        samples = (produced[:, :len(STREAMS)] * rows[:, None]).sum(axis=0)
+        report = {
+            "n_drones": self.n,
+            "workers": self.workers,
+            "elapsed_s": elapsed,
+            **{f"produced_{stream}_per_s": float(samples[s] / elapsed) for s, stream in enumerate(STREAMS)},
+            # доля от номинала N * частота: ниже 1 — процессы-дроны не успевают за заданной частотой
+            **{f"produced_{stream}_fraction": float(samples[s] / (elapsed * self.n * rate))
+               for s, (stream, rate) in enumerate(zip(STREAMS, self.rates))},
+            "published_frames_per_s": float(produced[:, WRITES].sum() / elapsed),
+            "consumed_frames": self.consumed,
+            "consumed_drones_per_s": self.consumed * self.n / elapsed,
+            "consumed_mb_per_s": self.bytes_read / elapsed / 2 ** 20,
+            "torn_frames": self.torn,
+            "fallback_frames": self.fallbacks,
+            "missed_epochs": self.missed,
+            "step_p99_s": self.step_time.summary()["p99"],
+        }
+        for stream, histogram in self.staleness.items():
+            summary = histogram.summary()
+            report[f"staleness_{stream}_p50_s"] = summary["p50"]
+            report[f"staleness_{stream}_p99_s"] = summary["p99"]
+        return report
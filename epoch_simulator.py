@@ -0,0 +1,239 @@
+import time
+
+import numpy as np
+
+from leader_node import LeaderNode
+from swarm_state import SwarmState
+
+# Порог устаревания по умолчанию — такая доля порога голосования leader.T: изменение любого входа пары
+# на d сдвигает её невязку примерно на d, поэтому переиспользованный голос может перевернуться только
+# у пар, невязка которых и так в пределах этой доли от T. Точное совпадение с полным пересчётом —
+# tolerance=0; расхождение при другом пороге показывает verify=True
+TOLERANCE_FRACTION = 0.05
+
+
+class EpochSimulator:
+    def __init__(self, positions, velocities=None, dt=1.0, accel_std=0.1, gnss_noise_std=1.0,
+                 ins_noise_std=0.5, ins_drift_std=0.05, range_noise_std=0.2, gnss_period=1, range_period=1,
+                 spoofed=(), spoof_offset=(15.0, -15.0), spoof_start=0, f=1, tolerance=None,
+                 radius=None, k=None, verify=False):
+        """
+        Симуляция роя по эпохам: движение, GNSS/INS/ranging, постоянный спуфинг и дрейф INS.
+        Состояние меняется на месте, а лидер пересчитывает фьюзинг и голоса только для пар,
+        входные данные которых изменились больше чем на tolerance. Шум измерений перерисовывается
+        каждую эпоху, поэтому порог ниже уровня шума делает устаревшими все пары: экономия — на входах,
+        которые держатся между обновлениями (gnss_period, range_period) или почти не шумят.
+        :param positions: начальные истинные позиции, (N, d)
+        :param velocities: начальные скорости, (N, d) (по умолчанию нули — зависание)
+        :param dt: шаг по времени, с
+        :param accel_std: стандартное отклонение случайного ускорения (модель постоянной скорости)
+        :param gnss_noise_std: стандартное отклонение шума GNSS
+        :param ins_noise_std: стандартное отклонение шума INS
+        :param ins_drift_std: шаг случайного блуждания смещения INS за эпоху
+        :param range_noise_std: стандартное отклонение шума измерения расстояния
+        :param gnss_period: GNSS обновляется раз в столько эпох
+        :param range_period: ranging обновляется раз в столько эпох
+        :param spoofed: индексы дронов под постоянным спуфингом GNSS
+        :param spoof_offset: смещение, добавляемое к GNSS атакованных дронов
+        :param spoof_start: эпоха начала спуфинга
+        :param f: макс. число неисправных узлов для detect_faulty_nodes
+        :param tolerance: порог изменения входных данных пары, ниже которого пара не пересчитывается;
+                          None — TOLERANCE_FRACTION от порога голосования лидера для всех входов
+        :param radius: дальность ranging (граф соседей, см. spatial_index)
+        :param k: максимальное число соседей
+        :param verify: каждую эпоху сравнивать инкрементальные голоса с полным пересчётом при тех же весах
+                       alpha (метрика Vote_Mismatches; удваивает стоимость голосования)
+        """
+        x_true = np.array(positions, dtype=float)
+        self.velocities = np.zeros_like(x_true) if velocities is None else np.array(velocities, dtype=float)
+        self.dt = dt
+        self.accel_std = accel_std
+        self.gnss_noise_std = gnss_noise_std
+        self.ins_noise_std = ins_noise_std
+        self.ins_drift_std = ins_drift_std
+        self.range_noise_std = range_noise_std
+        self.gnss_period = gnss_period
+        self.range_period = range_period
+        self.spoofed = np.zeros(len(x_true), dtype=bool)
+        self.spoofed[list(spoofed)] = True
+        self.spoof_offset = np.asarray(spoof_offset, dtype=float)
+        self.spoof_start = spoof_start
+        self.f = f
+        self.tolerance = tolerance
+        self.radius = radius
+        self.k = k
+
+        self.epoch = 0
+        self.ins_bias = np.zeros_like(x_true)
+        self.state = SwarmState.generate(x_true, gnss_noise_std, ins_noise_std, range_noise_std, radius=radius, k=k)
+        self._apply_spoofing()
+        self.leader = LeaderNode(self.state, range_noise_std=range_noise_std, gnss_var=gnss_noise_std ** 2)
+        self.reference = None  # эталон для verify: бэкенд без тензора оценок хранит веса alpha пар
+        if verify:
+            random_state = np.random.get_state()  # конструктор тянет случайный T; поток симуляции не меняется
+            self.reference = LeaderNode(self.state, range_noise_std=range_noise_std, gnss_var=gnss_noise_std ** 2,
+                                        backend="tiled")
+            np.random.set_state(random_state)
+        self._baseline = None  # входные данные, по которым посчитан кэш лидера
+
+    def _apply_spoofing(self):
+        if self.epoch >= self.spoof_start:
+            self.state.z_gnss[self.spoofed] += self.spoof_offset
+
+    def _advance(self, final_positions):
+        """
+        Продвигает истинное состояние и измерения на одну эпоху (на месте).
+        """
+        state = self.state
+        n, d = state.x_true.shape
+        self.epoch += 1
+        state.prev_position[:] = final_positions  # оценка лидера с прошлой эпохи
+        self.velocities += np.random.normal(0, self.accel_std, size=(n, d)) * self.dt
+        state.x_true += self.velocities * self.dt
+
+        self.ins_bias += np.random.normal(0, self.ins_drift_std, size=(n, d))
+        state.x_ins[:] = state.x_true + self.ins_bias + np.random.normal(0, self.ins_noise_std, size=(n, d))
+
+        if self.epoch % self.gnss_period == 0:  # между фиксами GNSS держится последнее значение
+            state.z_gnss[:] = state.x_true + np.random.normal(0, self.gnss_noise_std, size=(n, d))
+            self._apply_spoofing()
+        if self.epoch % self.range_period == 0:
+            state.measure_ranges(self.range_noise_std, radius=self.radius, k=self.k)
+
+    def _snapshot_inputs(self):
+        state = self.state
+        return {
+            "z_gnss": state.z_gnss.copy(), "prev_position": state.prev_position.copy(),
+            "x_ins": state.x_ins.copy(), "ranges": state.ranges.copy(),
+            "neighbors": None if state.neighbors is None else state.neighbors.copy(),
+        }
+
+    def _tolerances(self):
+        """Порог изменения для каждого входа пары: явный tolerance или доля порога голосования лидера."""
+        tolerance = TOLERANCE_FRACTION * self.leader.T if self.tolerance is None else self.tolerance
+        return dict.fromkeys(("z_gnss", "prev_position", "x_ins", "ranges"), tolerance)
+
+    def _reference_votes(self, stale):
+        """
+        Голоса полного пересчёта для verify. Эталон помечает те же пары, что и лидер, и тянет веса
+        alpha из того же состояния np.random в том же порядке, поэтому веса пар у них совпадают;
+        состояние np.random восстанавливается, и шаг лидера тянет те же числа.
+        :param stale: маска пересчитываемых пар или None — полный пересчёт
+        """
+        reference = self.reference
+        if stale is None:
+            reference.invalidate()
+        else:
+            reference.invalidate_pairs(stale)
+        reference.T = self.leader.T
+        random_state = np.random.get_state()
+        votes = reference.full_votes()
+        np.random.set_state(random_state)
+        return votes
+
+    def _voting_pairs(self):
+        """Маска пар формы кэша лидера, у которых есть голос: наблюдатель не совпадает с целью и есть измерение."""
+        state = self.state
+        valid = ~np.isnan(state.ranges)
+        if state.sparse:
+            return valid & (state.neighbors >= 0) & (state.neighbors != np.arange(state.n)[:, None])
+        np.fill_diagonal(valid, False)
+        return valid
+
+    def _stale_pairs(self):
+        """
+        Маска пар, входные данные которых изменились больше чем на tolerance с момента последнего
+        пересчёта. Обновляет опорные значения только у пересчитываемых пар.
+        :return: маска формы кэша лидера или None, если нужен полный пересчёт
+        """
+        state, base, tol = self.state, self._baseline, self._tolerances()
+        if (state.neighbors is None) != (base["neighbors"] is None) or state.ranges.shape != base["ranges"].shape:
+            return None
+
+        def moved(name):
+            return np.abs(getattr(state, name) - base[name]).max(axis=1) > tol[name]
+
+        rows = moved("z_gnss") | moved("prev_position")
+        obs = moved("x_ins")
+        with np.errstate(invalid="ignore"):
+            range_changed = ~(np.abs(state.ranges - base["ranges"]) <= tol["ranges"])
+        range_changed &= ~(np.isnan(state.ranges) & np.isnan(base["ranges"]))
+        if state.sparse:
+            observers = state.neighbors
+            range_changed |= state.neighbors != base["neighbors"]
+            stale = rows[:, None] | np.where(observers >= 0, obs[observers], False) | range_changed
+        else:
+            stale = rows[:, None] | obs[None, :] | range_changed
+
+        base["z_gnss"][rows] = state.z_gnss[rows]
+        base["prev_position"][rows] = state.prev_position[rows]
+        base["x_ins"][obs] = state.x_ins[obs]
+        base["ranges"][stale] = state.ranges[stale]
+        if state.sparse:
+            base["neighbors"][:] = state.neighbors
+        return stale
+
+    def step(self, recorder=None):
+        """
+        Одна эпоха: консенсус по текущим измерениям, затем продвижение состояния.
+        :param recorder: recording.RecordingWriter — записать входные данные консенсуса эпохи
+        :return: словарь метрик эпохи
+        """
+        state, leader = self.state, self.leader
+        attacked = self.spoofed if self.epoch >= self.spoof_start else np.zeros(state.n, dtype=bool)
+        if recorder is not None:
+            recorder.append(state, attacked)
+        start = time.perf_counter()
+        stale = None
+        if self._baseline is None:
+            leader.invalidate()
+            self._baseline = self._snapshot_inputs()
+        else:
+            stale = self._stale_pairs()
+            if stale is None:
+                leader.invalidate()
+                self._baseline = self._snapshot_inputs()
+            else:
+                leader.invalidate_pairs(stale)
+        pairs = None if stale is None else int((stale & self._voting_pairs()).sum())
+        reference = None
+        if self.reference is not None:
+            verify_start = time.perf_counter()
+            reference = self._reference_votes(stale)
+            start += time.perf_counter() - verify_start  # время эталона не входит в Step_Time_s
+
+        final_positions, faulty = leader.step_consensus(f=self.f)
+        elapsed = time.perf_counter() - start
+
+        final = np.array([final_positions[i] for i in state.ids])
+        if pairs is None:
+            pairs = int(leader.packed_votes().counts()[0].sum())  # голос есть ровно у пар с оценкой
+        flagged = np.zeros(state.n, dtype=bool)
+        flagged[list(faulty)] = True
+        err_gnss = (state.z_gnss - state.x_true).ravel()
+        err_final = (final - state.x_true).ravel()
+        metrics = {
+            "Epoch": self.epoch,
+            "Num_Faulty": int(flagged.sum()),
+            "Detected": int((flagged & attacked).sum()),
+            "False_Alarms": int((flagged & ~attacked).sum()),
+            "MAE_GNSS": float(np.abs(err_gnss).mean()),
+            "MAE_Recovered": float(np.abs(err_final).mean()),
+            "RMSE_GNSS": float(np.sqrt((err_gnss ** 2).mean())),
+            "RMSE_Recovered": float(np.sqrt((err_final ** 2).mean())),
+            "Pairs_Recomputed": pairs,
+            "Step_Time_s": elapsed,
+        }
+        if reference is not None:
+            metrics["Vote_Mismatches"] = int((leader.packed_votes().to_matrix() != reference.to_matrix()).sum())
+        self._advance(final)
+        return metrics
+
+    def run(self, epochs, recorder=None):
+        """
+        Поток метрик по эпохам (генератор), чтобы не хранить всю траекторию в памяти.
+        :param epochs: число эпох
+        :param recorder: recording.RecordingWriter для записи входных данных эпох
+        """
+        for _ in range(epochs):
+            yield self.step(recorder)
@@ -0,0 +1,250 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from instrumentation import NULL_INSTRUMENTATION
+from leader_node import LeaderNode, seeded
+from spatial_index import neighbor_graph
+from vote_bits import fault_rule
+
+
+def partition(points, cluster_size):
+    """
+    Рекурсивное деление пополам по медиане вдоль самой длинной оси (recursive coordinate bisection):
+    пространственные кластеры по cluster_size дронов или меньше, сбалансированные по числу дронов.
+    :param points: позиции, (N, d)
+    :param cluster_size: максимальный размер кластера
+    :return: номера кластеров, (N,) int64
+    """
+    points = np.asarray(points, dtype=float)
+    labels = np.empty(len(points), dtype=np.int64)
+    pending = [np.arange(len(points))]
+    n_clusters = 0
+    while pending:
+        idx = pending.pop()
+        if len(idx) <= cluster_size:
+            labels[idx] = n_clusters
+            n_clusters += 1
+            continue
+        pts = points[idx]
+        axis = np.argmax(pts.max(axis=0) - pts.min(axis=0))
+        half = len(idx) // 2
+        order = np.argpartition(pts[:, axis], half)
+        pending += [idx[order[half:]], idx[order[:half]]]
+    return labels
+
+
+def cluster_members(labels, graph=None):
+    """
+    Состав подзадач кластеров: собственные дроны + граница (halo). Дрон i попадает в кластер c,
+    если c владеет им, одним из его наблюдателей или одной из его целей в graph. Тогда каждая пара
+    (цель, наблюдатель) графа видна в кластере-владельце наблюдателя.
+    :param labels: номера кластеров, (N,)
+    :param graph: граф наблюдений (N, K), graph[i, m] — наблюдатель дрона i, -1 — пусто; None — без halo
+    :return: список отсортированных индексов дронов по кластерам
+    """
+    n = len(labels)
+    keys = [labels * n + np.arange(n)]
+    if graph is not None:
+        rows = np.repeat(np.arange(n), graph.shape[1])
+        cols = graph.ravel()
+        rows, cols = rows[cols >= 0], cols[cols >= 0]
+        keys += [labels[cols] * n + rows, labels[rows] * n + cols]
+    cluster, drone = np.divmod(np.unique(np.concatenate(keys)), n)
+    bounds = np.searchsorted(cluster, np.arange(labels.max() + 2))
+    return [drone[bounds[c]:bounds[c + 1]] for c in range(len(bounds) - 1)]
+
+
+def _sub_leader(sub, T, leader_kwargs):
+    leader = LeaderNode(sub, **leader_kwargs)
+    leader.T = T
+    return leader
+
+
+def _owned_columns(sub, owned):
+    """Маска столбцов голосов, поданных собственными дронами кластера: (K,) или (N_c, K)."""
+    if not sub.sparse:
+        return owned
+    return np.append(owned, False)[sub.neighbors]  # -1 (пустой сосед) -> False
+
+
+# Sub-лидеры кластеров, живущие в процессе-исполнителе между фазами шага: {(owner, c): (sub, owned, leader)}.
+# Фаза восстановления идёт в том же процессе, что и голосование, поэтому подзадача пересылается один раз.
+_CLUSTERS = {}
+
+
+def _drop_clusters(owner):
+    for key in [key for key in _CLUSTERS if key[0] == owner]:
+        del _CLUSTERS[key]
+
+
+def _cluster_votes(owner, tasks):
+    """
+    Фаза 1 для кластеров одного исполнителя: голосование sub-лидеров; учитываются только голоса
+    собственных наблюдателей (голоса граничных дронов посчитает кластер, которому они принадлежат).
+    Sub-лидеры остаются в кэше процесса до фазы 2.
+    :param owner: ключ координатора в кэше процесса
+    :param tasks: список (номер кластера, подзадача, маска своих дронов, seed, T, leader_kwargs)
+    :return: список (поданные голоса, голоса против) по дронам подзадачи
+    """
+    _drop_clusters(owner)  # остатки прерванного прошлого шага
+    counts = []
+    for c, sub, owned, seed, T, leader_kwargs in tasks:
+        with seeded(seed):
+            leader = _sub_leader(sub, T, leader_kwargs)
+            votes = leader.packed_votes()
+        _CLUSTERS[owner, c] = (sub, owned, leader)
+        counts.append(votes.select(_owned_columns(sub, owned)).counts())
+    return counts
+
+
+def _cluster_recover(owner, jobs):
+    """
+    Фаза 2: восстановление собственных неисправных дронов кэшированными sub-лидерами фазы 1,
+    т. е. по тем же оценкам, по которым голосовали. Кэш координатора в процессе очищается.
+    :param jobs: список (номер кластера, маска неисправных дронов подзадачи)
+    :return: список восстановленных позиций собственных неисправных дронов, (F_c, d)
+    """
+    try:
+        positions = []
+        for c, flagged in jobs:
+            sub, owned, leader = _CLUSTERS[owner, c]
+            targets = [sub.ids[k] for k in np.flatnonzero(flagged & owned)]
+            recovered = leader.recover_positions(set(targets), exclude={sub.ids[k] for k in np.flatnonzero(flagged)})
+            positions.append(np.array([recovered[i] for i in targets]).reshape(-1, sub.dim))
+        return positions
+    finally:
+        _drop_clusters(owner)
+
+
+class HierarchicalConsensus:
+    def __init__(self, state, cluster_size=256, halo=None, workers=None, seed=None, T=None, instrumentation=None,
+                 **leader_kwargs):
+        """
+        Иерархический консенсус для больших роёв: рой делится на пространственные кластеры, в каждом
+        sub-лидер (LeaderNode) голосует и восстанавливает локально, кластеры считаются параллельно
+        в процессах. Координатор суммирует голоса по граничным дронам (каждый голос — ровно в одном
+        кластере, у владельца наблюдателя) и применяет правило SwarmRaft к общим счётчикам.
+        Стоимость O(N * cluster_size) вместо O(N²) у одного лидера.
+        :param state: SwarmState
+        :param cluster_size: максимальный размер кластера
+        :param halo: для плотного состояния — радиус, в котором голоса соседних кластеров учитываются
+                     (None — только свой кластер); для графа соседей граница берётся из state.neighbors
+        :param workers: число процессов (None — по числу ядер, 1 — последовательно в текущем процессе).
+                        Процессы создаются при первом шаге и живут до close() (или выхода из with)
+        :param seed: базовый seed потоков np.random кластеров (None — берётся из глобального np.random)
+        :param T: общий порог голосования (None — как у LeaderNode)
+        :param instrumentation: instrumentation.Instrumentation для таймеров/счётчиков по фазам шага
+        :param leader_kwargs: параметры sub-лидеров (range_noise_std, backend, recovery_method, ...)
+        """
+        self.state = state
+        self.cluster_size = cluster_size
+        self.halo = halo
+        self.workers = os.cpu_count() if workers is None else workers
+        self.seed = seed
+        self.leader_kwargs = leader_kwargs
+        self.instrumentation = NULL_INSTRUMENTATION if instrumentation is None else instrumentation
+        if T is None:
+            T = LeaderNode(state, **leader_kwargs).T
+        self.T = T
+        self.labels = None   # номера кластеров дронов, (N,)
+        self.members = None  # индексы дронов подзадач кластеров (свои + граница)
+        # По однопроцессному исполнителю на воркер: кластер c всегда считается в исполнителе c % workers,
+        # где между фазами шага остаётся его sub-лидер
+        self._executors = None
+        self._owner = id(self)
+
+    def close(self):
+        """Останавливает процессы-исполнители."""
+        if self._executors is not None:
+            for executor in self._executors:
+                executor.shutdown()
+            self._executors = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def build_clusters(self):
+        """
+        Делит рой по INS-позициям (GNSS может быть подменён): partition + граница из графа наблюдений.
+        """
+        state = self.state
+        self.labels = partition(state.x_ins, self.cluster_size)
+        if state.sparse:
+            graph = state.neighbors
+        elif self.halo is not None:
+            graph = neighbor_graph(state.x_ins, radius=self.halo)
+        else:
+            graph = None
+        self.members = cluster_members(self.labels, graph)
+        return self.members
+
+    def _map(self, fn, tasks):
+        """
+        Раздаёт задачи кластеров исполнителям (кластер c — исполнителю c % workers) одним вызовом
+        fn(owner, задачи исполнителя) на исполнитель.
+        :param tasks: {номер кластера: задача}
+        :return: {номер кластера: результат}
+        """
+        if self.workers <= 1 or len(self.members) <= 1:
+            return dict(zip(tasks, fn(self._owner, list(tasks.values()))))
+        if self._executors is None:
+            self._executors = [ProcessPoolExecutor(max_workers=1) for _ in range(self.workers)]
+        shards = [[c for c in tasks if c % self.workers == w] for w in range(self.workers)]
+        # Вызов уходит и исполнителям без задач: фаза 2 очищает их кэш
+        futures = [executor.submit(fn, self._owner, [tasks[c] for c in shard])
+                   for executor, shard in zip(self._executors, shards)]
+        results = {}
+        for shard, future in zip(shards, futures):
+            results.update(zip(shard, future.result()))
+        return results
+
+    def step_consensus(self, f=1):
+        """
+        Полный шаг: кластеры голосуют параллельно, координатор собирает счётчики и решает, кто
+        неисправен, затем кластеры-владельцы восстанавливают своих неисправных дронов.
+        :return: (словарь {drone_id: final_position}, множество ID неисправных) — как у LeaderNode
+        """
+        inst = self.instrumentation
+        inst.begin_step()
+        # end_step в finally, как у LeaderNode.step_consensus: исключение в исполнителе не оставляет
+        # незакрытую запись и запущенный профайлер
+        try:
+            state = self.state
+            with inst.phase("partition"):
+                members = self.build_clusters()
+                seed = np.random.randint(2 ** 31) if self.seed is None else self.seed
+                seeds = [int(np.random.SeedSequence(seed, spawn_key=(c,)).generate_state(1)[0])
+                         for c in range(len(members))]
+                subs = [state.subset(idx) for idx in members]
+                owned = [self.labels[idx] == c for c, idx in enumerate(members)]
+
+            with inst.phase("voting"):
+                tasks = {c: (c, sub, own, s, self.T, self.leader_kwargs)
+                         for c, (sub, own, s) in enumerate(zip(subs, owned, seeds))}
+                counts = self._map(_cluster_votes, tasks)
+            with inst.phase("detection"):
+                # Граничный дрон получает голоса из нескольких кластеров — счётчики складываются
+                idx = np.concatenate(members)
+                cast = np.bincount(idx, np.concatenate([counts[c][0] for c in tasks]), minlength=state.n)
+                negative = np.bincount(idx, np.concatenate([counts[c][1] for c in tasks]), minlength=state.n)
+                flagged = fault_rule(cast, negative, f)
+            with inst.phase("recovery"):
+                final = state.z_gnss.copy()
+                jobs = {c: (c, flagged[members[c]]) for c in tasks if flagged[members[c]][owned[c]].any()}
+                for c, positions in self._map(_cluster_recover, jobs).items():
+                    final[members[c][owned[c] & flagged[members[c]]]] = positions
+
+            if inst.enabled:
+                inst.count("clusters", len(members))
+                inst.count("halo_drones", sum(len(m) for m in members) - state.n)
+                inst.count("votes_cast", int(cast.sum()))
+                inst.count("nodes_flagged", int(flagged.sum()))
+            faulty = {state.ids[k] for k in np.flatnonzero(flagged)}
+            return {i: final[k] for k, i in enumerate(state.ids)}, faulty
+        finally:
+            inst.end_step()
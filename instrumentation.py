@@ -0,0 +1,203 @@
+import contextlib
+import math
+import time
+
+
+class Histogram:
+    def __init__(self, base=2.0 ** 0.25, min_value=1e-7):
+        """
+        Гистограмма с логарифмическими корзинами: O(число корзин) памяти, приближённые квантили.
+        :param base: отношение границ соседних корзин
+        :param min_value: значения меньше попадают в нулевую корзину
+        """
+        self.base = base
+        self.min_value = min_value
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        bucket = 0 if value < self.min_value else int(math.log(value / self.min_value, self.base)) + 1
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def quantile(self, q):
+        """Верхняя граница корзины, в которую попадает квантиль q."""
+        if not self.count:
+            return math.nan
+        rank = q * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                upper = self.min_value * self.base ** bucket if bucket else self.min_value
+                return min(upper, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else math.nan,
+            "min": self.min, "p50": self.quantile(0.5), "p99": self.quantile(0.99), "max": self.max,
+        }
+
+
+class NullInstrumentation:
+    """Инструментация по умолчанию: все вызовы — пустые, стоимость — один вызов метода."""
+    enabled = False
+    _null = contextlib.nullcontext()
+
+    def begin_step(self):
+        pass
+
+    def end_step(self):
+        return None
+
+    def phase(self, name):
+        return self._null
+
+    def count(self, name, value=1):
+        pass
+
+    def observe(self, name, value):
+        pass
+
+
+NULL_INSTRUMENTATION = NullInstrumentation()
+
+
+class Instrumentation:
+    def __init__(self, timer=time.perf_counter, profile=False, trace_memory=False, budgets=None, sinks=(),
+                 keep_records=True, profile_top=20):
+        """
+        Инструментация шагов консенсуса: таймеры фаз, счётчики, гистограммы, записи по шагам.
+        :param timer: функция текущего времени в секундах
+        :param profile: снимать cProfile каждого шага (дорого)
+        :param trace_memory: снимать пиковую память шага через tracemalloc (дорого)
+        :param budgets: бюджеты задержки {фаза или "total": секунды}; превышения попадают в запись шага
+        :param sinks: функции record -> None, вызываемые после каждого шага (дашборды, логи)
+        :param keep_records: хранить записи шагов в self.records
+        :param profile_top: сколько функций профиля сохранять в записи
+        """
+        self.enabled = True
+        self.timer = timer
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.budgets = dict(budgets or {})
+        self.sinks = list(sinks)
+        self.keep_records = keep_records
+        self.profile_top = profile_top
+        self.records = []
+        self.histograms = {}
+        self.totals = {}
+        self._step = 0
+        self._current = None
+        self._profiler = None
+        self._started_tracemalloc = False
+
+    def begin_step(self):
+        self._current = {"step": self._step, "phases": {}, "counters": {}, "start": self.timer()}
+        # cProfile/tracemalloc импортируются только при включённом режиме: модуль грузится при каждом запуске
+        if self.trace_memory:
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            tracemalloc.reset_peak()
+        if self.profile:
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def end_step(self):
+        """
+        Завершает шаг и формирует его запись.
+        :return: словарь записи шага
+        """
+        record = self._current
+        if record is None:
+            return None
+        record["total_s"] = self.timer() - record.pop("start")
+        self.observe("total_s", record["total_s"])
+        if self._profiler is not None:
+            self._profiler.disable()
+            record["profile"] = _profile_summary(self._profiler, self.profile_top)
+            self._profiler = None
+        if self.trace_memory:
+            import tracemalloc
+
+            record["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+        over = {name: limit for name, limit in self.budgets.items()
+                if (record["total_s"] if name == "total" else record["phases"].get(name, 0.0)) > limit}
+        if over:
+            record["over_budget"] = sorted(over)
+
+        self._step += 1
+        self._current = None
+        if self.keep_records:
+            self.records.append(record)
+        for sink in self.sinks:
+            sink(record)
+        return record
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = self.timer()
+        try:
+            yield
+        finally:
+            elapsed = self.timer() - start
+            if self._current is not None:
+                phases = self._current["phases"]
+                phases[name] = phases.get(name, 0.0) + elapsed
+            self.observe(name + "_s", elapsed)
+
+    def count(self, name, value=1):
+        value = int(value)
+        if self._current is not None:
+            counters = self._current["counters"]
+            counters[name] = counters.get(name, 0) + value
+        self.totals[name] = self.totals.get(name, 0) + value
+
+    def observe(self, name, value):
+        if name not in self.histograms:
+            self.histograms[name] = Histogram()
+        self.histograms[name].observe(value)
+
+    def summary(self):
+        """Сводка по всем шагам: гистограммы времён и суммарные счётчики."""
+        return {
+            "steps": self._step,
+            "histograms": {name: h.summary() for name, h in self.histograms.items()},
+            "counters": dict(self.totals),
+        }
+
+    def export_jsonl(self, path):
+        """Записывает записи шагов в JSON Lines (без профилей — они только в памяти)."""
+        import json
+
+        with open(path, "w") as fh:
+            for record in self.records:
+                fh.write(json.dumps({k: v for k, v in record.items() if k != "profile"}) + "\n")
+
+
+def _profile_summary(profiler, top):
+    import pstats
+
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, func), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({"function": f"{filename}:{line}({func})", "ncalls": ncalls,
+                     "tottime": tottime, "cumtime": cumtime})
+    rows.sort(key=lambda r: r["cumtime"], reverse=True)
+    return rows[:top]
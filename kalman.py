@@ -0,0 +1,123 @@
+import numpy as np
+
+
+class SwarmKalman:
+    def __init__(self, x, P=None, ins_var=0.25, gnss_var=1.0, range_noise_std=0.2, gate=2.0):
+        """
+        Фильтр Калмана сразу для всего роя: состояние (N, d) и ковариации (N, d, d) живут между эпохами.
+        predict — по приращению INS, update — по расстояниям от пиров (EKF в информационной форме,
+        все пары одной операцией) и по GNSS. LeaderNode с tracker=SwarmKalman берёт отсюда опорные
+        позиции для фьюзинга, веса alpha и порог голосования.
+        :param x: начальные оценки позиций, (N, d)
+        :param P: начальные ковариации, (N, d, d) (по умолчанию gnss_var * I)
+        :param ins_var: дисперсия шума INS за эпоху (шум процесса)
+        :param gnss_var: дисперсия GNSS (sigma²)
+        :param range_noise_std: стандартное отклонение измерения расстояния
+        :param gate: порог голосования в единицах предсказанного стандартного отклонения невязки
+        """
+        self.x = np.array(x, dtype=float)
+        n, d = self.x.shape
+        eye = np.eye(d)
+        self.P = np.broadcast_to(gnss_var * eye, (n, d, d)).copy() if P is None else np.array(P, dtype=float)
+        self.ins_var = ins_var
+        self.gnss_var = gnss_var
+        self.range_var = range_noise_std ** 2
+        self.gate = gate
+        self._eye = eye
+        self._ins = None  # INS прошлой эпохи для приращения в predict
+
+    @classmethod
+    def from_state(cls, state, **kwargs):
+        """Фильтр, стартующий с предыдущих позиций роя (prev_position)."""
+        return cls(state.prev_position, **kwargs)
+
+    @property
+    def position_variance(self):
+        """Средняя по осям дисперсия оценки каждого дрона, (N,)."""
+        return np.trace(self.P, axis1=1, axis2=2) / self.x.shape[1]
+
+    def predict(self, state):
+        """
+        Прогноз по приращению INS с прошлой эпохи: x += Δx_ins, P += ins_var * I.
+        В первую эпоху приращения нет — растёт только ковариация.
+        """
+        if self._ins is not None:
+            self.x += state.x_ins - self._ins
+        self._ins = np.array(state.x_ins, dtype=float)
+        self.P += self.ins_var * self._eye
+
+    def pair_alpha(self, observers, valid):
+        """
+        Веса GNSS для фьюзинга пар вместо случайного alpha: доля дисперсии range-оценки от
+        наблюдателя j (его неопределённость + шум расстояния) в сумме с дисперсией GNSS.
+        :param observers: индексы наблюдателей, -1 — пусто
+        :param valid: маска пар с наблюдателем той же формы
+        :return: alpha той же формы, NaN для пар без наблюдателя
+        """
+        spread = self.range_var + self.position_variance
+        weight = spread / (self.gnss_var + spread)
+        return np.where(valid, weight[observers], np.nan)
+
+    def threshold(self):
+        """Порог невязки голосования: gate * sqrt(дисперсия GNSS + range + медианная дисперсия оценки)."""
+        return self.gate * np.sqrt(self.gnss_var + self.range_var + np.median(self.position_variance))
+
+    def update_ranges(self, state, exclude=None):
+        """
+        Обновление по расстояниям от всех пиров сразу: линеаризация |x_i - x_j| в прогнозе (опорная точка
+        наблюдателя — его прогноз, шум — range + его дисперсия), сумма информационных вкладов пар по
+        соседям (einsum по (N, K)), затем одно обращение (N, d, d).
+        :param state: SwarmState с расстояниями эпохи
+        :param exclude: маска (N,) наблюдателей, чьи расстояния не учитываются (например, неисправных)
+        """
+        observers, dij = state.pairs()
+        targets = np.arange(state.n)[:, None]
+        valid = (observers >= 0) & (observers != targets) & ~np.isnan(dij)
+        if exclude is not None:
+            valid &= ~np.append(exclude, False)[observers]
+        obs = np.where(valid, observers, 0)
+        diff = self.x[:, None, :] - self.x[obs]  # (N, K, d)
+        dist = np.sqrt(np.einsum("nkd,nkd->nk", diff, diff))
+        valid &= dist > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            H = np.where(valid[..., None], diff / dist[..., None], 0.0)
+        weight = np.where(valid, 1.0 / (self.range_var + self.position_variance[obs]), 0.0)
+        innovation = np.where(valid, dij - dist, 0.0)
+
+        info = np.linalg.inv(self.P)
+        info_x = np.einsum("nij,nj->ni", info, self.x)
+        info += np.einsum("nk,nki,nkj->nij", weight, H, H)
+        # z - h(x) + H x: линейная модель в точке x
+        info_x += np.einsum("nk,nki->ni", weight * (innovation + np.einsum("nkd,nd->nk", H, self.x)), H)
+        self.P = np.linalg.inv(info)
+        self.x = np.einsum("nij,nj->ni", self.P, info_x)
+
+    def innovation(self, z):
+        """
+        Невязка GNSS и её нормированный квадрат (NIS) для каждого дрона.
+        :return: (невязка (N, d), NIS (N,))
+        """
+        residual = z - self.x
+        S = self.P + self.gnss_var * self._eye
+        return residual, np.einsum("ni,ni->n", residual, np.linalg.solve(S, residual[..., None])[..., 0])
+
+    def update_gnss(self, z, mask=None):
+        """
+        Обновление по GNSS. K = P (P + R)^-1, x += K (z - x), P = (I - K) P.
+        :param z: GNSS, (N, d)
+        :param mask: (N,) — какие дроны обновляются (неисправные GNSS не учитываются)
+        """
+        rows = slice(None) if mask is None else np.flatnonzero(mask)
+        P = self.P[rows]
+        S = P + self.gnss_var * self._eye
+        K = np.linalg.solve(S, P).transpose(0, 2, 1)  # P и S симметричны: P S^-1 = (S^-1 P)^T
+        self.x[rows] += np.einsum("nij,nj->ni", K, z[rows] - self.x[rows])
+        self.P[rows] = P - np.einsum("nij,njk->nik", K, P)
+
+    def update(self, state, faulty=None):
+        """
+        Шаг коррекции эпохи: расстояния от исправных пиров, затем GNSS исправных дронов.
+        :param faulty: маска (N,) неисправных по голосованию
+        """
+        self.update_ranges(state, exclude=faulty)
+        self.update_gnss(state.z_gnss, None if faulty is None else ~faulty)
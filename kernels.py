@@ -0,0 +1,249 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from vote_bits import WORD_BITS, PackedVotes, pack_bits
+
+# Бэкенды ядра консенсуса (fuse -> residual -> vote). Выбор: аргумент backend у LeaderNode,
+# set_backend() во время работы или переменная окружения SWARMRAFT_BACKEND.
+_default = os.environ.get("SWARMRAFT_BACKEND", "numpy")
+_instances = {}
+
+
+class NumpyBackend:
+    """
+    Векторный NumPy: тензор оценок (N, K, d) материализуется и кэшируется лидером (нужен для
+    инкрементального пересчёта пар). Бэкенд по умолчанию, без дополнительных зависимостей.
+    """
+    name = "numpy"
+    materializes_fused = True
+
+    def fuse(self, x_ins_obs, prev_target, z_target, dij, alpha, valid):
+        """
+        Фьюзинг GNSS + range для набора пар с batch-осями.
+        :param x_ins_obs: INS наблюдателей, (..., d)
+        :param prev_target: предыдущие позиции целей, (..., d)
+        :param z_target: GNSS целей, (..., d)
+        :param dij: расстояния наблюдатель -> цель, (...); NaN — нет измерения
+        :param alpha: веса GNSS, (...); NaN для пар без наблюдателя
+        :param valid: маска пар с наблюдателем, (...)
+        :return: оценки позиций целей, (..., d); NaN там, где оценки нет
+        """
+        alpha = alpha[..., None]
+        direction = prev_target - x_ins_obs
+        norm = np.sqrt(np.einsum("...k,...k->...", direction, direction))[..., None]
+        dij = np.where(valid, dij, np.nan)[..., None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_range_est = x_ins_obs + (dij / norm) * direction
+        fused = alpha * z_target + (1 - alpha) * x_range_est
+        return np.where((norm == 0) & valid[..., None], z_target, fused)
+
+    def fused_votes(self, state, observers, dij, alpha, T):
+        """
+        Голоса ±1 (0 — нет оценки) для всех пар без кэширования оценок.
+        :param state: SwarmState
+        :param observers: индексы наблюдателей, (N, K); -1 — пусто
+        :param dij: расстояния наблюдатель -> цель, (N, K)
+        :param alpha: веса GNSS, (N, K); NaN для пар без наблюдателя
+        :param T: порог невязки
+        :return: vote_bits.PackedVotes (N, K)
+        """
+        targets = np.arange(state.n)[:, None]
+        valid = (targets != observers) & (observers >= 0)
+        fused = self.fuse(state.x_ins[observers], state.prev_position[targets], state.z_gnss[targets],
+                          dij, alpha, valid)
+        diff = fused - state.z_gnss[:, None, :]
+        residual = np.sqrt(np.einsum("...k,...k->...", diff, diff))
+        votes = np.where(residual <= T, 1, -1).astype(np.int8)
+        votes[np.isnan(residual)] = 0
+        return PackedVotes.from_matrix(votes)
+
+    def row_blocks(self, n, width, dim):
+        """
+        Разбиение n строк пар (например, неисправных дронов при восстановлении) на блоки.
+        :return: список срезов; по умолчанию — один блок
+        """
+        return [slice(0, n)]
+
+    def map_blocks(self, fn, blocks):
+        """Выполняет fn для каждого блока; результаты — в порядке блоков."""
+        return [fn(block) for block in blocks]
+
+
+class NumbaBackend(NumpyBackend):
+    """
+    Скомпилированный Numba-конвейер: один проход по парам (параллельно по строкам), без
+    промежуточных массивов (N, K, d); голоса сразу пишутся битами. Лидер хранит только веса alpha и биты голосов.
+    Операции повторяют NumpyBackend в том же порядке, поэтому голоса совпадают бит в бит.
+    """
+    name = "numba"
+    materializes_fused = False
+
+    def __init__(self):
+        try:
+            import numba
+        except ImportError as exc:
+            raise ImportError("the numba backend requires numba: pip install numba") from exc
+        self._kernel = _build_numba_kernel(numba)
+
+    def fused_votes(self, state, observers, dij, alpha, T):
+        # Представления (ranges.T, broadcast наблюдателей) передаются без копий: Numba читает по страйдам
+        votes = PackedVotes.empty(*alpha.shape)
+        self._kernel(state.x_ins, state.prev_position, state.z_gnss, np.broadcast_to(observers, alpha.shape),
+                     dij, alpha, float(T), votes.cast, votes.negative)
+        return votes
+
+
+class TiledBackend(NumpyBackend):
+    """
+    NumPy по плиткам строк x столбцов пространства пар в пуле потоков (NumPy отпускает GIL в
+    векторных операциях): временные массивы одной плитки ограничены бюджетом памяти, голоса плитки
+    сразу пишутся в свои слова битовой матрицы. Тензор оценок (N, K, d) не материализуется.
+    Бюджет и число потоков: атрибуты memory_budget / workers или переменные окружения
+    SWARMRAFT_TILE_MB и SWARMRAFT_THREADS.
+    """
+    name = "tiled"
+    materializes_fused = False
+    BYTES_PER_PAIR_DIM = 6 * 8  # ~6 временных float64 на пару и координату (fuse + невязка)
+    BYTES_PER_PAIR = 8 * 8      # индексы, маски, alpha, расстояния, невязка
+
+    def __init__(self, memory_budget=None, workers=None):
+        """
+        :param memory_budget: предельный объём временных массивов всех плиток сразу, байт
+        :param workers: число потоков (None — по числу ядер)
+        """
+        self.memory_budget = memory_budget or float(os.environ.get("SWARMRAFT_TILE_MB", 256)) * 2 ** 20
+        self.workers = workers or int(os.environ.get("SWARMRAFT_THREADS", 0)) or os.cpu_count()
+        self._pool = None
+        self._pool_workers = None
+
+    def _pair_bytes(self, dim):
+        return self.BYTES_PER_PAIR + self.BYTES_PER_PAIR_DIM * dim
+
+    def tile_shape(self, n, width, dim):
+        """
+        Размер плитки (строки, столбцы): пары одной плитки укладываются в memory_budget / workers;
+        число столбцов кратно 64, чтобы плитки писали в непересекающиеся слова битовой матрицы.
+        """
+        pairs = max(int(self.memory_budget / self.workers / self._pair_bytes(dim)), WORD_BITS)
+        if pairs >= width:
+            cols = width
+        else:
+            cols = pairs // WORD_BITS * WORD_BITS
+        return max(min(pairs // cols, n), 1), cols
+
+    def row_blocks(self, n, width, dim):
+        rows = self.tile_shape(n, width, dim)[0]
+        return [slice(start, min(start + rows, n)) for start in range(0, n, rows)]
+
+    def map_blocks(self, fn, blocks):
+        if self.workers == 1 or len(blocks) == 1:
+            return [fn(block) for block in blocks]
+        if self._pool is None or self._pool_workers != self.workers:
+            if self._pool is not None:
+                self._pool.shutdown()
+            self._pool = ThreadPoolExecutor(max_workers=self.workers)
+            self._pool_workers = self.workers
+        return list(self._pool.map(fn, blocks))
+
+    def fused_votes(self, state, observers, dij, alpha, T):
+        n, width = alpha.shape
+        observers = np.broadcast_to(observers, alpha.shape)
+        votes = PackedVotes.empty(n, width)
+        rows, cols = self.tile_shape(n, width, state.dim)
+
+        def tile(block):
+            r, c = block
+            rs, cs = slice(r, min(r + rows, n)), slice(c, min(c + cols, width))
+            obs = observers[rs, cs]
+            targets = np.arange(rs.start, rs.stop)[:, None]
+            valid = (targets != obs) & (obs >= 0)
+            fused = self.fuse(state.x_ins[obs], state.prev_position[targets], state.z_gnss[targets],
+                              dij[rs, cs], alpha[rs, cs], valid)
+            diff = fused - state.z_gnss[targets]
+            residual = np.sqrt(np.einsum("...k,...k->...", diff, diff))
+            cast = ~np.isnan(residual)  # нет оценки — нет голоса
+            words = slice(c // WORD_BITS, c // WORD_BITS + (cs.stop - cs.start + WORD_BITS - 1) // WORD_BITS)
+            votes.cast[rs, words] = pack_bits(cast)
+            votes.negative[rs, words] = pack_bits(cast & ~(residual <= T))
+
+        self.map_blocks(tile, [(r, c) for r in range(0, n, rows) for c in range(0, width, cols)])
+        return votes
+
+
+def _build_numba_kernel(numba):
+    @numba.njit(parallel=True, cache=True)
+    def kernel(x_ins, prev, z, observers, dij, alpha, T, cast, negative):
+        n, width = alpha.shape
+        d = z.shape[1]
+        one = np.uint64(1)
+        for i in numba.prange(n):
+            for m in range(width):
+                j = observers[i, m]
+                a = alpha[i, m]
+                if j < 0 or j == i or np.isnan(a):
+                    continue
+                norm = 0.0
+                for k in range(d):
+                    diff = prev[i, k] - x_ins[j, k]
+                    norm += diff * diff
+                norm = np.sqrt(norm)
+                residual = 0.0
+                for k in range(d):
+                    if norm == 0:
+                        fused = z[i, k]
+                    else:
+                        x_range = x_ins[j, k] + (dij[i, m] / norm) * (prev[i, k] - x_ins[j, k])
+                        fused = a * z[i, k] + (1 - a) * x_range
+                    diff = fused - z[i, k]
+                    residual += diff * diff
+                residual = np.sqrt(residual)
+                if np.isnan(residual):
+                    continue  # нет оценки — нет голоса
+                bit = one << np.uint64(m & 63)
+                cast[i, m >> 6] |= bit
+                if not residual <= T:
+                    negative[i, m >> 6] |= bit
+
+    return kernel
+
+
+BACKENDS = {"numpy": NumpyBackend, "numba": NumbaBackend, "tiled": TiledBackend}
+
+
+def available_backends():
+    """Имена бэкендов, которые можно создать в текущем окружении."""
+    names = []
+    for name in BACKENDS:
+        try:
+            get_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def get_backend(name=None):
+    """
+    :param name: имя бэкенда, "auto" (лучший доступный) или None (текущий по умолчанию)
+    :return: экземпляр бэкенда (один на процесс)
+    """
+    name = _default if name is None else name
+    if name == "auto":
+        try:
+            return get_backend("numba")
+        except ImportError:
+            return get_backend("numpy")
+    if name not in BACKENDS:
+        raise ValueError(f"unknown kernel backend {name!r}; choose from {sorted(BACKENDS)} or 'auto'")
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
+
+
+def set_backend(name):
+    """Меняет бэкенд по умолчанию для лидеров, создаваемых дальше."""
+    get_backend(name)  # проверка, что бэкенд доступен
+    global _default
+    _default = name
@@ -1,20 +1,155 @@
+from contextlib import contextmanager
+
 import numpy as np
 
+import kernels
+import recovery
+from instrumentation import NULL_INSTRUMENTATION
+from swarm_state import SwarmState
+from vote_bits import PackedVotes
+
+VOTE_BLOCK_ROWS = 1024  # строк за раз при первом заполнении битовой матрицы голосов
+
+
+@contextmanager
+def seeded(seed):
+    """
+    Свой поток глобального np.random (из него LeaderNode берёт порог T и веса alpha);
+    состояние вызывающего восстанавливается. seed=None — без подмены.
+    """
+    if seed is None:
+        yield
+        return
+    saved = np.random.get_state()
+    np.random.seed(seed)
+    try:
+        yield
+    finally:
+        np.random.set_state(saved)
+
+
+def vote_threshold(gnss_var=1.0, range_noise_std=0.2, scale=2.0):
+    """
+    Порог невязки голосования: scale стандартных отклонений разности оценки и GNSS цели.
+    LeaderNode тянет scale ~ N(2, 0.3); фиксированный порог (CLI, воспроизводимые замеры) — scale=2.
+    :param gnss_var: дисперсия GNSS (sigma²)
+    :param range_noise_std: стандартное отклонение для range-сенсора
+    :param scale: число стандартных отклонений
+    :return: порог T
+    """
+    return scale * np.sqrt(gnss_var + range_noise_std ** 2)
+
 
 class LeaderNode:
-    def __init__(self, drone_nodes, range_noise_std=0.2, gnss_var=1.0, ins_var=0.25):
+    def __init__(self, drone_nodes, range_noise_std=0.2, gnss_var=1.0, ins_var=0.25, instrumentation=None,
+                 backend=None, recovery_method="median", exclude_faulty=True, recovery_options=None, tracker=None):
         """
         Инициализирует лидера.
-        :param drone_nodes: список объектов DroneNode
+        :param drone_nodes: список объектов DroneNode или готовый SwarmState
         :param range_noise_std: стандартное отклонение для range-сенсора
         :param gnss_var: дисперсия GNSS (sigma²)
         :param ins_var: дисперсия INS (sigma²)
+        :param instrumentation: instrumentation.Instrumentation для таймеров/счётчиков по фазам шага
+        :param backend: бэкенд ядра консенсуса из kernels ("numpy", "numba", "auto"; None — по умолчанию)
+        :param recovery_method: оценка восстановления: "median", "geometric_median" или "trimmed_mean"
+        :param exclude_faulty: не учитывать при восстановлении оценки от дронов, которые сами признаны неисправными
+        :param recovery_options: параметры метода восстановления (trim, max_iter, tol), см. recovery.py
+        :param tracker: kalman.SwarmKalman, живущий между шагами: его прогноз заменяет prev_position при
+                        фьюзинге, ковариации задают веса alpha и порог T; step_consensus выполняет predict/update
         """
-        self.drones = {drone.id: drone for drone in drone_nodes}
+        if isinstance(drone_nodes, SwarmState):
+            self.drones = {}
+            self._state = drone_nodes
+        else:
+            self.drones = {drone.id: drone for drone in drone_nodes}
+            self._state = None
+        self._snapshot = None  # снимок SwarmState для лидера, созданного из DroneNode
+        self._fused = None     # кэш тензора fuse_estimates, (N, N, d)
+        self._stale = None     # пары (i, j), которые нужно пересчитать, (N, N) bool
+        self._refreshed = []   # пары, пересчитанные после последнего голосования
+        self._votes = None     # кэш голосов (vote_bits.PackedVotes) и порог, с которым он посчитан
+        self._votes_T = None
+        self._alpha = None     # кэш весов alpha для бэкендов без материализации fuse_estimates, (N, K)
+        self._backend = kernels.get_backend(backend)
+        self.recovery_method = recovery_method
+        self.exclude_faulty = exclude_faulty
+        self.recovery_options = dict(recovery_options or {})
         self.range_noise_std = range_noise_std
         self.gnss_var = gnss_var
         self.ins_var = ins_var
-        self.T = np.random.normal(2.0, 0.3) * np.sqrt(self.gnss_var + self.range_noise_std ** 2)  # Порог для голосования (residual)
+        self.instrumentation = NULL_INSTRUMENTATION if instrumentation is None else instrumentation
+        self.tracker = tracker
+        self.T = vote_threshold(self.gnss_var, self.range_noise_std, np.random.normal(2.0, 0.3))  # Порог для голосования (residual)
+
+    @property
+    def state(self):
+        """
+        Текущее состояние роя. Для лидера, созданного из DroneNode, снимок собирается при первом
+        обращении и обновляется через invalidate().
+        """
+        if self._state is not None:
+            return self._state
+        if self._snapshot is None:
+            self._snapshot = SwarmState.from_drones(self.drones.values())
+        return self._snapshot
+
+    def _fusion_state(self):
+        """
+        Состояние для фьюзинга: с фильтром Калмана опорная позиция цели — прогноз фильтра, а не prev_position.
+        """
+        state = self.state
+        if self.tracker is None:
+            return state
+        return SwarmState(state.x_true, state.z_gnss, state.x_ins, self.tracker.x, state.ranges, state.ids,
+                          state.neighbors)
+
+    @property
+    def backend(self):
+        return self._backend
+
+    @backend.setter
+    def backend(self, name):
+        """Смена бэкенда во время работы; кэши сбрасываются (новые веса alpha)."""
+        self._backend = kernels.get_backend(name)
+        self._alpha = None
+        self.invalidate()
+
+    @property
+    def ids(self):
+        """
+        Идентификаторы дронов в порядке строк матриц состояния.
+        """
+        return self._state.ids if self._state is not None else list(self.drones)
+
+    def invalidate(self, ids=None):
+        """
+        Сообщает лидеру, что измерения изменились, и сбрасывает кэш фьюзинга.
+        :param ids: ID дронов, у которых изменились GNSS/INS/prev/расстояния; None — сбросить всё
+        """
+        if self._state is None:
+            self._snapshot = None
+        if ids is None or self._stale is None:
+            self._fused = None
+            self._alpha = None
+            self._stale = None
+            self._votes = None
+            return
+        index = {drone_id: k for k, drone_id in enumerate(self.ids)}
+        rows = [index[i] for i in ids]
+        # Строка i зависит от z_gnss/prev дрона i, наблюдатель j — от x_ins и расстояний дрона j
+        self._stale[rows, :] = True
+        if self.state.sparse:
+            self._stale[np.isin(self.state.neighbors, rows)] = True
+        else:
+            self._stale[:, rows] = True
+
+    def invalidate_pairs(self, stale):
+        """
+        Помечает для пересчёта отдельные пары (например, при инкрементальном шаге по времени).
+        :param stale: маска пар формы fuse_estimates()[..., 0], True — входные данные пары изменились
+        """
+        if self._stale is not None:
+            self._stale |= stale
 
     def fuse_estimate(self, from_drone, to_drone):
         """
@@ -41,68 +176,293 @@ class LeaderNode:
         fused = alpha * to_drone.z_gnss + (1 - alpha) * x_range_est
         return fused
 
+    def _draw_alpha(self, valid, observers):
+        """
+        Веса GNSS для пар с наблюдателем; тянутся в порядке обхода пар (i, j), i != j, как в попарном цикле.
+        С фильтром Калмана веса не случайные, а из ковариаций (tracker.pair_alpha).
+        :param observers: наблюдатели пар той же формы
+        :return: массив формы valid.shape, NaN для пар без наблюдателя
+        """
+        if self.instrumentation.enabled:
+            self.instrumentation.count("pairs_evaluated", int(valid.sum()))
+        if self.tracker is not None:
+            return self.tracker.pair_alpha(observers, valid)
+        alpha = np.full(valid.shape, np.nan)
+        # Блоками строк: временные массивы — (VOTE_BLOCK_ROWS, K); поток np.random тот же, что и одним вызовом
+        for start in range(0, len(valid), VOTE_BLOCK_ROWS):
+            block = valid[start:start + VOTE_BLOCK_ROWS]
+            alpha[start:start + VOTE_BLOCK_ROWS][block] = np.clip(
+                np.random.normal(0.4, 0.15, size=int(block.sum())), 0.1, 0.9)
+        return alpha
+
+    def _fuse_pairs(self, state, targets, observers, dij=None, alpha=None):
+        """
+        Векторный фьюзинг для набора пар.
+        :param state: SwarmState
+        :param targets: индексы оцениваемых дронов (broadcastable с observers)
+        :param observers: индексы наблюдателей, -1 — нет наблюдателя
+        :param dij: расстояния наблюдатель -> цель той же формы (по умолчанию из плотной state.ranges)
+        :param alpha: готовые веса пар (по умолчанию тянутся заново, см. _draw_alpha)
+        :return: массив оценок формы broadcast(targets, observers).shape + (d,); для пар без
+                 наблюдения (i == j, -1 или нет расстояния) — NaN
+        """
+        targets, observers = np.broadcast_arrays(targets, observers)
+        valid = (targets != observers) & (observers >= 0)
+        if alpha is None:
+            alpha = self._draw_alpha(valid, observers)
+        if dij is None:
+            dij = state.ranges[observers, targets]
+        return self._backend.fuse(state.x_ins[observers], state.prev_position[targets], state.z_gnss[targets],
+                                  dij, alpha, valid)
+
+    def _pair_inputs(self, state):
+        """
+        Наблюдатели и расстояния всех пар в форме (N, K) (для плотного состояния K = N).
+        """
+        return state.pairs()
+
+    def _pair_weights(self):
+        """
+        Кэш весов alpha для бэкендов без материализации оценок: веса тянутся в том же порядке, что и
+        при построении тензора fuse_estimates, поэтому голоса совпадают с NumPy-бэкендом.
+        После invalidate(ids) / invalidate_pairs веса перетягиваются только для затронутых пар,
+        а кэш голосов сбрасывается.
+        :return: alpha, (N, K)
+        """
+        state = self.state
+        observers, _ = self._pair_inputs(state)
+        if self._alpha is None:
+            self._alpha = self._draw_alpha((np.arange(state.n)[:, None] != observers) & (observers >= 0), observers)
+            self._stale = np.zeros(self._alpha.shape, dtype=bool)
+            self._votes = None
+        elif self._stale.any():
+            rows, cols = np.nonzero(self._stale)
+            pair_observers = observers[rows, cols]
+            self._alpha[rows, cols] = self._draw_alpha((rows != pair_observers) & (pair_observers >= 0),
+                                                       pair_observers)
+            self._stale[:] = False
+            self._votes = None
+        return self._alpha
+
+    def _observers(self, state):
+        """
+        Матрица наблюдателей: для плотного состояния — все дроны, для графа соседей — state.neighbors.
+        """
+        if state.sparse:
+            return state.neighbors
+        return np.arange(state.n)[None, :]
+
+    def fuse_estimates(self):
+        """
+        Фьюзинг для всех пар. Результат кэшируется и переиспользуется голосованием и восстановлением;
+        после invalidate(ids) пересчитываются только затронутые пары.
+        :return: тензор (N, N, d); [i, j] — оценка позиции дрона i от дрона j.
+                 Для графа соседей — (N, K, d); [i, m] — оценка от дрона state.neighbors[i, m].
+                 Бэкенды без материализации (numba) собирают тензор по запросу и не кэшируют его
+        """
+        state = self._fusion_state()
+        if not self._backend.materializes_fused:
+            observers, dij = self._pair_inputs(state)
+            return self._fuse_pairs(state, np.arange(state.n)[:, None], observers, dij, self._pair_weights())
+        if self._fused is None:
+            targets = np.arange(state.n)[:, None]
+            self._fused = self._fuse_pairs(state, targets, self._observers(state),
+                                           state.ranges if state.sparse else None)
+            self._stale = np.zeros(self._fused.shape[:2], dtype=bool)
+            self._votes = None
+        elif self._stale.any():
+            rows, cols = np.nonzero(self._stale)
+            observers = np.broadcast_to(self._observers(state), self._stale.shape)[rows, cols]
+            dij = state.ranges[rows, cols] if state.sparse else None
+            self._fused[rows, cols] = self._fuse_pairs(state, rows, observers, dij)
+            self._stale[:] = False
+            self._refreshed.append((rows, cols))
+        return self._fused
+
+    def _residual_votes(self, fused, z_gnss):
+        """
+        Голоса ±1 по невязке |fused - z_gnss| <= T; 0 там, где оценки нет (NaN).
+        """
+        diff = fused - z_gnss
+        residual = np.sqrt(np.einsum("...k,...k->...", diff, diff))
+        votes = np.where(residual <= self.T, 1, -1).astype(np.int8)
+        votes[np.isnan(residual)] = 0  # нет измерения расстояния — нет голоса
+        return votes
+
+    def packed_votes(self):
+        """
+        Голоса лидера в битовом виде (2 бита на пару). Кэшируются и пересчитываются только для пар,
+        обновлённых в fuse_estimates.
+        :return: vote_bits.PackedVotes формы (N, N) или (N, K) для графа соседей
+        """
+        z_gnss = self.state.z_gnss
+        if not self._backend.materializes_fused:
+            # Один проход ядра по всем парам, без тензора оценок
+            alpha = self._pair_weights()
+            if self._votes is None or self._votes_T != self.T:
+                state = self._fusion_state()
+                observers, dij = self._pair_inputs(state)
+                self._votes = self._backend.fused_votes(state, observers, dij, alpha, self.T)
+                self._votes_T = self.T
+            return self._votes
+
+        fused = self.fuse_estimates()
+        if self._votes is None or self._votes_T != self.T:
+            # Блоками строк: временные массивы невязок — (VOTE_BLOCK_ROWS, K), а не (N, K)
+            self._votes = PackedVotes.empty(*fused.shape[:2])
+            for start in range(0, len(fused), VOTE_BLOCK_ROWS):
+                stop = start + VOTE_BLOCK_ROWS
+                self._votes.set_rows(start, self._residual_votes(fused[start:stop], z_gnss[start:stop, None, :]))
+            self._votes_T = self.T
+        else:
+            for rows, cols in self._refreshed:
+                self._votes.set_pairs(rows, cols, self._residual_votes(fused[rows, cols], z_gnss[rows]))
+        self._refreshed = []
+        return self._votes
+
+    def full_votes(self):
+        """
+        Голоса всех пар по текущим входным данным без кэша голосов, с теми же весами alpha, что и
+        packed_votes. Только для бэкендов без материализации оценок (у NumPy-бэкенда веса не хранятся).
+        Эталон для проверки инкрементального шага (см. EpochSimulator(verify=True)).
+        :return: vote_bits.PackedVotes
+        """
+        if self._backend.materializes_fused:
+            raise ValueError("full_votes needs a backend that keeps pair weights (tiled or numba)")
+        state = self._fusion_state()
+        observers, dij = self._pair_inputs(state)
+        return self._backend.fused_votes(state, observers, dij, self._pair_weights(), self.T)
+
+    def vote_matrix(self, fused=None):
+        """
+        Голоса в виде матрицы.
+        :param fused: готовый тензор fuse_estimates (по умолчанию — распаковка кэша packed_votes)
+        :return: матрица (N, N) int8; [i, j] = ±1 — голос дрона j о дроне i, 0 — нет голоса
+                 (диагональ, нет измерения). Для графа соседей — (N, K), по столбцам state.neighbors
+        """
+        if fused is not None:
+            return self._residual_votes(fused, self.state.z_gnss[:, None, :])
+        return self.packed_votes().to_matrix()
+
     def compute_votes(self):
         """
         Все дроны голосуют о честности GNSS друг друга.
         :return: словарь {i: [v1, v2, ..., vn]} где vj = ±1
         """
-        votes = {i: [] for i in self.drones}
-        for i in self.drones:
-            for j in self.drones:
-                if i == j:
-                    continue
-                fused = self.fuse_estimate(self.drones[j], self.drones[i])
-                residual = np.linalg.norm(fused - self.drones[i].z_gnss)
-                vote = 1 if residual <= self.T else -1
-                votes[i].append(vote)
-        return votes
+        votes = self.vote_matrix()
+        return {drone_id: votes[k][votes[k] != 0].tolist() for k, drone_id in enumerate(self.ids)}
 
     def detect_faulty_nodes(self, votes, f=1):
         """
         На основе голосов решает, кто неисправен.
-        :param votes: словарь голосов {i: [v1, v2, ..., vn]}
+        :param votes: словарь голосов {i: [v1, v2, ..., vn]}, матрица из vote_matrix или PackedVotes
         :param f: макс. число неисправных узлов
         :return: множество ID неисправных узлов
         """
+        if isinstance(votes, PackedVotes):
+            # Подсчёт popcount по словам битовой матрицы, без распаковки
+            ids = self.ids
+            return {ids[k] for k in np.flatnonzero(votes.faulty_rows(f))}
+        if isinstance(votes, np.ndarray):
+            # Порог -(n - f), где n — число участников (проголосовавшие + сам дрон); для полного
+            # графа n = N. Для графа соседей f ограничивается так, чтобы нужен был хотя бы один голос против
+            ids = self.ids
+            totals = votes.sum(axis=1, dtype=np.int64)
+            participants = np.count_nonzero(votes, axis=1) + 1
+            return {ids[k] for k in np.flatnonzero(totals <= -np.maximum(participants - f, 1))}
+
         faulty_nodes = set()
-        n = len(self.drones)
+        n = len(votes)
         for i, vlist in votes.items():
             total = sum(vlist)
             if total <= -(n - f):
                 faulty_nodes.add(i)
         return faulty_nodes
 
-    def recover_positions(self, faulty_nodes):
+    def recover_positions(self, faulty_nodes, exclude=None):
         """
-        Восстанавливает позиции для неисправных дронов по медиане оценок соседей.
+        Восстанавливает позиции всех неисправных дронов пакетами (F, K, d) по оценкам соседей
+        методом self.recovery_method (размер пакетов задаёт бэкенд, по умолчанию — один пакет).
+        Используются те же оценки, по которым голосовали (кэш fuse_estimates).
+        При exclude_faulty оценки от неисправных наблюдателей маскируются; если у дрона не осталось
+        ни одного исправного наблюдателя, используются все.
         :param faulty_nodes: множество ID неисправных дронов
+        :param exclude: ID наблюдателей, чьи оценки маскируются (по умолчанию faulty_nodes)
         :return: словарь {id: восстановленная позиция}
         """
-        recovered = {}
-        for i in faulty_nodes:
-            peer_estimates = []
-            for j in self.drones:
-                if i != j:
-                    fused = self.fuse_estimate(self.drones[j], self.drones[i])
-                    peer_estimates.append(fused)
-            peer_estimates = np.array(peer_estimates)
-            median_est = np.median(peer_estimates, axis=0)
-            recovered[i] = median_est
-        return recovered
+        faulty = list(faulty_nodes)
+        if not faulty:
+            return {}
+        state = self._fusion_state()
+        index = {drone_id: k for k, drone_id in enumerate(self.ids)}
+        rows = np.array([index[i] for i in faulty])
+        observers, dij = self._pair_inputs(state)
+        fused = self.fuse_estimates() if self._backend.materializes_fused else None
+        alpha = None if fused is not None else self._pair_weights()
+        flagged = np.zeros(state.n + 1, dtype=bool)  # +1: индекс -1 (пустой сосед) попадает в False
+        flagged[rows if exclude is None else [index[i] for i in exclude]] = True
+
+        def recover_block(block):
+            block_rows = rows[block]
+            if fused is not None:
+                estimates = fused[block_rows]
+            else:
+                # Оценки только для строк неисправных дронов, с теми же весами, что и при голосовании
+                estimates = self._fuse_pairs(state, block_rows[:, None], observers[block_rows], dij[block_rows],
+                                             alpha[block_rows])
+            mask = ~np.isnan(estimates).any(axis=2)  # пары без наблюдения — NaN
+            if self.exclude_faulty:
+                honest = mask & ~flagged[observers[block_rows]]
+                mask = np.where(honest.any(axis=1)[:, None], honest, mask)
+            return recovery.recover(estimates, mask, self.recovery_method, **self.recovery_options)
+
+        # Бэкенд решает, сколько строк восстанавливать за раз (tiled — блоки под бюджет памяти в потоках)
+        blocks = self._backend.row_blocks(len(rows), observers.shape[1], state.dim)
+        recovered = np.concatenate(self._backend.map_blocks(recover_block, blocks))
+        return {i: recovered[k] for k, i in enumerate(faulty)}
 
     def step_consensus(self, f=1):
         """
         Полный шаг SwarmRaft: голосование + восстановление.
+        С фильтром Калмана шаг начинается с predict (прогноз и порог T для голосования) и заканчивается
+        update по расстояниям и GNSS дронов, не признанных неисправными.
         :return: словарь {drone_id: final_position (np.array)}
         """
-        votes = self.compute_votes()
-        faulty = self.detect_faulty_nodes(votes, f=f)
-        recovered = self.recover_positions(faulty)
+        inst = self.instrumentation
+        inst.begin_step()
+        # end_step в finally: исключение посреди шага не оставляет незакрытую запись и запущенный профайлер
+        try:
+            state = self.state
+            if self.tracker is not None:
+                with inst.phase("filter"):
+                    self.tracker.predict(state)
+                    self.T = self.tracker.threshold()
+                    self.invalidate()  # прогноз сдвинул опорные позиции всех пар
+            with inst.phase("fusion"):
+                if self._backend.materializes_fused:
+                    self.fuse_estimates()
+                else:
+                    self._pair_weights()  # фьюзинг выполняется ядром внутри голосования
+            with inst.phase("voting"):
+                votes = self.packed_votes()
+            with inst.phase("detection"):
+                faulty = self.detect_faulty_nodes(votes, f=f)
+            with inst.phase("recovery"):
+                recovered = self.recover_positions(faulty)
+            if inst.enabled:
+                inst.count("votes_cast", votes.counts()[0].sum())
+                inst.count("nodes_flagged", len(faulty))
+                inst.count("nodes_recovered", len(recovered))
+            if self.tracker is not None:
+                with inst.phase("filter"):
+                    self.tracker.update(state, np.isin(state.ids, list(faulty)))
 
-        final_positions = {}
-        for i in self.drones:
-            if i in recovered:
-                final_positions[i] = recovered[i]
-            else:
-                final_positions[i] = self.drones[i].z_gnss  # или можно использовать INS
-        return final_positions, faulty
+            final_positions = {}
+            for k, i in enumerate(state.ids):
+                if i in recovered:
+                    final_positions[i] = recovered[i]
+                else:
+                    final_positions[i] = state.z_gnss[k]  # или можно использовать INS
+            return final_positions, faulty
+        finally:
+            inst.end_step()
@@ -0,0 +1,19 @@
+import numpy as np
+
+
+def mean_absolute_error(y_true, y_pred):
+    """
+    MAE по всем координатам всех дронов (как sklearn.metrics.mean_absolute_error с uniform_average).
+    :param y_true: истинные позиции, (N, d)
+    :param y_pred: оценки позиций, (N, d)
+    """
+    return float(np.mean(np.abs(np.asarray(y_true, dtype=float) - np.asarray(y_pred, dtype=float))))
+
+
+def mean_squared_error(y_true, y_pred):
+    """MSE по всем координатам всех дронов."""
+    return float(np.mean((np.asarray(y_true, dtype=float) - np.asarray(y_pred, dtype=float)) ** 2))
+
+
+def root_mean_squared_error(y_true, y_pred):
+    return float(np.sqrt(mean_squared_error(y_true, y_pred)))
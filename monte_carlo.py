@@ -0,0 +1,116 @@
+import numpy as np
+
+COLUMNS = ("Num_Drones", "Num_Attacked", "MAE_GNSS", "MAE_Recovered", "RMSE_GNSS", "RMSE_Recovered")
+
+# Пик памяти simulate_batch на одну тройку (испытание, наблюдатель, цель): ~16 float64 в тензорах (R, N, N[, d])
+PAIR_BYTES = 128
+BATCH_BYTES = 256 * 2 ** 20
+
+
+def _fuse(z_target, prev_target, x_ins_obs, d_obs, alpha):
+    """
+    Фьюзинг GNSS + range для пачки целей сразу (как LeaderNode.fuse_estimate, но с batch-осями).
+    :param z_target: GNSS цели, (..., 1, d)
+    :param prev_target: предыдущая позиция цели, (..., 1, d)
+    :param x_ins_obs: INS наблюдателей, (..., N, d)
+    :param d_obs: расстояния наблюдатель -> цель, (..., N)
+    :param alpha: веса GNSS, (..., N)
+    :return: оценки позиции цели от каждого наблюдателя, (..., N, d)
+    """
+    direction = prev_target - x_ins_obs
+    norm = np.sqrt(np.einsum("...k,...k->...", direction, direction))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_range = x_ins_obs + (d_obs / norm)[..., None] * direction
+    fused = alpha[..., None] * z_target + (1 - alpha[..., None]) * x_range
+    return np.where((norm == 0)[..., None], z_target, fused)
+
+
+def _draw_alpha(rng, size):
+    return np.clip(rng.normal(0.4, 0.15, size=size), 0.1, 0.9)
+
+
+def simulate_batch(N, f, repeats, bias=15.0, area=20.0, gnss_noise_std=1.0, range_noise_std=0.2,
+                   ins_std_range=(0.3, 1.0), range_attack=2.0, rng=None):
+    """
+    Одна пачка из repeats независимых испытаний (N дронов, f атакованных) тензорами (R, N, N).
+    Модель повторяет generate_attack_experiments: спуфинг GNSS на [bias, -bias], искажение
+    измерений расстояний атакующих, случайные голоса атакующих, медианное восстановление.
+    :param rng: np.random.Generator или модуль np.random (по умолчанию глобальный генератор)
+    :return: словарь колонок COLUMNS (массивы длины repeats)
+    """
+    rng = np.random if rng is None else rng
+    R, d = repeats, 2
+
+    x_true = rng.random((R, N, d)) * area
+    z_gnss = x_true + rng.normal(0, gnss_noise_std, size=(R, N, d))
+    prev_position = x_true - rng.normal(0, 1.0, size=(R, N, d))
+    ins_std = rng.uniform(*ins_std_range, size=(R, N, 1))
+    x_ins = prev_position + (x_true - prev_position) + rng.normal(0, 1.0, size=(R, N, d)) * ins_std
+
+    diff = x_true[:, :, None, :] - x_true[:, None, :, :]
+    ranges = np.sqrt(np.einsum("rijk,rijk->rij", diff, diff)) + rng.normal(0, range_noise_std, size=(R, N, N))
+
+    # Атака: f случайных дронов в каждом испытании
+    attacked = np.zeros((R, N), dtype=bool)
+    np.put_along_axis(attacked, np.argsort(rng.random((R, N)), axis=1)[:, :f], True, axis=1)
+    z_gnss = z_gnss + attacked[:, :, None] * np.array([bias, -bias])
+    ranges = ranges + attacked[:, :, None] * rng.uniform(-range_attack, range_attack, size=(R, N, N))
+
+    T = rng.normal(2.0, 0.3, size=(R, 1, 1)) * np.sqrt(gnss_noise_std ** 2 + range_noise_std ** 2)
+
+    # Голосование: [r, i, j] — голос дрона j о дроне i
+    fused = _fuse(z_gnss[:, :, None, :], prev_position[:, :, None, :], x_ins[:, None, :, :],
+                  ranges.transpose(0, 2, 1), _draw_alpha(rng, (R, N, N)))
+    residual = np.linalg.norm(fused - z_gnss[:, :, None, :], axis=-1)
+    votes = np.where(residual <= T, 1, -1)
+    random_votes = np.where(rng.random((R, N, N)) < 0.5, 1, -1)
+    votes = np.where(attacked[:, None, :], random_votes, votes)
+    votes[:, np.arange(N), np.arange(N)] = 0
+    faulty = votes.sum(axis=2) <= -(N - f)
+
+    # Восстановление: медиана оценок соседей только для неисправных (r, i)
+    final = z_gnss.copy()
+    r_idx, i_idx = np.nonzero(faulty)
+    if len(r_idx):
+        estimates = _fuse(z_gnss[r_idx, i_idx][:, None, :], prev_position[r_idx, i_idx][:, None, :],
+                          x_ins[r_idx], ranges[r_idx, :, i_idx], _draw_alpha(rng, (len(r_idx), N)))
+        peers = np.arange(N)[None, :] != i_idx[:, None]
+        final[r_idx, i_idx] = np.median(estimates[peers].reshape(len(r_idx), N - 1, d), axis=1)
+
+    err_gnss = (z_gnss - x_true).reshape(R, -1)
+    err_rec = (final - x_true).reshape(R, -1)
+    return {
+        "Num_Drones": np.full(R, N),
+        "Num_Attacked": np.full(R, f),
+        "MAE_GNSS": np.abs(err_gnss).mean(axis=1),
+        "MAE_Recovered": np.abs(err_rec).mean(axis=1),
+        "RMSE_GNSS": np.sqrt((err_gnss ** 2).mean(axis=1)),
+        "RMSE_Recovered": np.sqrt((err_rec ** 2).mean(axis=1)),
+    }
+
+
+def batch_size_for(N, batch_bytes=BATCH_BYTES):
+    """
+    Число испытаний в пачке, при котором тензоры (R, N, N) укладываются в бюджет памяти.
+    :param N: число дронов
+    :param batch_bytes: бюджет памяти одной пачки в байтах
+    :return: R >= 1
+    """
+    return max(1, int(batch_bytes) // (PAIR_BYTES * N * N))
+
+
+def run_trials(N, f, repeats, batch_size=None, rng=None, batch_bytes=BATCH_BYTES, **kwargs):
+    """
+    Все испытания одной ячейки (N, f), разбитые на пачки для ограничения памяти.
+    :param batch_size: число испытаний в одной пачке (R); по умолчанию — из batch_bytes (batch_size_for)
+    :param rng: np.random.Generator или модуль np.random
+    :param batch_bytes: бюджет памяти пачки, если batch_size не задан
+    :param kwargs: параметры модели, см. simulate_batch
+    :return: словарь колонок COLUMNS (массивы длины repeats)
+    """
+    if batch_size is None:
+        batch_size = batch_size_for(N, batch_bytes)
+    batches = []
+    for start in range(0, repeats, batch_size):
+        batches.append(simulate_batch(N, f, min(batch_size, repeats - start), rng=rng, **kwargs))
+    return {col: np.concatenate([b[col] for b in batches]) for col in COLUMNS}
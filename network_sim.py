@@ -0,0 +1,222 @@
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from leader_node import LeaderNode
+from swarm_state import SwarmState
+
+HEADER_BYTES = 32  # заголовок сообщения: ID дрона, номер эпохи, служебные поля
+
+
+class Link:
+    def __init__(self, latency=0.005, jitter=0.002, distribution="normal", loss=0.0, bandwidth=None):
+        """
+        Модель канала дрон -> лидер.
+        :param latency: средняя задержка распространения, с
+        :param jitter: разброс задержки (std для normal/lognormal, не используется для exponential)
+        :param distribution: распределение задержки: "constant", "normal", "exponential", "lognormal"
+        :param loss: вероятность потери пакета
+        :param bandwidth: пропускная способность канала, байт/с (None — без ограничения)
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.distribution = distribution
+        self.loss = loss
+        self.bandwidth = bandwidth
+        self.busy_until = 0.0  # время освобождения канала (очередь на передачу)
+
+    def sample_latency(self, rng):
+        if self.distribution == "constant":
+            return self.latency
+        if self.distribution == "normal":
+            return max(rng.normal(self.latency, self.jitter), 0.0)
+        if self.distribution == "exponential":
+            return rng.exponential(self.latency)
+        if self.distribution == "lognormal":
+            sigma2 = np.log1p((self.jitter / self.latency) ** 2)
+            return rng.lognormal(np.log(self.latency) - sigma2 / 2, np.sqrt(sigma2))
+        raise ValueError(f"unknown latency distribution: {self.distribution}")
+
+    def transmit_delay(self, now, size):
+        """
+        Задержка до выхода сообщения из канала с учётом очереди на передачу (без распространения).
+        """
+        if self.bandwidth is None:
+            return 0.0
+        start = max(now, self.busy_until)
+        self.busy_until = start + size / self.bandwidth
+        return self.busy_until - now
+
+
+class NetworkSimulator:
+    def __init__(self, n_drones, link=None, ingress_bandwidth=None, deadline=0.05, sample_jitter=0.0, rng=None):
+        """
+        Сбор измерений лидером по сети: каждое сообщение проходит канал дрона (задержка, потери,
+        пропускная способность) и общий входной канал лидера. Консенсус считается по тому, что
+        пришло до дедлайна.
+        :param n_drones: число дронов
+        :param link: Link-шаблон или функция i -> Link (по умолчанию Link())
+        :param ingress_bandwidth: общая пропускная способность приёма лидера, байт/с
+        :param deadline: дедлайн сбора от начала эпохи, с
+        :param sample_jitter: разброс моментов отправки дронами (равномерно в [0, sample_jitter]), с
+        :param rng: np.random.Generator или модуль np.random
+        """
+        self.rng = np.random if rng is None else rng
+        if link is None or isinstance(link, Link):
+            template = Link() if link is None else link
+
+            def link(i):
+                return Link(template.latency, template.jitter, template.distribution, template.loss, template.bandwidth)
+        self.links = [link(i) for i in range(n_drones)]
+        self.ingress = Link(latency=0.0, distribution="constant", bandwidth=ingress_bandwidth)
+        self.deadline = deadline
+        self.sample_jitter = sample_jitter
+        self.epoch = 0
+        self.last_positions = None  # последние позиции, выданные лидером
+        # Очередь приёма живёт между эпохами: сообщения, не успевшие к дедлайну, приходят в следующую
+        self._inbox = None
+        self._inbox_loop = None
+
+    @staticmethod
+    def message_size(state):
+        """Размер сообщения дрона: GNSS, INS, prev (d float64) и строка расстояний (float64)."""
+        return HEADER_BYTES + 8 * (3 * state.dim + state.ranges.shape[1])
+
+    async def _send(self, i, epoch, size, inbox, stats):
+        loop = asyncio.get_running_loop()
+        if self.sample_jitter > 0:
+            await asyncio.sleep(self.rng.uniform(0, self.sample_jitter))
+        link = self.links[i]
+        stats["sent"] += 1
+        stats["bytes"] += size
+        if self.rng.random() < link.loss:
+            stats["lost"] += 1
+            return
+        delay = link.transmit_delay(loop.time(), size) + link.sample_latency(self.rng)
+        loop.call_later(delay, self._arrive_at_ingress, i, epoch, size, inbox)
+
+    def _arrive_at_ingress(self, i, epoch, size, inbox):
+        # Общий входной канал лидера обслуживает сообщения в порядке прихода
+        loop = asyncio.get_running_loop()
+        delay = self.ingress.transmit_delay(loop.time(), size)
+        if delay > 0:
+            loop.call_later(delay, inbox.put_nowait, (i, epoch))
+        else:
+            inbox.put_nowait((i, epoch))
+
+    def _get_inbox(self):
+        loop = asyncio.get_running_loop()
+        if self._inbox_loop is not loop:  # asyncio.Queue привязана к циклу событий (новый asyncio.run)
+            self._inbox, self._inbox_loop = asyncio.Queue(), loop
+        return self._inbox
+
+    async def run_epoch(self, state, f=1):
+        """
+        Одна эпоха: дроны отправляют измерения, лидер ждёт до дедлайна и считает консенсус
+        по пришедшему подмножеству. Сообщения прошлых эпох, пришедшие после их дедлайна,
+        отбрасываются и считаются в Late_Previous_Epoch.
+        :param state: SwarmState с измерениями эпохи
+        :param f: макс. число неисправных узлов
+        :return: (позиции (N, d) — NaN для дронов без данных и без прошлой оценки, множество faulty, метрики)
+        """
+        loop = asyncio.get_running_loop()
+        epoch, self.epoch = self.epoch, self.epoch + 1
+        inbox = self._get_inbox()
+        stats = {"sent": 0, "lost": 0, "bytes": 0}
+        size = self.message_size(state)
+        start = loop.time()
+        senders = [loop.create_task(self._send(i, epoch, size, inbox, stats)) for i in range(state.n)]
+
+        arrived = np.zeros(state.n, dtype=bool)
+        late = 0
+        while not arrived.all():
+            remaining = start + self.deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                i, msg_epoch = await asyncio.wait_for(inbox.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if msg_epoch == epoch:
+                arrived[i] = True
+            else:
+                late += 1  # опоздавшее сообщение прошлой эпохи
+        network_time = loop.time() - start
+        for task in senders:
+            task.cancel()
+
+        cpu_start = time.perf_counter()
+        positions, faulty = self._consensus(state, arrived, f)
+        consensus_time = time.perf_counter() - cpu_start
+
+        metrics = {
+            "Epoch": epoch,
+            "Num_Drones": state.n,
+            "Arrived": int(arrived.sum()),
+            "Lost": stats["lost"],
+            "Late_Previous_Epoch": late,
+            "Messages": stats["sent"],
+            "Bytes": stats["bytes"],
+            "Network_Time_s": network_time,
+            "Consensus_Time_s": consensus_time,
+            "End_To_End_s": network_time + consensus_time,
+            "Num_Faulty": len(faulty),
+        }
+        return positions, faulty, metrics
+
+    def _consensus(self, state, arrived, f):
+        """
+        Консенсус по подмножеству дронов, чьи сообщения пришли. Остальным — прошлая оценка лидера.
+        """
+        idx = np.flatnonzero(arrived)
+        positions = np.full(state.x_true.shape, np.nan) if self.last_positions is None else self.last_positions.copy()
+        if len(idx) == 0:
+            return positions, set()
+
+        sub = state.subset(idx)
+        final, faulty = LeaderNode(sub).step_consensus(f=f)
+        positions[idx] = np.array([final[i] for i in sub.ids])
+        self.last_positions = positions
+        return positions, faulty
+
+
+async def simulate(n_drones, epochs=5, n_attackers=0, f=1, radius=None, k=None, **net_kwargs):
+    """
+    Несколько эпох со свежими измерениями через сеть.
+    :return: список метрик по эпохам
+    """
+    net = NetworkSimulator(n_drones, **net_kwargs)
+    records = []
+    for _ in range(epochs):
+        state = SwarmState.generate(np.random.rand(n_drones, 2) * 20 * np.sqrt(n_drones / 5), radius=radius, k=k)
+        state.z_gnss[:n_attackers] += np.array([15.0, -15.0])
+        _, _, metrics = await net.run_epoch(state, f=f)
+        records.append(metrics)
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SwarmRaft measurement gathering over a simulated network")
+    parser.add_argument("--n_values", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--jitter", type=float, default=0.002)
+    parser.add_argument("--loss", type=float, default=0.01)
+    parser.add_argument("--link_bandwidth", type=float, default=None, help="bytes/s per drone link")
+    parser.add_argument("--ingress_bandwidth", type=float, default=1e7, help="bytes/s into the leader")
+    parser.add_argument("--deadline", type=float, default=0.05)
+    parser.add_argument("--k", type=int, default=None, help="neighbor-limited ranging")
+    args = parser.parse_args()
+
+    np.random.seed(42)
+    link = Link(args.latency, args.jitter, "normal", args.loss, args.link_bandwidth)
+    for n in args.n_values:
+        rows = asyncio.run(simulate(n, epochs=args.epochs, k=args.k, link=link,
+                                    ingress_bandwidth=args.ingress_bandwidth, deadline=args.deadline))
+        mean = {key: np.mean([r[key] for r in rows]) for key in rows[0]}
+        bottleneck = "network" if mean["Network_Time_s"] > mean["Consensus_Time_s"] else "cpu"
+        print(f"N={n}: arrived={mean['Arrived']:.0f}/{n}, bytes/epoch={mean['Bytes']:.0f}, "
+              f"network={mean['Network_Time_s'] * 1e3:.1f} ms, consensus={mean['Consensus_Time_s'] * 1e3:.1f} ms, "
+              f"bottleneck={bottleneck}")
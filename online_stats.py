@@ -0,0 +1,170 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+
+METRICS = ("MAE_GNSS", "MAE_Recovered", "RMSE_GNSS", "RMSE_Recovered")
+
+
+class RunningStats:
+    def __init__(self):
+        """
+        Среднее и дисперсия за один проход (Welford, пачки сливаются формулой Чана): O(1) памяти.
+        """
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # сумма квадратов отклонений от среднего
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        n = len(values)
+        if n == 0:
+            return
+        batch_mean = values.mean()
+        batch_m2 = ((values - batch_mean) ** 2).sum()
+        self._merge(n, batch_mean, batch_m2)
+
+    def merge(self, other):
+        self._merge(other.count, other.mean, other.m2)
+
+    def _merge(self, n, mean, m2):
+        if n == 0:
+            return
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+    @property
+    def variance(self):
+        """Выборочная дисперсия (ddof=1)."""
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def ci_halfwidth(self, confidence=0.95):
+        """Полуширина нормального доверительного интервала среднего."""
+        if self.count < 2:
+            return math.inf
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        return z * self.std / math.sqrt(self.count)
+
+
+class P2Quantile:
+    def __init__(self, q):
+        """
+        Оценка квантиля q алгоритмом P² (Jain & Chlamtac, 1985): пять маркеров, O(1) памяти.
+        :param q: уровень квантиля в (0, 1)
+        """
+        self.q = q
+        self.count = 0
+        self._heights = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self._increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def update(self, values):
+        for x in np.asarray(values, dtype=float).ravel():
+            self._add(float(x))
+
+    def _add(self, x):
+        self.count += 1
+        h = self._heights
+        if len(h) < 5:
+            h.append(x)
+            h.sort()
+            return
+
+        if x < h[0]:
+            h[0] = x
+            k = 0
+        elif x >= h[4]:
+            h[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if h[i] <= x < h[i + 1])
+        n = self._positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # Сдвиг трёх средних маркеров к желаемым позициям
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                height = self._parabolic(i, step)
+                if not h[i - 1] < height < h[i + 1]:
+                    height = h[i] + step * (h[i + step] - h[i]) / (n[i + step] - n[i])
+                h[i] = height
+                n[i] += step
+
+    def _parabolic(self, i, step):
+        h, n = self._heights, self._positions
+        return h[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    @property
+    def value(self):
+        if not self._heights:
+            return math.nan
+        if self.count < 5:
+            # Пока маркеров меньше пяти — точный квантиль по накопленным значениям
+            return float(np.quantile(self._heights, self.q))
+        return self._heights[2]
+
+
+class MetricAggregator:
+    def __init__(self, metrics=METRICS, quantiles=(0.5, 0.95)):
+        """
+        Онлайн-агрегаты метрик одной ячейки свипа вместо списка всех испытаний.
+        :param metrics: имена колонок с метриками
+        :param quantiles: отслеживаемые квантили
+        """
+        self.metrics = tuple(metrics)
+        self.stats = {m: RunningStats() for m in self.metrics}
+        self.quantiles = {m: [P2Quantile(q) for q in quantiles] for m in self.metrics}
+
+    @property
+    def count(self):
+        return self.stats[self.metrics[0]].count
+
+    def update(self, columns):
+        """
+        :param columns: словарь колонок (например, результат monte_carlo.simulate_batch)
+        """
+        for m in self.metrics:
+            self.stats[m].update(columns[m])
+            for estimator in self.quantiles[m]:
+                estimator.update(columns[m])
+
+    def ci_halfwidth(self, confidence=0.95):
+        """Наибольшая по метрикам полуширина доверительного интервала среднего."""
+        return max(self.stats[m].ci_halfwidth(confidence) for m in self.metrics)
+
+    def converged(self, tolerance, confidence=0.95):
+        """
+        :param tolerance: допустимая полуширина доверительного интервала (в единицах метрик, м)
+        :return: True, если интервалы всех метрик не шире tolerance
+        """
+        return self.ci_halfwidth(confidence) <= tolerance
+
+    def summary(self, confidence=0.95):
+        """
+        :return: плоский словарь <metric>_mean/_std/_ci/_p50/... и Repeats
+        """
+        row = {"Repeats": self.count}
+        for m in self.metrics:
+            s = self.stats[m]
+            row[f"{m}_mean"] = s.mean
+            row[f"{m}_std"] = s.std
+            row[f"{m}_ci"] = s.ci_halfwidth(confidence)
+            for estimator in self.quantiles[m]:
+                row[f"{m}_p{round(estimator.q * 100):g}"] = estimator.value
+        return row
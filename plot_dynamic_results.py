@@ -1,41 +1,64 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-
-# Загружаем динамически сгенерированные данные
-df = pd.read_csv("swarmraft_multi_attacks_dynamic.csv")
-
-# Группируем и считаем среднее + стандартное отклонение
-grouped = df.groupby("Num_Attacked").agg(
-    MAE_GNSS_mean=("MAE_GNSS", "mean"),
-    MAE_GNSS_std=("MAE_GNSS", "std"),
-    MAE_Rec_mean=("MAE_Recovered", "mean"),
-    MAE_Rec_std=("MAE_Recovered", "std"),
-    RMSE_GNSS_mean=("RMSE_GNSS", "mean"),
-    RMSE_GNSS_std=("RMSE_GNSS", "std"),
-    RMSE_Rec_mean=("RMSE_Recovered", "mean"),
-    RMSE_Rec_std=("RMSE_Recovered", "std")
-).reset_index()
-
-x = grouped["Num_Attacked"]
-
-# Рисуем
-fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
-
-ax1.errorbar(x, grouped["MAE_GNSS_mean"], yerr=grouped["MAE_GNSS_std"], fmt='-o', capsize=5, label="GNSS MAE")
-ax1.errorbar(x, grouped["MAE_Rec_mean"], yerr=grouped["MAE_Rec_std"], fmt='-o', capsize=5, label="Recovered MAE")
-ax1.set_title("MAE vs Number of Attacked Drones")
-ax1.set_xlabel("Number of Attacked Drones")
-ax1.set_ylabel("Mean Absolute Error (m)")
-ax1.grid(True)
-ax1.legend()
-
-ax2.errorbar(x, grouped["RMSE_GNSS_mean"], yerr=grouped["RMSE_GNSS_std"], fmt='-o', capsize=5, label="GNSS RMSE")
-ax2.errorbar(x, grouped["RMSE_Rec_mean"], yerr=grouped["RMSE_Rec_std"], fmt='-o', capsize=5, label="Recovered RMSE")
-ax2.set_title("RMSE vs Number of Attacked Drones")
-ax2.set_xlabel("Number of Attacked Drones")
-ax2.set_ylabel("Root Mean Square Error (m)")
-ax2.grid(True)
-ax2.legend()
-
-plt.tight_layout()
-plt.show()
+import argparse
+
+
+def plot_errors(grouped, path=None):
+    """
+    MAE/RMSE (среднее ± std) от числа атакованных дронов.
+    :param grouped: таблица results_store.aggregate(..., by=("Num_Attacked",), stats=("mean", "std"))
+    :param path: файл для сохранения (headless, backend Agg); None — показать окно
+    """
+    import matplotlib
+    if path is not None:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    x = grouped["Num_Attacked"]
+
+    # Рисуем
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
+
+    ax1.errorbar(x, grouped["MAE_GNSS_mean"], yerr=grouped["MAE_GNSS_std"], fmt='-o', capsize=5, label="GNSS MAE")
+    ax1.errorbar(x, grouped["MAE_Recovered_mean"], yerr=grouped["MAE_Recovered_std"], fmt='-o', capsize=5,
+                 label="Recovered MAE")
+    ax1.set_title("MAE vs Number of Attacked Drones")
+    ax1.set_xlabel("Number of Attacked Drones")
+    ax1.set_ylabel("Mean Absolute Error (m)")
+    ax1.grid(True)
+    ax1.legend()
+
+    ax2.errorbar(x, grouped["RMSE_GNSS_mean"], yerr=grouped["RMSE_GNSS_std"], fmt='-o', capsize=5,
+                 label="GNSS RMSE")
+    ax2.errorbar(x, grouped["RMSE_Recovered_mean"], yerr=grouped["RMSE_Recovered_std"], fmt='-o', capsize=5,
+                 label="Recovered RMSE")
+    ax2.set_title("RMSE vs Number of Attacked Drones")
+    ax2.set_xlabel("Number of Attacked Drones")
+    ax2.set_ylabel("Root Mean Square Error (m)")
+    ax2.grid(True)
+    ax2.legend()
+
+    fig.tight_layout()
+    if path is None:
+        plt.show()
+    else:
+        fig.savefig(path, dpi=120)
+    plt.close(fig)
+
+
+def load_grouped(results, n_drones=None):
+    """
+    Агрегация выполняется в Arrow: читаются только нужные колонки и разделы Num_Drones.
+    """
+    from results_store import aggregate
+
+    filters = None if n_drones is None else {"Num_Drones": n_drones}
+    return aggregate(results, by=("Num_Attacked",), stats=("mean", "std"), filters=filters)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plot SwarmRaft errors vs number of attacked drones")
+    parser.add_argument("--results", default="swarmraft_results", help="results store written by the experiments")
+    parser.add_argument("--n_drones", type=int, default=None, help="plot a single swarm size (default: all)")
+    parser.add_argument("--output", default=None, help="save the figure to this file instead of showing it")
+    args = parser.parse_args()
+
+    plot_errors(load_grouped(args.results, args.n_drones), args.output)
@@ -0,0 +1,407 @@
+import argparse
+import asyncio
+import random
+import time
+
+import numpy as np
+
+from leader_node import LeaderNode
+from swarm_state import SwarmState
+
+FOLLOWER, CANDIDATE, LEADER = "follower", "candidate", "leader"
+
+
+class InMemoryTransport:
+    def __init__(self, latency=0.0):
+        """
+        Локальный транспорт: у каждого пира своя asyncio.Queue.
+        :param latency: задержка доставки сообщения, с
+        """
+        self.latency = latency
+        self._inboxes = {}
+        self._down = set()
+        self.messages_sent = 0
+
+    def register(self, peer_id):
+        self._inboxes[peer_id] = asyncio.Queue()
+        return self._inboxes[peer_id]
+
+    def disconnect(self, peer_id):
+        """Пир недоступен: его сообщения и сообщения к нему теряются (имитация падения)."""
+        self._down.add(peer_id)
+
+    def reconnect(self, peer_id):
+        self._down.discard(peer_id)
+
+    def send(self, dst, msg):
+        if msg["src"] in self._down or dst in self._down:
+            return
+        self.messages_sent += 1
+        if self.latency > 0:
+            asyncio.get_running_loop().call_later(self.latency, self._deliver, dst, msg)
+        else:
+            self._inboxes[dst].put_nowait(msg)
+
+    def _deliver(self, dst, msg):
+        if dst not in self._down:
+            self._inboxes[dst].put_nowait(msg)
+
+
+class RaftPeer:
+    def __init__(self, peer_id, peer_ids, transport, election_timeout=(0.15, 0.3), heartbeat_interval=0.05):
+        """
+        Пир Raft: выборы лидера и репликация лога (без снапшотов и смены конфигурации).
+        :param peer_id: ID пира (ID дрона)
+        :param peer_ids: ID всех пиров кластера
+        :param transport: транспорт с методами register/send
+        :param election_timeout: диапазон случайного таймаута выборов, с
+        :param heartbeat_interval: период heartbeat лидера, с
+        """
+        self.id = peer_id
+        self.peers = [p for p in peer_ids if p != peer_id]
+        self.transport = transport
+        self.election_timeout = election_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.inbox = transport.register(peer_id)
+
+        self.role = FOLLOWER
+        self.term = 0
+        self.voted_for = None
+        self.leader_id = None
+        self.log = []            # [(term, entry)], индексы с 1
+        self.commit_index = 0
+        self.applied = []        # применённые записи
+        self.applied_at = []     # время применения каждой записи (time.perf_counter)
+
+        self._votes = set()
+        self._next_index = {}
+        self._match_index = {}
+        self._waiters = {}       # {index: Future}, завершаются при коммите
+        self._deadline = 0.0
+        self._task = None
+
+    # === Жизненный цикл ===
+    def start(self):
+        self._reset_election_timer()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def crash(self):
+        """Падение пира: останавливает цикл и отключает его от транспорта. Лог сохраняется."""
+        self.transport.disconnect(self.id)
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.role = FOLLOWER
+        self._fail_waiters(f"peer {self.id} crashed")
+
+    def _fail_waiters(self, reason):
+        """
+        Завершает ожидания коммита ошибкой: бывший лидер больше не узнает об их судьбе
+        (запись может быть как закоммичена новым лидером, так и затёрта).
+        """
+        for future in self._waiters.values():
+            if not future.done():
+                future.set_exception(RuntimeError(reason))
+        self._waiters.clear()
+
+    def restart(self):
+        self.transport.reconnect(self.id)
+        while not self.inbox.empty():
+            self.inbox.get_nowait()
+        self.start()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Для лидера _deadline — время следующего heartbeat, для остальных — таймаут выборов
+            timeout = max(self._deadline - loop.time(), 0.0)
+            try:
+                msg = await asyncio.wait_for(self.inbox.get(), timeout)
+            except asyncio.TimeoutError:
+                if self.role == LEADER:
+                    self._broadcast_append()
+                else:
+                    self._start_election()
+                continue
+            self._handle(msg)
+
+    def _reset_election_timer(self):
+        self._deadline = asyncio.get_running_loop().time() + random.uniform(*self.election_timeout)
+
+    def _send(self, dst, **msg):
+        msg.update(src=self.id, term=self.term)
+        self.transport.send(dst, msg)
+
+    def _last_log(self):
+        return len(self.log), (self.log[-1][0] if self.log else 0)
+
+    # === Выборы ===
+    def _start_election(self):
+        self.role = CANDIDATE
+        self.term += 1
+        self.voted_for = self.id
+        self.leader_id = None
+        self._votes = {self.id}
+        self._reset_election_timer()
+        last_index, last_term = self._last_log()
+        for peer in self.peers:
+            self._send(peer, type="request_vote", last_index=last_index, last_term=last_term)
+        self._maybe_win()
+
+    def _maybe_win(self):
+        if self.role == CANDIDATE and len(self._votes) * 2 > len(self.peers) + 1:
+            self.role = LEADER
+            self.leader_id = self.id
+            self._next_index = {p: len(self.log) + 1 for p in self.peers}
+            self._match_index = {p: 0 for p in self.peers}
+            self._broadcast_append()
+
+    # === Репликация ===
+    def propose(self, entry):
+        """
+        Добавляет запись в лог лидера.
+        :return: Future, который завершится индексом записи после её коммита
+        """
+        if self.role != LEADER:
+            raise RuntimeError(f"peer {self.id} is not the leader (leader: {self.leader_id})")
+        self.log.append((self.term, entry))
+        index = len(self.log)
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[index] = future
+        if not self.peers:
+            self._advance_commit(index)
+        else:
+            self._broadcast_append()
+        return future
+
+    def _broadcast_append(self):
+        self._deadline = asyncio.get_running_loop().time() + self.heartbeat_interval
+        for peer in self.peers:
+            self._send_append(peer)
+
+    def _send_append(self, peer):
+        next_index = self._next_index[peer]
+        prev_index = next_index - 1
+        prev_term = self.log[prev_index - 1][0] if prev_index > 0 else 0
+        self._send(peer, type="append", prev_index=prev_index, prev_term=prev_term,
+                   entries=self.log[prev_index:], leader_commit=self.commit_index)
+
+    def _advance_commit(self, index):
+        if index <= self.commit_index:
+            return
+        self.commit_index = index
+        self._apply()
+        for i in [i for i in self._waiters if i <= index]:
+            future = self._waiters.pop(i)
+            if not future.done():
+                future.set_result(i)
+
+    def _apply(self):
+        now = time.perf_counter()
+        while len(self.applied) < self.commit_index:
+            self.applied.append(self.log[len(self.applied)][1])
+            self.applied_at.append(now)
+
+    # === Обработка сообщений ===
+    def _handle(self, msg):
+        if msg["term"] > self.term:
+            if self.role == LEADER:
+                self._reset_election_timer()  # был лидером: _deadline указывал на heartbeat
+                self._fail_waiters(f"peer {self.id} is not the leader any more (term {msg['term']})")
+            self.term = msg["term"]
+            self.role = FOLLOWER
+            self.voted_for = None
+        handler = getattr(self, "_on_" + msg["type"])
+        handler(msg)
+
+    def _on_request_vote(self, msg):
+        last_index, last_term = self._last_log()
+        up_to_date = (msg["last_term"], msg["last_index"]) >= (last_term, last_index)
+        granted = (msg["term"] == self.term and self.voted_for in (None, msg["src"]) and up_to_date)
+        if granted:
+            self.voted_for = msg["src"]
+            self._reset_election_timer()
+        self._send(msg["src"], type="vote", granted=granted)
+
+    def _on_vote(self, msg):
+        if self.role == CANDIDATE and msg["term"] == self.term and msg["granted"]:
+            self._votes.add(msg["src"])
+            self._maybe_win()
+
+    def _on_append(self, msg):
+        if msg["term"] < self.term:
+            self._send(msg["src"], type="append_reply", success=False, match_index=0)
+            return
+        self.role = FOLLOWER
+        self.leader_id = msg["src"]
+        self._reset_election_timer()
+
+        prev_index = msg["prev_index"]
+        if prev_index > len(self.log) or (prev_index > 0 and self.log[prev_index - 1][0] != msg["prev_term"]):
+            self._send(msg["src"], type="append_reply", success=False, match_index=min(prev_index - 1, len(self.log)))
+            return
+        for offset, (term, entry) in enumerate(msg["entries"]):
+            index = prev_index + offset + 1
+            if index <= len(self.log) and self.log[index - 1][0] != term:
+                del self.log[index - 1:]
+            if index > len(self.log):
+                self.log.append((term, entry))
+        match_index = prev_index + len(msg["entries"])
+        if msg["leader_commit"] > self.commit_index:
+            self.commit_index = min(msg["leader_commit"], match_index)
+            self._apply()
+        self._send(msg["src"], type="append_reply", success=True, match_index=match_index)
+
+    def _on_append_reply(self, msg):
+        if self.role != LEADER or msg["term"] != self.term:
+            return
+        peer = msg["src"]
+        if not msg["success"]:
+            self._next_index[peer] = max(1, msg["match_index"] + 1)
+            self._send_append(peer)
+            return
+        if msg["match_index"] <= self._match_index[peer]:
+            return
+        self._match_index[peer] = msg["match_index"]
+        self._next_index[peer] = msg["match_index"] + 1
+        # Коммит: индекс, реплицированный на большинство, из текущего срока
+        matches = sorted(list(self._match_index.values()) + [len(self.log)], reverse=True)
+        majority = matches[(len(self.peers) + 1) // 2]
+        if majority > self.commit_index and self.log[majority - 1][0] == self.term:
+            self._advance_commit(majority)
+            self._broadcast_append()  # сразу сообщаем followers новый commit_index
+
+
+class RaftCluster:
+    def __init__(self, drone_ids, transport=None, **peer_kwargs):
+        """
+        Рой как кластер Raft: каждый дрон — пир.
+        :param drone_ids: ID дронов
+        :param transport: транспорт (по умолчанию InMemoryTransport)
+        :param peer_kwargs: параметры RaftPeer (таймауты)
+        """
+        self.transport = InMemoryTransport() if transport is None else transport
+        ids = list(drone_ids)
+        self.peers = {i: RaftPeer(i, ids, self.transport, **peer_kwargs) for i in ids}
+
+    def start(self):
+        for peer in self.peers.values():
+            peer.start()
+
+    def stop(self):
+        for peer in self.peers.values():
+            if peer._task is not None:
+                peer._task.cancel()
+                peer._task = None
+
+    def leader(self):
+        leaders = [p for p in self.peers.values() if p.role == LEADER and p._task is not None]
+        return max(leaders, key=lambda p: p.term) if leaders else None
+
+    async def wait_for_leader(self, timeout=10.0, poll=0.001):
+        """
+        Ждёт появления лидера.
+        :return: (лидер, время ожидания в секундах)
+        """
+        start = time.perf_counter()
+        while time.perf_counter() - start < timeout:
+            leader = self.leader()
+            if leader is not None:
+                return leader, time.perf_counter() - start
+            await asyncio.sleep(poll)
+        raise TimeoutError("no leader elected")
+
+    async def submit(self, entry):
+        """
+        Реплицирует одну запись через текущего лидера.
+        :return: (индекс записи, задержка коммита на большинстве, с)
+        """
+        leader, _ = await self.wait_for_leader()
+        start = time.perf_counter()
+        index = await leader.propose(entry)
+        return index, time.perf_counter() - start
+
+    async def wait_applied(self, index, timeout=10.0, poll=0.001):
+        """Ждёт, пока все работающие пиры применят запись index; возвращает момент применения."""
+        start = time.perf_counter()
+        live = [p for p in self.peers.values() if p._task is not None]
+        while time.perf_counter() - start < timeout:
+            if all(len(p.applied) >= index for p in live):
+                return max(p.applied_at[index - 1] for p in live)
+            await asyncio.sleep(poll)
+        raise TimeoutError(f"entry {index} not applied on all peers")
+
+    async def crash_leader(self):
+        """
+        Роняет текущего лидера и ждёт перевыборов.
+        :return: (ID упавшего лидера, время перевыборов, с)
+        """
+        leader, _ = await self.wait_for_leader()
+        leader.crash()
+        new_leader, elapsed = await self.wait_for_leader()
+        return leader.id, elapsed
+
+
+def consensus_entry(final_positions, faulty):
+    """
+    Результат LeaderNode.step_consensus в виде записи лога (только простые типы).
+    """
+    return {
+        "positions": {int(i): np.asarray(p).tolist() for i, p in final_positions.items()},
+        "faulty": sorted(int(i) for i in faulty),
+    }
+
+
+async def measure(n_drones, entries=100, f=1, crash=True, **peer_kwargs):
+    """
+    Замер Raft-слоя для роя из n_drones: выборы, задержка коммита, пропускная способность.
+    :param entries: число реплицируемых результатов step_consensus
+    :return: словарь метрик
+    """
+    state = SwarmState.generate(np.random.rand(n_drones, 2) * 20)
+    entry = consensus_entry(*LeaderNode(state).step_consensus(f=f))
+
+    cluster = RaftCluster(state.ids, **peer_kwargs)
+    cluster.start()
+    try:
+        _, election_time = await cluster.wait_for_leader()
+
+        latencies, swarm_latencies = [], []
+        for _ in range(max(entries // 10, 1)):  # последовательные записи: задержка
+            start = time.perf_counter()
+            index, latency = await cluster.submit(entry)
+            latencies.append(latency)
+            swarm_latencies.append(await cluster.wait_applied(index) - start)
+
+        leader, _ = await cluster.wait_for_leader()
+        start = time.perf_counter()  # конвейер: пропускная способность
+        await asyncio.gather(*(leader.propose(entry) for _ in range(entries)))
+        throughput = entries / (time.perf_counter() - start)
+
+        result = {
+            "Num_Drones": n_drones,
+            "Election_Time_s": election_time,
+            "Commit_Latency_mean_s": float(np.mean(latencies)),
+            "Commit_Latency_p99_s": float(np.percentile(latencies, 99)),
+            "Swarm_Apply_Latency_mean_s": float(np.mean(swarm_latencies)),
+            "Throughput_eps": throughput,
+            "Messages": cluster.transport.messages_sent,
+        }
+        if crash:
+            _, result["Reelection_Time_s"] = await cluster.crash_leader()
+        return result
+    finally:
+        cluster.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Raft election/replication timing for SwarmRaft swarms")
+    parser.add_argument("--n_values", type=int, nargs="+", default=[5, 10, 25, 50, 100])
+    parser.add_argument("--entries", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="per-message transport latency, s")
+    args = parser.parse_args()
+
+    np.random.seed(42)
+    for n in args.n_values:
+        row = asyncio.run(measure(n, entries=args.entries, transport=InMemoryTransport(args.latency)))
+        print(", ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in row.items()))
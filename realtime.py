@@ -0,0 +1,182 @@
+import time
+
+import numpy as np
+
+from instrumentation import Histogram
+from leader_node import LeaderNode, seeded
+
+FALLBACKS = ("last", "gnss")
+
+
+class RealTimeLoop:
+    def __init__(self, source, rate=50.0, deadline=None, f=1, fallback="last", recovery_chunk=64, T=None,
+                 warmup=True, clock=time.perf_counter, sleep=time.sleep, **leader_kwargs):
+        """
+        Консенсус с фиксированной частотой: шаг tick запускается в момент tick / rate, время шага
+        ограничено deadline. Голосование и детекция выполняются целиком, восстановление — порциями
+        по recovery_chunk неисправных дронов (сначала самые «уверенные» по сумме голосов) с проверкой
+        дедлайна перед каждой порцией. Не успевшие восстановиться дроны получают запасную позицию,
+        а цикл не останавливается; при перерасходе пропущенные такты засчитываются и не догоняются.
+        :param source: функция tick -> SwarmState с измерениями такта
+        :param rate: частота, Гц
+        :param deadline: бюджет шага, с (по умолчанию период 1 / rate)
+        :param f: макс. число неисправных узлов
+        :param fallback: позиция неуспевших дронов: "last" — последняя зафиксированная (при её
+                         отсутствии — GNSS), "gnss" — текущий GNSS
+        :param recovery_chunk: число неисправных дронов в одной порции восстановления
+        :param T: порог голосования (None — как у LeaderNode; с tracker порог задаёт фильтр)
+        :param warmup: перед первым тактом выполнить warm_up (иначе в задержку первого такта попадёт
+                       компиляция ядра numba)
+        :param clock: функция текущего времени, с
+        :param sleep: функция ожидания, с
+        :param leader_kwargs: параметры LeaderNode (backend, recovery_method, tracker, instrumentation, ...)
+        """
+        if fallback not in FALLBACKS:
+            raise ValueError(f"unknown fallback {fallback!r}; choose from {FALLBACKS}")
+        self.source = source
+        self.period = 1.0 / rate
+        self.deadline = self.period if deadline is None else deadline
+        self.f = f
+        self.fallback = fallback
+        self.recovery_chunk = recovery_chunk
+        self.T = T
+        self.warmup = warmup
+        self.clock = clock
+        self.sleep = sleep
+        self.leader_kwargs = leader_kwargs
+        self.committed = None  # последние зафиксированные позиции, (N, d)
+        self.latency = Histogram()
+        self.ticks = 0
+        self.misses = 0          # шаги, не уложившиеся в deadline
+        self.skipped_ticks = 0   # такты, пропущенные из-за перерасхода
+        self.fallback_nodes = 0  # неисправные дроны, оставшиеся без восстановления
+
+    def _fallback_positions(self, state, rows):
+        if self.fallback == "last" and self.committed is not None and len(self.committed) == state.n:
+            return self.committed[rows]
+        return state.z_gnss[rows]
+
+    def warm_up(self, state):
+        """
+        Нетаймируемый шаг на нескольких дронах такта: компиляция ядер (numba) и первые выделения памяти
+        не попадают в задержку первого такта. Фильтр, инструментация и глобальный np.random не затрагиваются.
+        """
+        kwargs = {k: v for k, v in self.leader_kwargs.items() if k not in ("tracker", "instrumentation")}
+        with seeded(0):
+            leader = LeaderNode(state.subset(np.arange(min(state.n, 8))), **kwargs)
+            leader.recover_positions(leader.detect_faulty_nodes(leader.packed_votes(), self.f))
+
+    def step(self, state):
+        """
+        Один шаг консенсуса с дедлайном: фазы те же, что у LeaderNode.step_consensus (с фильтром
+        Калмана — predict/update вокруг голосования), но восстановление идёт порциями до дедлайна.
+        :param state: SwarmState такта
+        :return: (позиции (N, d), маска неисправных (N,), маска восстановленных (N,), задержка шага, с)
+        """
+        start = self.clock()
+        stop_at = start + self.deadline
+        leader = LeaderNode(state, **self.leader_kwargs)
+        if self.T is not None:
+            leader.T = self.T
+        inst, tracker = leader.instrumentation, leader.tracker
+        inst.begin_step()
+        try:
+            if tracker is not None:
+                with inst.phase("filter"):
+                    tracker.predict(state)
+                    leader.T = tracker.threshold()
+                    leader.invalidate()
+            with inst.phase("voting"):
+                votes = leader.packed_votes()
+            with inst.phase("detection"):
+                faulty = leader.detect_faulty_nodes(votes, f=self.f)
+                flagged = np.isin(state.ids, list(faulty))
+                rows = np.flatnonzero(flagged)
+                # Порции восстановления: сначала дроны с самой отрицательной суммой голосов
+                cast, negative = votes.counts()
+                rows = rows[np.argsort((cast - 2 * negative)[rows], kind="stable")]
+
+            positions = state.z_gnss.copy()
+            recovered = np.zeros(state.n, dtype=bool)
+            ids = state.ids
+            with inst.phase("recovery"):
+                for begin in range(0, len(rows), self.recovery_chunk):
+                    if self.clock() >= stop_at:
+                        break
+                    chunk = rows[begin:begin + self.recovery_chunk]
+                    chunk_ids = [ids[k] for k in chunk]
+                    result = leader.recover_positions(chunk_ids, exclude=faulty)
+                    positions[chunk] = [result[i] for i in chunk_ids]
+                    recovered[chunk] = True
+                late = flagged & ~recovered
+                if late.any():
+                    positions[late] = self._fallback_positions(state, np.flatnonzero(late))
+            if inst.enabled:
+                inst.count("nodes_flagged", len(rows))
+                inst.count("nodes_recovered", int(recovered.sum()))
+            if tracker is not None:
+                with inst.phase("filter"):
+                    tracker.update(state, flagged)
+        finally:
+            inst.end_step()
+        return positions, flagged, recovered, self.clock() - start
+
+    def run(self, ticks):
+        """
+        Цикл с фиксированной частотой (генератор записей тактов).
+        :param ticks: число шагов
+        """
+        next_tick = None
+        for _ in range(ticks):
+            state = self.source(self.ticks)
+            if next_tick is None:
+                if self.warmup:
+                    self.warm_up(state)
+                next_tick = self.clock()
+            positions, flagged, recovered, latency = self.step(state)
+            self.committed = positions
+            miss = latency > self.deadline
+            self.latency.observe(latency)
+            self.misses += miss
+            self.fallback_nodes += int((flagged & ~recovered).sum())
+
+            next_tick += self.period
+            now = self.clock()
+            skipped = 0
+            if now < next_tick:
+                self.sleep(next_tick - now)
+            else:
+                skipped = int((now - next_tick) // self.period)
+                next_tick += skipped * self.period
+                self.skipped_ticks += skipped
+            record = {
+                "Tick": self.ticks,
+                "Latency_s": latency,
+                "Deadline_Miss": bool(miss),
+                "Num_Faulty": int(flagged.sum()),
+                "Recovered": int(recovered.sum()),
+                "Fallback": int((flagged & ~recovered).sum()),
+                "Skipped_Ticks": skipped,
+                "Positions": positions,
+            }
+            self.ticks += 1
+            yield record
+
+    def summary(self):
+        """
+        Сводка для сертификации размера роя: квантили задержки, промахи дедлайна, пропущенные такты.
+        p50/p99 — верхние границы корзин гистограммы (оценка сверху).
+        """
+        latency = self.latency.summary()
+        return {
+            "rate_hz": 1.0 / self.period,
+            "deadline_s": self.deadline,
+            "ticks": self.ticks,
+            "latency_p50_s": latency["p50"],
+            "latency_p99_s": latency["p99"],
+            "latency_max_s": latency["max"],
+            "deadline_misses": self.misses,
+            "skipped_ticks": self.skipped_ticks,
+            "fallback_nodes": self.fallback_nodes,
+            "within_budget": bool(self.ticks) and latency["p99"] <= self.deadline and not self.skipped_ticks,
+        }
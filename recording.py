@@ -0,0 +1,209 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from kalman import SwarmKalman
+from leader_node import LeaderNode, seeded
+from swarm_state import SwarmState
+
+FORMAT_VERSION = 1
+META = "meta.json"
+POSITION_FIELDS = ("x_true", "z_gnss", "x_ins", "prev_position")
+
+
+def _array_path(path, name):
+    return os.path.join(path, name + ".npy")
+
+
+class RecordingWriter:
+    def __init__(self, path, epochs, n_drones, dim=2, width=None):
+        """
+        Запись измерений роя по эпохам в каталог .npy-файлов, отображаемых в память (np.memmap):
+        x_true, z_gnss, x_ins, prev_position — (E, N, d); ranges — (E, N, N) или (E, N, K) с neighbors (E, N, K);
+        attacked — (E, N). Место под epochs эпох выделяется сразу, данные пишутся на диск без буфера в RAM.
+        :param path: каталог записи (создаётся)
+        :param epochs: максимальное число эпох
+        :param n_drones: число дронов N
+        :param dim: размерность пространства d
+        :param width: число столбцов графа соседей K; None — плотная матрица расстояний (N, N)
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.epochs = epochs
+        self.n_drones = n_drones
+        self.dim = dim
+        self.width = width
+        self.written = 0
+        shapes = {name: ((epochs, n_drones, dim), np.float64) for name in POSITION_FIELDS}
+        shapes["ranges"] = ((epochs, n_drones, n_drones if width is None else width), np.float64)
+        shapes["attacked"] = ((epochs, n_drones), np.bool_)
+        if width is not None:
+            shapes["neighbors"] = ((epochs, n_drones, width), np.int64)
+        self.arrays = {name: np.lib.format.open_memmap(_array_path(path, name), mode="w+", dtype=dtype, shape=shape)
+                       for name, (shape, dtype) in shapes.items()}
+        self._write_meta()
+
+    def _write_meta(self):
+        meta = {"version": FORMAT_VERSION, "epochs": self.written, "n_drones": self.n_drones, "dim": self.dim,
+                "width": self.width}
+        with open(os.path.join(self.path, META), "w") as fh:
+            json.dump(meta, fh)
+
+    def append(self, state, attacked=None):
+        """
+        Записывает входные данные одной эпохи. Граф соседей уже width дополняется пустыми (-1, NaN).
+        :param state: SwarmState
+        :param attacked: метки атакованных дронов, (N,) bool (по умолчанию — нет атак)
+        """
+        if self.written >= self.epochs:
+            raise ValueError(f"recording is full ({self.epochs} epochs)")
+        if state.n != self.n_drones or state.dim != self.dim:
+            raise ValueError(f"state has shape {(state.n, state.dim)}, recording expects {(self.n_drones, self.dim)}")
+        if state.sparse != (self.width is not None):
+            raise ValueError("state and recording disagree on dense vs neighbor-limited ranges")
+        e = self.written
+        for name in POSITION_FIELDS:
+            self.arrays[name][e] = getattr(state, name)
+        if state.sparse:
+            k = state.neighbors.shape[1]
+            if k > self.width:
+                raise ValueError(f"state has {k} neighbor columns, recording width is {self.width}")
+            self.arrays["neighbors"][e, :, :k] = state.neighbors
+            self.arrays["neighbors"][e, :, k:] = -1
+            self.arrays["ranges"][e, :, k:] = np.nan
+            self.arrays["ranges"][e, :, :k] = state.ranges
+        else:
+            self.arrays["ranges"][e] = state.ranges
+        self.arrays["attacked"][e] = False if attacked is None else attacked
+        self.written += 1
+
+    def close(self):
+        """Сбрасывает данные на диск и фиксирует число записанных эпох в meta.json."""
+        for array in self.arrays.values():
+            array.flush()
+        self._write_meta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Recording:
+    def __init__(self, path):
+        """
+        Чтение записи RecordingWriter без загрузки в RAM: массивы открываются через np.load(mmap_mode="r"),
+        состояния эпох — представления страниц файла (страницы подгружает ОС по мере чтения).
+        :param path: каталог записи
+        """
+        with open(os.path.join(path, META)) as fh:
+            self.meta = json.load(fh)
+        if self.meta["version"] != FORMAT_VERSION:
+            raise ValueError(f"unsupported recording version {self.meta['version']}")
+        self.path = path
+        names = POSITION_FIELDS + ("ranges", "attacked") + (() if self.meta["width"] is None else ("neighbors",))
+        self.arrays = {name: np.load(_array_path(path, name), mmap_mode="r") for name in names}
+
+    def __len__(self):
+        return self.meta["epochs"]
+
+    @property
+    def sparse(self):
+        return self.meta["width"] is not None
+
+    def state(self, epoch):
+        """
+        SwarmState эпохи без копирования (массивы только для чтения).
+        """
+        if not 0 <= epoch < len(self):
+            raise IndexError(f"epoch {epoch} out of range for {len(self)} recorded epochs")
+        fields = [self.arrays[name][epoch] for name in POSITION_FIELDS]
+        neighbors = self.arrays["neighbors"][epoch] if self.sparse else None
+        return SwarmState(*fields, self.arrays["ranges"][epoch], neighbors=neighbors)
+
+    def attacked(self, epoch):
+        return np.asarray(self.arrays["attacked"][epoch])
+
+    def __iter__(self):
+        for epoch in range(len(self)):
+            yield self.state(epoch)
+
+
+def record_simulation(simulator, path, epochs, width=None):
+    """
+    Прогон EpochSimulator с записью входных данных консенсуса каждой эпохи.
+    :param simulator: epoch_simulator.EpochSimulator
+    :param path: каталог записи
+    :param epochs: число эпох
+    :param width: число столбцов графа соседей для записи (по умолчанию — ширина графа первой эпохи x 2:
+                  в радиусном графе число соседей меняется от эпохи к эпохе)
+    :return: список метрик эпох симулятора
+    """
+    state = simulator.state
+    if state.sparse and width is None:
+        width = 2 * state.neighbors.shape[1]
+    with RecordingWriter(path, epochs, state.n, state.dim, width=width) as writer:
+        return list(simulator.run(epochs, recorder=writer))
+
+
+def replay(recording, f=1, T=None, epochs=None, kalman=False, seed=None, **leader_kwargs):
+    """
+    Консенсус по записанным эпохам: каждая эпоха — новый LeaderNode на memory-mapped состоянии,
+    поэтому разные варианты консенсуса (бэкенд, метод восстановления, T) сравниваются на одних данных.
+    Порог T и веса alpha LeaderNode случайны (глобальный np.random): повторные прогоны совпадают
+    только при заданном seed (или с kalman: порог и веса alpha задаёт фильтр).
+    :param recording: Recording или путь к каталогу записи
+    :param f: макс. число неисправных узлов
+    :param T: порог голосования (None — как у LeaderNode); с kalman порог задаёт фильтр, T не допускается
+    :param epochs: число первых эпох (по умолчанию все)
+    :param kalman: вести kalman.SwarmKalman через все эпохи (порог T тогда задаёт фильтр);
+                   в метриках добавляется MAE_Filter — ошибка апостериорной оценки фильтра
+    :param seed: seed случайных величин консенсуса; поток эпохи выводится из (seed, номер эпохи), так что
+                 эпоха воспроизводится независимо от epochs и от вариантов, сравниваемых на других эпохах
+    :param leader_kwargs: параметры LeaderNode (backend, recovery_method, ...)
+    :return: генератор словарей метрик по эпохам
+    """
+    if kalman and T is not None:
+        raise ValueError("T cannot be combined with kalman: the filter sets the threshold every epoch")
+    if not isinstance(recording, Recording):
+        recording = Recording(recording)
+    tracker = None
+    for epoch in range(len(recording) if epochs is None else min(epochs, len(recording))):
+        state = recording.state(epoch)
+        attacked = recording.attacked(epoch)
+        start = time.perf_counter()
+        if kalman and tracker is None:
+            tracker = SwarmKalman.from_state(state, gnss_var=leader_kwargs.get("gnss_var", 1.0),
+                                             range_noise_std=leader_kwargs.get("range_noise_std", 0.2))
+        epoch_seed = None
+        if seed is not None:
+            epoch_seed = int(np.random.SeedSequence(seed, spawn_key=(epoch,)).generate_state(1)[0])
+        with seeded(epoch_seed):
+            leader = LeaderNode(state, tracker=tracker, **leader_kwargs)
+            if T is not None:
+                leader.T = T
+            final_positions, faulty = leader.step_consensus(f=f)
+        elapsed = time.perf_counter() - start
+
+        final = np.array([final_positions[i] for i in state.ids])
+        flagged = np.zeros(state.n, dtype=bool)
+        flagged[list(faulty)] = True
+        err_gnss = (state.z_gnss - state.x_true).ravel()
+        err_final = (final - state.x_true).ravel()
+        metrics = {
+            "Epoch": epoch,
+            "Num_Faulty": int(flagged.sum()),
+            "Detected": int((flagged & attacked).sum()),
+            "False_Alarms": int((flagged & ~attacked).sum()),
+            "MAE_GNSS": float(np.abs(err_gnss).mean()),
+            "MAE_Recovered": float(np.abs(err_final).mean()),
+            "RMSE_GNSS": float(np.sqrt((err_gnss ** 2).mean())),
+            "RMSE_Recovered": float(np.sqrt((err_final ** 2).mean())),
+            "Step_Time_s": elapsed,
+        }
+        if tracker is not None:
+            metrics["MAE_Filter"] = float(np.abs(tracker.x - state.x_true).mean())
+        yield metrics
@@ -0,0 +1,102 @@
+import numpy as np
+
+METHODS = ("median", "geometric_median", "trimmed_mean")
+
+
+def _masked(estimates, mask):
+    """Оценки с NaN на месте исключённых пар; mask=None — маска по конечным значениям."""
+    estimates = np.asarray(estimates, dtype=float)
+    if mask is None:
+        return estimates
+    return np.where(np.asarray(mask, dtype=bool)[..., None], estimates, np.nan)
+
+
+def masked_median(estimates, mask=None):
+    """
+    Покоординатная медиана по пирам для всех неисправных дронов сразу.
+    Сортировка с NaN в конце + выбор средних элементов по числу валидных значений строки
+    (np.nanmedian по оси обходит строки в Python-цикле при большом числе пиров).
+    :param estimates: оценки пиров, (F, P, d)
+    :param mask: (F, P) bool, True — оценка пира участвует; None — все конечные значения
+    :return: (F, d); NaN для строк без единой оценки
+    """
+    values = np.sort(_masked(estimates, mask), axis=1)  # NaN уходят в конец
+    count = np.count_nonzero(~np.isnan(values), axis=1)  # (F, d)
+    lo = np.maximum((count - 1) // 2, 0)
+    hi = np.maximum(count // 2, 0)
+    low = np.take_along_axis(values, lo[:, None, :], axis=1)[:, 0]
+    high = np.take_along_axis(values, hi[:, None, :], axis=1)[:, 0]
+    median = (low + high) / 2
+    median[count == 0] = np.nan
+    return median
+
+
+def trimmed_mean(estimates, mask=None, trim=0.2):
+    """
+    Покоординатное усечённое среднее: в каждой строке отбрасывается доля trim наименьших и
+    наибольших оценок (по числу валидных пиров этой строки).
+    :param trim: доля, отбрасываемая с каждой стороны, [0, 0.5)
+    :return: (F, d); NaN для строк без единой оценки
+    """
+    if not 0 <= trim < 0.5:
+        raise ValueError(f"trim must be in [0, 0.5), got {trim}")
+    values = np.sort(_masked(estimates, mask), axis=1)
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=1)  # (F, d)
+    cut = np.floor(trim * count).astype(np.int64)
+    rank = np.arange(values.shape[1])[None, :, None]
+    keep = valid & (rank >= cut[:, None, :]) & (rank < (count - cut)[:, None, :])
+    kept = keep.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(keep, values, 0.0).sum(axis=1) / kept
+
+
+def geometric_median(estimates, mask=None, max_iter=100, tol=1e-6, eps=1e-12):
+    """
+    Геометрическая медиана (точка с минимальной суммой евклидовых расстояний до оценок пиров),
+    векторный алгоритм Вейсфельда сразу для всех строк. В отличие от покоординатной медианы
+    инвариантна к поворотам и устойчива к сговору до половины пиров.
+    :param max_iter: предел итераций
+    :param tol: остановка строки, когда шаг меньше tol (в единицах координат)
+    :param eps: нижняя граница расстояния (итерация не делит на ноль, если оценка совпала с пиром)
+    :return: (F, d); NaN для строк без единой оценки
+    """
+    points = _masked(estimates, mask)
+    valid = ~np.isnan(points).any(axis=2)  # (F, P)
+    points = np.where(valid[..., None], points, 0.0)
+    current = masked_median(estimates, mask)  # старт от покоординатной медианы
+    active = valid.any(axis=1)
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        # Пока сходятся не все строки, считать по всем дешевле, чем копировать подмножество
+        rows = slice(None) if active.mean() > 0.5 else np.flatnonzero(active)
+        pts, center = points[rows], current[rows]
+        diff = pts - center[:, None, :]
+        dist = np.sqrt(np.einsum("fpk,fpk->fp", diff, diff))
+        np.maximum(dist, eps, out=dist)
+        weight = valid[rows] / dist  # исключённые пиры — вес 0
+        update = np.einsum("fp,fpk->fk", weight, pts) / weight.sum(axis=1)[:, None]
+        step = np.sqrt(((update - center) ** 2).sum(axis=1))
+        update[~active[rows]] = center[~active[rows]]  # сошедшиеся строки не двигаются
+        current[rows] = update
+        active[np.arange(len(current))[rows][step < tol]] = False
+    return current
+
+
+def recover(estimates, mask=None, method="median", **options):
+    """
+    Пакетное восстановление позиций неисправных дронов по оценкам пиров.
+    :param estimates: (F, P, d)
+    :param mask: (F, P) bool — участвующие пиры (например, без неисправных наблюдателей)
+    :param method: "median", "geometric_median" или "trimmed_mean"
+    :param options: параметры метода (trim, max_iter, tol)
+    :return: (F, d)
+    """
+    if method == "median":
+        return masked_median(estimates, mask)
+    if method == "geometric_median":
+        return geometric_median(estimates, mask, **options)
+    if method == "trimmed_mean":
+        return trimmed_mean(estimates, mask, **options)
+    raise ValueError(f"unknown recovery method {method!r}; choose from {METHODS}")
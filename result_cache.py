@@ -0,0 +1,165 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import uuid
+
+import numpy as np
+
+import monte_carlo
+
+DEFAULT_ROOT = ".swarmraft_cache"
+DEFAULT_MAX_BYTES = 1 << 30
+# Вытеснение освобождает место с запасом, чтобы полный кэш не обходил каталог на каждой записи
+EVICT_TO = 0.9
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """
+    Хэш исходного кода модели испытаний (monte_carlo.py): правка модели, порога голосования или
+    восстановления делает все старые записи кэша недостижимыми.
+    """
+    with open(inspect.getsourcefile(monte_carlo), "rb") as fh:
+        return hashlib.sha256(fh.read()).hexdigest()[:16]
+
+
+def cell_config(N, f, repeats, seed, batch_size=None, **engine_kwargs):
+    """
+    Полная конфигурация ячейки: параметры модели дополняются значениями по умолчанию из
+    monte_carlo.simulate_batch, чтобы явно переданное значение по умолчанию давало тот же ключ.
+    :param seed: np.random.SeedSequence потока ячейки
+    :param batch_size: размер пачки run_trials (влияет на порядок случайных чисел); None — из бюджета памяти
+    :return: словарь, сериализуемый в JSON
+    """
+    # В ключ идёт фактический размер пачки: пачка больше repeats даёт те же числа, что и одна пачка
+    batch_size = min(monte_carlo.batch_size_for(N) if batch_size is None else batch_size, repeats)
+    defaults = {name: p.default for name, p in inspect.signature(monte_carlo.simulate_batch).parameters.items()
+                if p.default is not inspect.Parameter.empty and name != "rng"}
+    unknown = set(engine_kwargs) - set(defaults)
+    if unknown:
+        raise TypeError(f"unknown model parameters: {sorted(unknown)}")
+    engine = {**defaults, **engine_kwargs}
+    return {
+        "N": int(N), "f": int(f), "repeats": int(repeats), "batch_size": int(batch_size),
+        "seed": {"entropy": seed.entropy, "spawn_key": [int(k) for k in seed.spawn_key]},
+        "engine": {k: list(v) if isinstance(v, tuple) else v for k, v in engine.items()},
+        "code_version": code_version(),
+    }
+
+
+def cell_key(config):
+    """Ключ ячейки — SHA-256 канонического JSON конфигурации."""
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, root=DEFAULT_ROOT, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Content-addressed кэш результатов ячеек на диске: root/<2 символа ключа>/<ключ>.npz.
+        При превышении max_bytes удаляются записи, к которым дольше всего не обращались (по mtime),
+        до EVICT_TO * max_bytes. Суммарный размер считается обходом каталога один раз и дальше
+        ведётся по записям этого экземпляра; записи других процессов учитываются при следующем обходе.
+        :param root: каталог кэша
+        :param max_bytes: предельный суммарный размер записей
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self._total = None  # текущий суммарный размер записей, байт (None — ещё не считался)
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key + ".npz")
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def get(self, key):
+        """
+        :return: словарь колонок или None, если записи нет
+        """
+        path = self.path(key)
+        try:
+            with np.load(path) as data:
+                columns = {name: data[name] for name in data.files}
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # отметка последнего обращения для вытеснения
+        return columns
+
+    def put(self, key, columns):
+        """
+        Атомарно сохраняет колонки ячейки и при необходимости вытесняет старые записи.
+        :return: путь к записи
+        """
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"  # np.savez не добавит .npz к файловому объекту
+        with open(tmp_path, "wb") as fh:
+            np.savez(fh, **{name: np.asarray(values) for name, values in columns.items()})
+        total = self.size() if self._total is None else self._total
+        try:
+            total -= os.stat(path).st_size  # перезапись той же ячейки
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, path)
+        self._total = total + os.stat(path).st_size
+        if self._total > self.max_bytes:
+            self.evict(EVICT_TO * self.max_bytes)
+        return path
+
+    def _entries(self):
+        entries = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".npz"):
+                    try:
+                        stat = os.stat(os.path.join(directory, name))
+                    except FileNotFoundError:  # вытеснена параллельным процессом
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, os.path.join(directory, name)))
+        return entries
+
+    def size(self):
+        """Суммарный размер записей по обходу каталога, байт."""
+        self._total = sum(size for _, size, _ in self._entries())
+        return self._total
+
+    def evict(self, max_bytes=None):
+        """
+        Удаляет давно не использованные записи, пока суммарный размер больше max_bytes.
+        :return: число удалённых записей
+        """
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._total = total
+        return removed
+
+
+def cached_trials(cache, N, f, repeats, seed, batch_size=None, **engine_kwargs):
+    """
+    monte_carlo.run_trials через кэш: при совпадении конфигурации результат читается с диска.
+    :param cache: ResultCache или None (без кэша)
+    :param seed: np.random.SeedSequence потока ячейки
+    :return: (словарь колонок, True если взято из кэша)
+    """
+    key = cell_key(cell_config(N, f, repeats, seed, batch_size, **engine_kwargs))
+    columns = None if cache is None else cache.get(key)
+    if columns is not None:
+        return columns, True
+    columns = monte_carlo.run_trials(N, f, repeats, batch_size=batch_size, rng=np.random.default_rng(seed),
+                                     **engine_kwargs)
+    if cache is not None:
+        cache.put(key, columns)
+    return columns, False
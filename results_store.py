@@ -0,0 +1,170 @@
+import os
+import uuid
+
+import numpy as np
+
+PARTITION_COLUMNS = ("Num_Drones", "Num_Attacked")
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as exc:
+        raise ImportError("results_store requires pyarrow: pip install pyarrow") from exc
+
+
+def _partition_dir(root, values):
+    """Каталог hive-раздела: root/Num_Drones=5/Num_Attacked=1."""
+    return os.path.join(root, *(f"{name}={value}" for name, value in values.items()))
+
+
+def write_shard(root, columns, name, partition_by=PARTITION_COLUMNS):
+    """
+    Атомарно записывает один Parquet-шард. Все строки шарда должны иметь одинаковые значения
+    колонок разбиения (как у одной ячейки свипа).
+    :param root: корень хранилища
+    :param columns: словарь колонок {имя: массив}
+    :param name: имя файла шарда без расширения
+    :return: путь к шарду
+    """
+    _require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    values = {}
+    for col in partition_by:
+        unique = np.unique(np.asarray(columns[col]))
+        if len(unique) != 1:
+            raise ValueError(f"shard {name} spans several {col} values: {unique}")
+        values[col] = unique[0].item()
+    directory = _partition_dir(root, values)
+    os.makedirs(directory, exist_ok=True)
+
+    table = pa.table({k: np.asarray(v) for k, v in columns.items() if k not in partition_by})
+    path = shard_path(root, values, name)
+    tmp_path = os.path.join(directory, f".{name}.parquet.tmp")  # скрытые файлы dataset игнорирует
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def shard_path(root, partition_values, name):
+    return os.path.join(_partition_dir(root, partition_values), f"{name}.parquet")
+
+
+class ResultsWriter:
+    def __init__(self, root, partition_by=PARTITION_COLUMNS, chunk_rows=100_000):
+        """
+        Потоковая запись результатов испытаний в append-only Parquet-хранилище с hive-разбиением.
+        Строки копятся в буфере и сбрасываются кусками по chunk_rows, а не держатся до конца свипа.
+        :param root: корень хранилища
+        :param partition_by: колонки разбиения на каталоги
+        :param chunk_rows: размер сбрасываемого куска
+        """
+        _require_pyarrow()
+        self.root = root
+        self.partition_by = tuple(partition_by)
+        self.chunk_rows = chunk_rows
+        self._buffer = []
+        self._buffered = 0
+        self._session = uuid.uuid4().hex[:12]
+        self._part = 0
+        self.rows_written = 0
+
+    def append(self, columns):
+        """
+        Добавляет пачку строк.
+        :param columns: словарь колонок {имя: массив} (например, результат monte_carlo.run_trials)
+        """
+        columns = {k: np.asarray(v) for k, v in columns.items()}
+        self._buffer.append(columns)
+        self._buffered += len(next(iter(columns.values())))
+        if self._buffered >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        table = pa.table({k: np.concatenate([b[k] for b in self._buffer]) for k in self._buffer[0]})
+        ds.write_dataset(
+            table, self.root, format="parquet",
+            partitioning=ds.partitioning(table.select(list(self.partition_by)).schema, flavor="hive"),
+            basename_template=f"part-{self._session}-{self._part:05d}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        self._part += 1
+        self.rows_written += table.num_rows
+        self._buffer = []
+        self._buffered = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _dataset(root):
+    _require_pyarrow()
+    import pyarrow.dataset as ds
+    return ds.dataset(root, format="parquet", partitioning="hive")
+
+
+def _filter_expression(filters):
+    """
+    {колонка: значение или список значений} -> выражение pyarrow для отсечения разделов.
+    """
+    if not filters:
+        return None
+    import pyarrow.dataset as ds
+
+    expr = None
+    for col, value in filters.items():
+        if isinstance(value, (list, tuple, set, np.ndarray)):
+            term = ds.field(col).isin(list(value))
+        else:
+            term = ds.field(col) == value
+        expr = term if expr is None else expr & term
+    return expr
+
+
+def read_results(root, columns=None, filters=None):
+    """
+    Читает только нужные колонки и разделы.
+    :param root: корень хранилища
+    :param columns: список колонок (None — все)
+    :param filters: {колонка: значение или список}, например {"Num_Drones": 10}
+    :return: pandas.DataFrame
+    """
+    return _dataset(root).to_table(columns=columns, filter=_filter_expression(filters)).to_pandas()
+
+
+def aggregate(root, by=("Num_Attacked",), metrics=("MAE_GNSS", "MAE_Recovered", "RMSE_GNSS", "RMSE_Recovered"),
+              stats=("mean", "std", "count"), filters=None):
+    """
+    Группировка с агрегацией внутри Arrow: читаются только колонки by + metrics из отобранных разделов,
+    в pandas попадает лишь итоговая таблица.
+    :param stats: агрегаты Arrow ("mean", "min", "max", "count", ...); "std" — выборочное (ddof=1), как в pandas
+    :return: pandas.DataFrame с колонками <metric>_<stat>, отсортированный по by
+    """
+    import pyarrow.compute as pc
+
+    by = list(by)
+    table = _dataset(root).to_table(columns=by + list(metrics), filter=_filter_expression(filters))
+    aggregations, names = [], {}
+    for m in metrics:
+        for s in stats:
+            if s == "std":
+                aggregations.append((m, "stddev", pc.VarianceOptions(ddof=1)))
+                names[f"{m}_stddev"] = f"{m}_std"
+            else:
+                aggregations.append((m, s))
+    result = table.group_by(by).aggregate(aggregations)
+    result = result.rename_columns([names.get(c, c) for c in result.column_names])
+    return result.sort_by([(c, "ascending") for c in by]).to_pandas()
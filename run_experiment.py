@@ -1,38 +1,28 @@
-import numpy as np
-import matplotlib.pyplot as plt
-from drone_node import DroneNode
-from leader_node import LeaderNode
+import sys
 
-np.random.seed(42)
-N = 5
-positions = np.random.rand(N, 2) * 20
-drones = [DroneNode(i, positions[i]) for i in range(N)]
 
-for i in range(N):
-    for j in range(N):
-        if i != j:
-            drones[i].measure_range_to(drones[j])
+def plot_recovery(state, final_positions, faulty_nodes, path=None, title="SwarmRaft: Baseline Recovery"):
+    """
+    Рисунок одного шага консенсуса: истинные позиции, GNSS, INS, восстановленные позиции и метки FAULT
+    (по одной коллекции на слой, см. visualization.py).
+    :param state: SwarmState шага
+    :param final_positions: словарь {id: позиция} из LeaderNode.step_consensus
+    :param faulty_nodes: множество id неисправных дронов
+    :param path: файл для сохранения (вне экрана, без pyplot); None — показать окно
+    """
+    from visualization import SwarmPlot, render
 
-leader = LeaderNode(drones)
-leader.T = 2 * np.sqrt(leader.gnss_var + leader.range_noise_std**2)
-final_positions, faulty_nodes = leader.step_consensus()
+    if path is not None:
+        return render(state, final_positions, faulty_nodes, path, title=title)
+    import matplotlib.pyplot as plt
 
-plt.figure(figsize=(8, 8))
-for d in drones:
-    plt.scatter(*d.x_true, c='green', s=100, label='True' if d.id == 0 else "")
-    plt.scatter(*d.z_gnss, c='blue', marker='x', label='GNSS' if d.id == 0 else "")
-    plt.scatter(*d.x_ins, c='red', marker='^', label='INS' if d.id == 0 else "")
-    plt.text(d.x_true[0] + 0.3, d.x_true[1] + 0.3, f'D{d.id}', fontsize=9)
+    fig, ax = plt.subplots(figsize=(8, 8))
+    SwarmPlot(ax, state.n, title=title).update(state, final_positions, faulty_nodes)
+    plt.show()
+    plt.close(fig)
 
-for i, pos in final_positions.items():
-    plt.scatter(*pos, c='black', marker='*', s=120, label='Recovered' if i == 0 else "")
-for i in faulty_nodes:
-    plt.text(final_positions[i][0], final_positions[i][1] - 1.0, 'FAULT', color='crimson', fontsize=10)
+if __name__ == "__main__":
+    # Совместимость со старым запуском: то же, что `python swarmraft.py run --show ...`
+    from swarmraft import main
 
-plt.title("SwarmRaft: Baseline Recovery")
-plt.legend()
-plt.grid(True)
-plt.axis('equal')
-plt.xlim(0, 22)
-plt.ylim(0, 22)
-plt.show()
+    sys.exit(main(["run", "--show"] + sys.argv[1:]))
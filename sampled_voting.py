@@ -0,0 +1,310 @@
+import math
+
+import numpy as np
+
+from leader_node import LeaderNode
+from swarm_state import SwarmState
+from vote_bits import fault_rule
+
+
+def _log_comb(n, r):
+    return math.lgamma(n + 1) - math.lgamma(r + 1) - math.lgamma(n - r + 1)
+
+
+def hypergeom_pmf(population, successes, draws):
+    """
+    Распределение числа «успехов» в выборке без возвращения (без scipy).
+    :return: массив вероятностей для 0 .. draws
+    """
+    pmf = np.zeros(draws + 1)
+    total = _log_comb(population, draws)
+    for b in range(max(0, draws - (population - successes)), min(successes, draws) + 1):
+        pmf[b] = math.exp(_log_comb(successes, b) + _log_comb(population - successes, draws - b) - total)
+    return pmf
+
+
+def _log_beta(a, b):
+    return math.lgamma(a) + math.lgamma(b) - math.lgamma(a + b)
+
+
+def vote_pmf(n, p, rho=0.0):
+    """
+    Распределение числа голосов из n, поданных с вероятностью p каждый. rho — корреляция голосов об
+    одной цели (бета-биномиальная модель: вероятность p у каждой цели своя, например, из-за шума её
+    GNSS); rho = 0 — биномиальное распределение.
+    :return: массив вероятностей для 0 .. n
+    """
+    x = np.arange(n + 1)
+    if p <= 0.0 or p >= 1.0:
+        return (x == (n if p >= 1.0 else 0)).astype(float)
+    if rho <= 0.0:
+        log_pmf = [_log_comb(n, i) + i * math.log(p) + (n - i) * math.log1p(-p) for i in x]
+    else:
+        rho = min(rho, 1.0 - 1e-9)
+        a, b = p * (1.0 - rho) / rho, (1.0 - p) * (1.0 - rho) / rho
+        log_pmf = [_log_comb(n, i) + _log_beta(i + a, n - i + b) - _log_beta(a, b) for i in x]
+    return np.exp(log_pmf)
+
+
+def error_estimates(n, k, f, tolerance, p_detect, p_false, rho_detect=0.0, rho_false=0.0):
+    """
+    Оценки вероятностей ошибок выборочного голосования для одного дрона, если все k голосов поданы.
+    Дрон признаётся неисправным, если голосов «за» не больше tolerance. Граница по неисправным
+    наблюдателям: их число в выборке — гипергеометрическое при f неисправных в рое, и голосуют они
+    худшим образом (за неисправную цель «за», против исправной — «против»). Голоса исправных
+    наблюдателей — модель, а не граница: бета-биномиальное распределение с долей p и корреляцией
+    rho (голоса об одной цели связаны шумом её GNSS), поэтому результат верен настолько, насколько
+    верны эти параметры; измеренные на шаге даёт vote_rates.
+    :param n: число дронов
+    :param k: наблюдателей на дрона
+    :param f: макс. число неисправных узлов в рое
+    :param tolerance: допустимое число голосов «за» у признаваемого неисправным
+    :param p_detect: вероятность, что исправный наблюдатель голосует против подменённого GNSS
+    :param p_false: вероятность, что исправный наблюдатель голосует против исправного GNSS
+    :param rho_detect: корреляция голосов об одной неисправной цели (см. vote_pmf)
+    :param rho_false: корреляция голосов об одной исправной цели
+    :return: (вероятность пропуска, вероятность ложной тревоги)
+    """
+    miss = 0.0
+    for b, weight in enumerate(hypergeom_pmf(n - 1, min(max(f - 1, 0), n - 1), k)):
+        if weight:
+            # «за»: b неисправных + исправные, не заметившие подмену
+            miss += weight * vote_pmf(k - b, 1.0 - p_detect, rho_detect)[max(tolerance - b + 1, 0):].sum()
+    false_alarm = 0.0
+    for b, weight in enumerate(hypergeom_pmf(n - 1, min(f, n - 1), k)):
+        if weight:
+            false_alarm += weight * vote_pmf(k - b, 1.0 - p_false, rho_false)[:tolerance + 1].sum()
+    return float(miss), float(false_alarm)
+
+
+def sample_tolerance(n, k, f, delta=1e-3):
+    """
+    Порог под k: допуск голосов «за» — число неисправных наблюдателей в выборке k из n - 1, которое
+    превышается с вероятностью не больше delta (их голоса «за» не спасают неисправную цель). Не больше
+    (k - 1) // 2 — как и в правиле SwarmRaft, признать неисправным можно только большинством против.
+    """
+    tail = 1.0 - np.cumsum(hypergeom_pmf(n - 1, min(max(f - 1, 0), n - 1), k))
+    return min(int(np.argmax(tail <= delta)), (k - 1) // 2)
+
+
+def _moment_rates(cast, negative, weight):
+    """
+    Доля голосов «против» и корреляция голосов об одной цели по методу моментов (разброс числа
+    голосов «против» по строкам сверх биномиального), строки взвешены weight.
+    :return: (p или None, если голосов нет, rho)
+    """
+    total = (weight * cast).sum()
+    if total <= 0:
+        return None, 0.0
+    p = (weight * negative).sum() / total
+    rho = 0.0
+    pairs = (weight * cast * (cast - 1)).sum()
+    if 0.0 < p < 1.0 and pairs:
+        spread = (weight * (negative - cast * p) ** 2).sum() / (p * (1.0 - p))
+        rho = float(np.clip((spread - total) / pairs, 0.0, 1.0))
+    return float(p), rho
+
+
+def vote_rates(votes, iterations=200, tol=1e-6):
+    """
+    Параметры модели голосов для error_estimates по голосам шага — без опоры на решение шага: отбор строк
+    по самому правилу отрезал бы хвост распределения исправных целей, который и даёт ложные тревоги.
+    Все строки описываются смесью двух бета-биномиальных распределений числа голосов «против»
+    (исправные цели: p_false, rho_false; подменённые: p_detect, rho_detect) и разделяются EM:
+    апостериорные веса строк по правдоподобию, параметры компонент — взвешенный метод моментов.
+    :param votes: vote_bits.PackedVotes
+    :param iterations: предел итераций EM
+    :param tol: остановка, когда веса строк меняются меньше tol
+    :return: словарь {"p_detect", "rho_detect", "p_false", "rho_false", "share_detect"}
+             (p = None, если в компоненте не осталось голосов)
+    """
+    cast, negative = votes.counts()
+    # Строки различаются только парой (cast, negative): EM идёт по их гистограмме
+    cells, count = np.unique(np.stack([cast, negative])[:, cast > 0], axis=1, return_counts=True)
+    cast, negative = cells
+    spoofed = (2 * negative > cast).astype(float)  # начальное разделение — большинство «против»
+
+    def likelihood(p, rho):
+        out = np.zeros(len(cast))
+        if p is None:
+            return out
+        for m in np.unique(cast):
+            rows = cast == m
+            out[rows] = vote_pmf(int(m), p, rho)[negative[rows]]
+        return out
+
+    for _ in range(iterations):
+        share = (count * spoofed).sum() / max(count.sum(), 1)
+        p_detect, rho_detect = _moment_rates(cast, negative, count * spoofed)
+        p_false, rho_false = _moment_rates(cast, negative, count * (1.0 - spoofed))
+        joint_detect = share * likelihood(p_detect, rho_detect)
+        joint = joint_detect + (1.0 - share) * likelihood(p_false, rho_false)
+        updated = np.divide(joint_detect, joint, out=spoofed.copy(), where=joint > 0)
+        converged = np.abs(updated - spoofed).max(initial=0.0) < tol
+        spoofed = updated
+        if converged:
+            break
+    return {"p_detect": p_detect, "rho_detect": rho_detect, "p_false": p_false, "rho_false": rho_false,
+            "share_detect": float(share)}
+
+
+class SampledConsensus:
+    def __init__(self, state, k=16, rotate=False, delta=1e-3, p_detect=0.95, p_false=0.05, T=None,
+                 **leader_kwargs):
+        """
+        Выборочное голосование: каждого дрона проверяют k случайных наблюдателей из имеющих измерение
+        расстояния до него, а не все. Голоса и восстановление — обычный LeaderNode на графе (N, k),
+        стоимость O(N * k) вместо O(N²). Правило SwarmRaft с порогом под k (см. sample_tolerance);
+        estimates() — оценки вероятностей пропуска и ложной тревоги по модели голосов. Больше k —
+        выше уверенность, меньше пропускная способность.
+        Для смены эпох достаточно присвоить новое состояние атрибуту state.
+        :param state: SwarmState (плотный или с графом соседей)
+        :param k: наблюдателей на дрона
+        :param rotate: наблюдатели дрона сдвигаются по его фиксированному случайному циклу кандидатов,
+                       так что за ceil((N - 1) / k) эпох его проверяет каждый (иначе — новая выборка каждую эпоху)
+        :param delta: допустимая вероятность того, что неисправных наблюдателей в выборке больше допуска
+        :param p_detect: априорная вероятность голоса исправного наблюдателя против подменённого GNSS (для estimates)
+        :param p_false: априорная вероятность голоса исправного наблюдателя против исправного GNSS
+        :param T: порог невязки голосования (None — как у LeaderNode)
+        :param leader_kwargs: параметры LeaderNode (backend, recovery_method, tracker, ...)
+        """
+        self.state = state
+        self.k = k
+        self.rotate = rotate
+        self.delta = delta
+        self.p_detect = p_detect
+        self.p_false = p_false
+        self.leader_kwargs = leader_kwargs
+        if T is None:
+            T = LeaderNode(state, **leader_kwargs).T
+        self.T = T
+        self.epoch = 0
+        self.rates = None    # vote_rates последнего шага
+        self._cycle = None   # (перестановка, позиции в ней, сдвиги) для rotate и плотного состояния
+
+    def _candidates(self, state):
+        """
+        Кандидаты в наблюдатели по строкам: (число кандидатов (N,), функция t -> (наблюдатели, расстояния)).
+        Плотное состояние — все остальные дроны в порядке фиксированной случайной перестановки,
+        граф соседей — столбцы с измерением.
+        """
+        n = state.n
+        if self._cycle is None or len(self._cycle[0]) != n:
+            perm = np.random.permutation(n)
+            rank = np.empty(n, dtype=np.int64)
+            rank[perm] = np.arange(n)
+            self._cycle = perm, rank, np.random.randint(max(n - 1, 1), size=n)
+        perm, rank, _ = self._cycle
+        rows = np.arange(n)[:, None]
+        if not state.sparse:
+            def pick(t):
+                observers = perm[(rank[:, None] + 1 + t) % n]
+                return observers, state.ranges[observers, rows]
+            return np.full(n, n - 1), pick
+
+        observers, dij = state.pairs()
+        valid = (observers >= 0) & (observers != rows) & ~np.isnan(dij)
+        order = np.argsort(~valid, axis=1, kind="stable")  # столбцы с измерением — первыми
+
+        def pick(t):
+            columns = order[rows, t]
+            return observers[rows, columns], dij[rows, columns]
+        return valid.sum(axis=1), pick
+
+    def sample(self):
+        """
+        Граф выборки эпохи: SwarmState с neighbors (N, k) и расстояниями выбранных наблюдателей.
+        """
+        state, k = self.state, self.k
+        counts, pick = self._candidates(state)
+        columns = np.arange(k)
+        present = columns < counts[:, None]
+        if self.rotate:
+            t = (self._cycle[2][:, None] + self.epoch * k + columns) % np.maximum(counts, 1)[:, None]
+        else:
+            t = _distinct_draws(counts, k)
+        observers, dij = pick(np.where(present, t, 0))
+        observers = np.where(present, observers, -1)
+        dij = np.where(present, dij, np.nan)
+        return SwarmState(state.x_true, state.z_gnss, state.x_ins, state.prev_position, dij, state.ids,
+                          neighbors=observers)
+
+    def tolerance(self, f=1):
+        """Допуск голосов «за» для текущего k (см. sample_tolerance)."""
+        return sample_tolerance(self.state.n, min(self.k, self.state.n - 1), f, self.delta)
+
+    def estimates(self, f=1, k=None, rates=None):
+        """
+        Вероятности ошибок на дрона и ожидаемое число ошибок за эпоху — для текущего или другого k
+        (ручка «уверенность против пропускной способности»). Это оценки по модели error_estimates с
+        параметрами, измеренными на шаге (vote_rates), а не гарантированные границы.
+        :param k: число наблюдателей (по умолчанию self.k)
+        :param rates: параметры модели голосов (см. vote_rates); по умолчанию измеренные на последнем
+                      шаге, до первого шага — p_detect/p_false из конструктора без корреляции
+        :return: словарь
+        """
+        n = self.state.n
+        k = min(self.k if k is None else k, n - 1)
+        if rates is None:
+            rates = self.rates or {}
+        tolerance = sample_tolerance(n, k, f, self.delta)
+        p_detect = self.p_detect if rates.get("p_detect") is None else rates["p_detect"]
+        p_false = self.p_false if rates.get("p_false") is None else rates["p_false"]
+        miss, false_alarm = error_estimates(n, k, f, tolerance, p_detect, p_false,
+                                            rates.get("rho_detect", 0.0), rates.get("rho_false", 0.0))
+        return {
+            "k": k,
+            "tolerance": tolerance,
+            "miss": miss,
+            "false_alarm": false_alarm,
+            "expected_misses": f * miss,
+            "expected_false_alarms": (n - f) * false_alarm,
+            "votes": n * k,
+            "vote_fraction": k / max(n - 1, 1),
+        }
+
+    def step_consensus(self, f=1):
+        """
+        Шаг по выборке наблюдателей: голосование k наблюдателей, правило SwarmRaft с допуском под k,
+        восстановление по оценкам тех же наблюдателей.
+        :return: (словарь {drone_id: final_position}, множество ID неисправных) — как у LeaderNode
+        """
+        tolerance = self.tolerance(f)
+        leader = LeaderNode(self.sample(), **self.leader_kwargs)
+        leader.T = self.T
+        votes = leader.packed_votes()
+        cast, negative = votes.counts()
+        # допуск t голосов «за» в правиле SwarmRaft (fault_rule) соответствует f = 2t + 1
+        flagged = fault_rule(cast, negative, 2 * tolerance + 1)
+        ids = leader.ids
+        faulty = {ids[k] for k in np.flatnonzero(flagged)}
+        recovered = leader.recover_positions(faulty)
+        self.rates = vote_rates(votes)
+        self.epoch += 1
+        final = {i: recovered.get(i, leader.state.z_gnss[k]) for k, i in enumerate(ids)}
+        return final, faulty
+
+
+def _distinct_draws(counts, k):
+    """
+    k различных случайных номеров из 0 .. counts[i] - 1 в каждой строке (для строк с counts <= k —
+    все номера по порядку). Повторы перетягиваются, пока не исчезнут: O(N * k log k) при k << counts.
+    """
+    n = len(counts)
+    t = np.tile(np.arange(k), (n, 1))
+    rows = np.flatnonzero(counts > k)
+    dense = rows[2 * k > counts[rows]]  # выборка больше половины кандидатов — случайная перестановка
+    for i in dense:
+        t[i] = np.random.permutation(counts[i])[:k]
+    rows = rows[2 * k <= counts[rows]]
+    draws = (np.random.random((len(rows), k)) * counts[rows, None]).astype(np.int64)
+    while len(rows):
+        draws.sort(axis=1)
+        repeated = np.zeros(draws.shape, dtype=bool)
+        repeated[:, 1:] = draws[:, 1:] == draws[:, :-1]
+        done = ~repeated.any(axis=1)
+        t[rows[done]] = draws[done]
+        rows, draws, repeated = rows[~done], draws[~done], repeated[~done]
+        redraw = (np.random.random(draws.shape) * counts[rows, None]).astype(np.int64)
+        draws = np.where(repeated, redraw, draws)
+    return t
@@ -95,80 +95,10 @@ leader.T = 2 * np.sqrt(leader.gnss_var + leader.range_noise_std**2)
 final_positions, faulty_nodes = leader.step_consensus()
 
 # === Визуализация ===
-plt.figure(figsize=(8, 8))
+# Каждый слой (True, INS, Recovered, GNSS, FAULT) — одна коллекция, см. visualization.py
+from swarm_state import SwarmState
+from visualization import SwarmPlot
 
-# 1) Истинные позиции ◯
-for d in drones:
-    plt.scatter(
-        *d.x_true,
-        c='green',
-        s=100,
-        label='True' if d.id == 0 else "",
-        zorder=1
-    )
-
-# 2) INS-оценки △
-for d in drones:
-    plt.scatter(
-        *d.x_ins,
-        c='red',
-        marker='^',
-        s=100,
-        label='INS' if d.id == 0 else "",
-        zorder=2
-    )
-
-# 3) Восстановленные позиции ★
-for idx, pos in final_positions.items():
-    plt.scatter(
-        *pos,
-        c='black',
-        marker='*',
-        s=120,
-        label='Recovered' if idx == 0 else "",
-        zorder=3
-    )
-
-# 4) GNSS-измерения ✕ (через plot, крупные крестики)
-for d in drones:
-    plt.plot(
-        d.z_gnss[0],
-        d.z_gnss[1],
-        marker='x',
-        markersize=14,
-        markeredgewidth=3,
-        color='blue',
-        label='GNSS' if d.id == 0 else "",
-        zorder=4
-    )
-
-# 5) Подписи и метки FAULT
-for d in drones:
-    plt.text(
-        d.x_true[0] + 0.3,
-        d.x_true[1] + 0.3,
-        f'D{d.id}',
-        fontsize=9,
-        zorder=5
-    )
-for idx in faulty_nodes:
-    fp = final_positions[idx]
-    plt.text(
-        fp[0],
-        fp[1] - 1.0,
-        'FAULT',
-        color='crimson',
-        fontsize=10,
-        ha='center',
-        zorder=5
-    )
-
-plt.title("SwarmRaft Consensus & Recovery")
-plt.xlabel("X Coordinate (m)")
-plt.ylabel("Y Coordinate (m)")
-plt.legend(loc='upper right')
-plt.grid(True)
-plt.axis('equal')
-plt.xlim(0, 22)
-plt.ylim(0, 22)
+fig, ax = plt.subplots(figsize=(8, 8))
+SwarmPlot(ax, N, extent=(0, 22, 0, 22)).update(SwarmState.from_drones(drones), final_positions, faulty_nodes)
 plt.show()
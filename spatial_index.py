@@ -0,0 +1,119 @@
+import itertools
+
+import numpy as np
+
+
+class GridIndex:
+    def __init__(self, positions, cell_size):
+        """
+        Равномерная сетка (grid hash) над позициями дронов для поиска соседей за O(N·k).
+        :param positions: позиции, (N, d)
+        :param cell_size: размер ячейки сетки (не меньше радиуса запросов)
+        """
+        self.positions = np.asarray(positions, dtype=float)
+        self.cell_size = float(cell_size)
+        n, d = self.positions.shape
+        # +1 — запас, чтобы соседние ячейки (offset -1) тоже имели неотрицательные координаты
+        self._cells = np.floor((self.positions - self.positions.min(axis=0)) / self.cell_size).astype(np.int64) + 1
+        extent = self._cells.max(axis=0) + 2 if n else np.ones(d, dtype=np.int64)
+        self._strides = np.concatenate([[1], np.cumprod(extent[:-1])]).astype(np.int64)
+        keys = self._cells @ self._strides
+        self._order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[self._order]
+
+    def _candidate_pairs(self, rows=None):
+        """
+        Все пары (i, j), j != i, у которых j лежит в той же или соседней ячейке, что и i.
+        :param rows: индексы запрашивающих точек (по умолчанию все)
+        :return: (queries, candidates) — два массива индексов одинаковой длины
+        """
+        n, d = self.positions.shape
+        rows = np.arange(n) if rows is None else np.asarray(rows)
+        queries, candidates = [], []
+        for offset in itertools.product((-1, 0, 1), repeat=d):
+            keys = (self._cells[rows] + np.array(offset)) @ self._strides
+            start = np.searchsorted(self._sorted_keys, keys, side="left")
+            counts = np.searchsorted(self._sorted_keys, keys, side="right") - start
+            q = np.repeat(rows, counts)
+            within = np.arange(len(q)) - np.repeat(np.cumsum(counts) - counts, counts)
+            queries.append(q)
+            candidates.append(self._order[np.repeat(start, counts) + within])
+        queries = np.concatenate(queries)
+        candidates = np.concatenate(candidates)
+        keep = queries != candidates
+        return queries[keep], candidates[keep]
+
+    def query_radius(self, radius, max_neighbors=None, rows=None):
+        """
+        Соседи в радиусе radius (отсортированы по расстоянию).
+        :param radius: радиус поиска (не больше cell_size)
+        :param max_neighbors: оставить не более стольких ближайших соседей
+        :param rows: искать только для этих точек (остальные строки результата пустые)
+        :return: (neighbors, distances) — массивы (N, K), недостающие места: -1 и inf
+        """
+        if radius > self.cell_size:
+            raise ValueError(f"radius {radius} exceeds grid cell size {self.cell_size}")
+        queries, candidates = self._candidate_pairs(rows)
+        diff = self.positions[queries] - self.positions[candidates]
+        dist = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+        keep = dist <= radius
+        return _pad_rows(len(self.positions), queries[keep], candidates[keep], dist[keep], max_neighbors)
+
+    def query_knn(self, k):
+        """
+        k ближайших соседей каждого дрона. Радиус поиска растёт, пока у всех не наберётся k соседей.
+        :return: (neighbors, distances) — массивы (N, k)
+        """
+        n, d = self.positions.shape
+        k = min(k, n - 1)
+        span = np.ptp(self.positions, axis=0).prod() if n else 0.0
+        radius = (span * (k + 1) / max(n, 1)) ** (1.0 / d) if span > 0 else self.cell_size
+        neighbors = np.full((n, k), -1, dtype=np.int64)
+        distances = np.full((n, k), np.inf)
+        missing = np.arange(n)
+        # Радиус растёт только для точек, у которых ещё не набралось k соседей (обычно края облака)
+        while len(missing) and k > 0:
+            index = self if radius <= self.cell_size else GridIndex(self.positions, radius)
+            found, dist = index.query_radius(radius, max_neighbors=k, rows=missing)
+            width = found.shape[1]
+            neighbors[missing, :width] = found[missing]
+            distances[missing, :width] = dist[missing]
+            missing = missing[neighbors[missing, k - 1] < 0]
+            radius *= 1.5
+        return neighbors, distances
+
+
+def _pad_rows(n, rows, cols, dist, max_neighbors=None):
+    """
+    Список пар -> дополненные до прямоугольника строки, отсортированные по расстоянию.
+    """
+    order = np.argsort(dist)
+    order = order[np.argsort(rows[order], kind="stable")]  # по строкам, внутри строки — по расстоянию
+    rows, cols, dist = rows[order], cols[order], dist[order]
+    counts = np.bincount(rows, minlength=n)
+    pos = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    width = int(counts.max()) if len(rows) else 0
+    if max_neighbors is not None:
+        width = min(width, max_neighbors)
+        keep = pos < width
+        rows, cols, dist, pos = rows[keep], cols[keep], dist[keep], pos[keep]
+    neighbors = np.full((n, width), -1, dtype=np.int64)
+    distances = np.full((n, width), np.inf)
+    neighbors[rows, pos] = cols
+    distances[rows, pos] = dist
+    return neighbors, distances
+
+
+def neighbor_graph(positions, radius=None, k=None):
+    """
+    Граф соседей для ограниченного ranging: в радиусе radius и/или k ближайших.
+    :param positions: истинные позиции дронов, (N, d)
+    :param radius: радиус связи (например, дальность UWB)
+    :param k: максимальное число соседей
+    :return: массив (N, K) индексов соседей, -1 — пустое место
+    """
+    if radius is None and k is None:
+        raise ValueError("either radius or k must be given")
+    if radius is None:
+        return GridIndex(positions, 1.0).query_knn(k)[0]
+    return GridIndex(positions, radius).query_radius(radius, max_neighbors=k)[0]
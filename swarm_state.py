@@ -0,0 +1,166 @@
+import numpy as np
+
+from spatial_index import neighbor_graph
+
+
+class SwarmState:
+    def __init__(self, x_true, z_gnss, x_ins, prev_position, ranges, ids=None, neighbors=None):
+        """
+        Состояние всего роя в виде массивов (struct-of-arrays) вместо N объектов DroneNode.
+        :param x_true: истинные позиции, (N, d)
+        :param z_gnss: GNSS-измерения, (N, d)
+        :param x_ins: INS-оценки, (N, d)
+        :param prev_position: позиции на предыдущем шаге, (N, d)
+        :param ranges: матрица расстояний, ranges[j, i] — измерение дрона j до дрона i, (N, N); NaN = нет измерения
+        :param ids: идентификаторы дронов (по умолчанию 0..N-1)
+        :param neighbors: граф соседей (N, K), -1 — пусто; если задан, ranges имеет форму (N, K) и
+                          ranges[i, m] — измерение дрона neighbors[i, m] до дрона i
+        """
+        self.x_true = np.asarray(x_true, dtype=float)
+        self.z_gnss = np.asarray(z_gnss, dtype=float)
+        self.x_ins = np.asarray(x_ins, dtype=float)
+        self.prev_position = np.asarray(prev_position, dtype=float)
+        self.ranges = np.asarray(ranges, dtype=float)
+        n = self.x_true.shape[0]
+        self.ids = list(range(n)) if ids is None else list(ids)
+        self.neighbors = None if neighbors is None else np.asarray(neighbors, dtype=np.int64)
+
+        for name in ("z_gnss", "x_ins", "prev_position"):
+            if getattr(self, name).shape != self.x_true.shape:
+                raise ValueError(f"{name} must have shape {self.x_true.shape}")
+        if self.neighbors is not None:
+            if self.neighbors.ndim != 2 or self.neighbors.shape[0] != n:
+                raise ValueError(f"neighbors must have shape (N, K) with N={n}")
+            if self.ranges.shape != self.neighbors.shape:
+                raise ValueError(f"ranges must have shape {self.neighbors.shape} for a neighbor graph")
+        elif self.ranges.shape != (n, n):
+            raise ValueError(f"ranges must have shape {(n, n)}")
+        if len(self.ids) != n:
+            raise ValueError("ids must have one entry per drone")
+
+    @property
+    def n(self):
+        return self.x_true.shape[0]
+
+    @property
+    def dim(self):
+        return self.x_true.shape[1]
+
+    @property
+    def sparse(self):
+        return self.neighbors is not None
+
+    @classmethod
+    def from_drones(cls, drones):
+        """
+        Собирает состояние из списка объектов DroneNode.
+        :param drones: итерируемый набор DroneNode
+        :return: SwarmState
+        """
+        drones = list(drones)
+        ids = [d.id for d in drones]
+        index = {drone_id: k for k, drone_id in enumerate(ids)}
+        ranges = np.full((len(drones), len(drones)), np.nan)
+        for j, d in enumerate(drones):
+            for other_id, dist in d.range_measurements.items():
+                if other_id in index:
+                    ranges[j, index[other_id]] = dist
+        return cls(
+            x_true=np.array([d.x_true for d in drones]),
+            z_gnss=np.array([d.z_gnss for d in drones]),
+            x_ins=np.array([d.x_ins for d in drones]),
+            prev_position=np.array([d.prev_position for d in drones]),
+            ranges=ranges,
+            ids=ids,
+        )
+
+    @classmethod
+    def generate(cls, positions, gnss_noise_std=1.0, ins_noise_std=0.5, range_noise_std=0.2, radius=None, k=None):
+        """
+        Векторный аналог создания DroneNode для каждой позиции + попарного measure_range_to.
+        Если задан radius или k, расстояния измеряются только до соседей (см. measure_ranges).
+        :param positions: истинные позиции, (N, d)
+        :param gnss_noise_std: стандартное отклонение шума GNSS
+        :param ins_noise_std: стандартное отклонение шума INS
+        :param range_noise_std: стандартное отклонение шума измерения расстояния
+        :param radius: дальность ranging
+        :param k: максимальное число соседей
+        :return: SwarmState
+        """
+        x_true = np.asarray(positions, dtype=float)
+        z_gnss = x_true + np.random.normal(0, gnss_noise_std, size=x_true.shape)
+        prev_position = x_true - np.random.normal(0, 1.0, size=x_true.shape)
+        delta_u = x_true - prev_position
+        x_ins = prev_position + delta_u + np.random.normal(0, ins_noise_std, size=x_true.shape)
+        # Пустой граф-заглушка: measure_ranges заменит его на полный или соседский
+        empty = np.empty((len(x_true), 0))
+        state = cls(x_true, z_gnss, x_ins, prev_position, empty, neighbors=empty)
+        state.measure_ranges(range_noise_std, radius=radius, k=k)
+        return state
+
+    def measure_ranges(self, range_noise_std=0.2, radius=None, k=None):
+        """
+        Дроны измеряют расстояния друг до друга (с шумом).
+        Без radius/k — все пары, матрица (N, N) с NaN на диагонали; иначе только соседи по
+        пространственному индексу (см. spatial_index.neighbor_graph), массив (N, K).
+        :param range_noise_std: стандартное отклонение шума измерения расстояния
+        :param radius: дальность ranging
+        :param k: максимальное число соседей
+        """
+        if radius is not None or k is not None:
+            neighbors = neighbor_graph(self.x_true, radius=radius, k=k)
+            valid = neighbors >= 0
+            diff = self.x_true[:, None, :] - self.x_true[neighbors]
+            ranges = np.sqrt(np.einsum("ijk,ijk->ij", diff, diff))
+            ranges += np.random.normal(0, range_noise_std, size=ranges.shape)
+            ranges[~valid] = np.nan
+            self.neighbors = neighbors
+            self.ranges = ranges
+            return
+
+        diff = self.x_true[:, None, :] - self.x_true[None, :, :]
+        ranges = np.sqrt(np.einsum("ijk,ijk->ij", diff, diff))
+        ranges += np.random.normal(0, range_noise_std, size=ranges.shape)
+        np.fill_diagonal(ranges, np.nan)
+        self.neighbors = None
+        self.ranges = ranges
+
+    def pairs(self):
+        """
+        Наблюдатели и расстояния всех пар в форме (N, K) (для плотного состояния K = N).
+        :return: (observers, dij); observers[i, m] — наблюдатель дрона i (-1 — пусто), dij — его измерение до i
+        """
+        if self.sparse:
+            return self.neighbors, self.ranges
+        return np.broadcast_to(np.arange(self.n)[None, :], (self.n, self.n)), self.ranges.T
+
+    def subset(self, idx):
+        """
+        Состояние подмножества дронов (например, пришедших до дедлайна или одного кластера).
+        Для графа соседей ссылки на дронов вне подмножества становятся пустыми (-1).
+        :param idx: индексы строк
+        :return: SwarmState
+        """
+        idx = np.asarray(idx, dtype=np.int64)
+        if self.sparse:
+            remap = np.full(self.n + 1, -1)
+            remap[idx] = np.arange(len(idx))
+            neighbors = remap[self.neighbors[idx]]  # -1 в neighbors попадает в remap[-1] == -1
+            ranges = np.where(neighbors >= 0, self.ranges[idx], np.nan)
+        else:
+            neighbors = None
+            ranges = self.ranges[np.ix_(idx, idx)]
+        return SwarmState(self.x_true[idx], self.z_gnss[idx], self.x_ins[idx], self.prev_position[idx],
+                          ranges, ids=[self.ids[k] for k in idx], neighbors=neighbors)
+
+    def copy(self):
+        return SwarmState(
+            self.x_true.copy(), self.z_gnss.copy(), self.x_ins.copy(),
+            self.prev_position.copy(), self.ranges.copy(), ids=self.ids,
+            neighbors=None if self.neighbors is None else self.neighbors.copy(),
+        )
+
+    def __repr__(self):
+        if self.sparse:
+            return f"<SwarmState n={self.n}, dim={self.dim}, neighbors={self.neighbors.shape[1]}>"
+        return f"<SwarmState n={self.n}, dim={self.dim}>"
@@ -0,0 +1,365 @@
+import argparse
+import json
+import sys
+
+# На уровне модуля — только стандартная библиотека: numpy, pandas, pyarrow и matplotlib
+# импортируются внутри подкоманд, которым они нужны (короткие задачи планировщика стартуют быстро).
+
+
+def cmd_run(args):
+    """
+    Один шаг консенсуса: N дронов, n_attackers со спуфингом GNSS. Без --plot/--show ничего не рисует.
+    """
+    import numpy as np
+
+    from leader_node import LeaderNode, vote_threshold
+    from metrics import mean_absolute_error, root_mean_squared_error
+    from swarm_state import SwarmState
+
+    if not 0 <= args.n_attackers <= args.n_drones:
+        raise SystemExit(f"--n_attackers must be between 0 and --n_drones ({args.n_drones})")
+    np.random.seed(args.seed)
+    area = args.area * np.sqrt(args.n_drones / 5)  # плотность роя как у базового сценария N=5 на 20x20 м
+    positions = np.random.rand(args.n_drones, 2) * area
+    state = SwarmState.generate(positions, radius=args.radius, k=args.k)
+    attacked = np.sort(np.random.choice(args.n_drones, args.n_attackers, replace=False))
+    state.z_gnss[attacked] += np.array([args.bias, -args.bias])
+
+    leader = LeaderNode(state, backend=args.backend, recovery_method=args.recovery)
+    leader.T = vote_threshold(leader.gnss_var, leader.range_noise_std)
+    if args.cluster_size is not None:
+        from hierarchical import HierarchicalConsensus
+
+        leader = HierarchicalConsensus(state, cluster_size=args.cluster_size, halo=args.halo, workers=args.workers,
+                                       T=leader.T, backend=args.backend, recovery_method=args.recovery)
+    elif args.sample_k is not None:
+        from sampled_voting import SampledConsensus
+
+        leader = SampledConsensus(state, k=args.sample_k, delta=args.delta, T=leader.T, backend=args.backend,
+                                  recovery_method=args.recovery)
+    try:
+        final_positions, faulty_nodes = leader.step_consensus(f=args.f)
+    finally:
+        if args.cluster_size is not None:
+            leader.close()  # процессы кластеров
+    recovered = np.array([final_positions[i] for i in state.ids])
+
+    result = {
+        "Num_Drones": args.n_drones,
+        "Num_Attacked": args.n_attackers,
+        "Attacked": attacked.tolist(),
+        "Faulty": sorted(faulty_nodes),
+        "MAE_GNSS": mean_absolute_error(state.x_true, state.z_gnss),
+        "MAE_Recovered": mean_absolute_error(state.x_true, recovered),
+        "RMSE_GNSS": root_mean_squared_error(state.x_true, state.z_gnss),
+        "RMSE_Recovered": root_mean_squared_error(state.x_true, recovered),
+    }
+    if args.sample_k is not None and args.cluster_size is None:
+        result["Sampling_Estimates"] = leader.estimates(f=args.f)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"N={args.n_drones}, attacked={result['Attacked']}, flagged faulty={result['Faulty']}")
+        print(f"MAE (GNSS):       {result['MAE_GNSS']:.3f} m")
+        print(f"MAE (Recovered):  {result['MAE_Recovered']:.3f} m")
+        print(f"RMSE (GNSS):      {result['RMSE_GNSS']:.3f} m")
+        print(f"RMSE (Recovered): {result['RMSE_Recovered']:.3f} m")
+        if "Sampling_Estimates" in result:
+            est = result["Sampling_Estimates"]
+            print(f"Sampled voting: k={est['k']} ({est['vote_fraction']:.1%} of pairs), "
+                  f"tolerance={est['tolerance']}, P(miss)~{est['miss']:.2e}, "
+                  f"P(false alarm)~{est['false_alarm']:.2e} (model estimates)")
+
+    if args.plot or args.show:
+        from run_experiment import plot_recovery
+
+        plot_recovery(state, final_positions, faulty_nodes, path=args.plot)
+        if args.plot:
+            print(f"Figure saved as: {args.plot}")
+    return 0
+
+
+def cmd_sweep(args):
+    import sweep
+
+    return sweep.main(args.extra, prog="swarmraft sweep")
+
+
+def cmd_plot(args):
+    from plot_dynamic_results import load_grouped, plot_errors
+
+    plot_errors(load_grouped(args.results, args.n_drones), path=args.output)
+    print(f"Figure saved as: {args.output}")
+    return 0
+
+
+def cmd_record(args):
+    """
+    Запись эпох EpochSimulator в memory-mapped каталог (см. recording.py).
+    """
+    import numpy as np
+
+    from epoch_simulator import EpochSimulator
+    from recording import record_simulation
+
+    np.random.seed(args.seed)
+    positions = np.random.rand(args.n_drones, 2) * args.area * np.sqrt(args.n_drones / 5)
+    spoofed = np.random.choice(args.n_drones, args.n_attackers, replace=False)
+    sim = EpochSimulator(positions, spoofed=spoofed, f=args.f, radius=args.radius, k=args.k)
+    record_simulation(sim, args.out, args.epochs, width=args.width)
+    print(f"Recorded {args.epochs} epochs of {args.n_drones} drones to: {args.out}")
+    return 0
+
+
+def cmd_replay(args):
+    """
+    Консенсус по записанным эпохам, метрики по строке на эпоху.
+    """
+    from recording import replay
+
+    for metrics in replay(args.path, f=args.f, T=args.T, epochs=args.epochs, kalman=args.kalman, seed=args.seed,
+                          backend=args.backend, recovery_method=args.recovery):
+        if args.json:
+            print(json.dumps(metrics))
+        else:
+            print(f"epoch {metrics['Epoch']:>4}: flagged={metrics['Num_Faulty']} detected={metrics['Detected']} "
+                  f"false_alarms={metrics['False_Alarms']} MAE={metrics['MAE_Recovered']:.3f} m "
+                  + (f"filter_MAE={metrics['MAE_Filter']:.3f} m " if "MAE_Filter" in metrics else "")
+                  + f"step={metrics['Step_Time_s'] * 1e3:.1f} ms")
+    return 0
+
+
+def cmd_animate(args):
+    """
+    Анимация записанных эпох: консенсус по каждой эпохе записи, кадры с блиттингом вне экрана.
+    """
+    from leader_node import LeaderNode
+    from recording import Recording
+    from visualization import export_animation
+
+    recording = Recording(args.path)
+
+    def frames():
+        for epoch in range(len(recording) if args.epochs is None else min(args.epochs, len(recording))):
+            state = recording.state(epoch)
+            final_positions, faulty = LeaderNode(state, backend=args.backend).step_consensus(f=args.f)
+            yield state, final_positions, faulty
+
+    count = export_animation(frames(), args.output, fps=args.fps, dpi=args.dpi)
+    print(f"{count} frames saved as: {args.output}")
+    return 0
+
+
+def cmd_realtime(args):
+    """
+    Фиксированная частота консенсуса на заранее сгенерированных тактах; сводка задержек для сертификации.
+    """
+    import numpy as np
+
+    from leader_node import vote_threshold
+    from realtime import RealTimeLoop
+    from swarm_state import SwarmState
+
+    np.random.seed(args.seed)
+    area = args.area * np.sqrt(args.n_drones / 5)
+    states = []
+    for _ in range(args.states):  # измерения готовятся заранее: в задержку такта входит только консенсус
+        state = SwarmState.generate(np.random.rand(args.n_drones, 2) * area, radius=args.radius, k=args.k)
+        state.z_gnss[np.random.choice(args.n_drones, args.n_attackers, replace=False)] += [args.bias, -args.bias]
+        states.append(state)
+
+    loop = RealTimeLoop(lambda tick: states[tick % len(states)], rate=args.rate, deadline=args.deadline, f=args.f,
+                        fallback=args.fallback, T=vote_threshold() if args.T is None else args.T,
+                        backend=args.backend)
+    for _ in loop.run(args.ticks):
+        pass
+    summary = loop.summary()
+    if args.json:
+        print(json.dumps(summary))
+    else:
+        print(f"N={args.n_drones} at {summary['rate_hz']:g} Hz, deadline {summary['deadline_s'] * 1e3:.1f} ms, "
+              f"{summary['ticks']} ticks")
+        print(f"latency p50 <= {summary['latency_p50_s'] * 1e3:.2f} ms, p99 <= {summary['latency_p99_s'] * 1e3:.2f} ms, "
+              f"max {summary['latency_max_s'] * 1e3:.2f} ms")
+        print(f"deadline misses: {summary['deadline_misses']}, skipped ticks: {summary['skipped_ticks']}, "
+              f"fallback nodes: {summary['fallback_nodes']}")
+        print("within budget" if summary["within_budget"] else "OVER BUDGET")
+    return 0 if summary["within_budget"] else 1
+
+
+def cmd_emulate(args):
+    """
+    Эмуляция роя в процессах с общей памятью: лидер с частотой --rate, затем сводка пропускной способности.
+    """
+    import numpy as np
+
+    from emulation import DroneEmulation
+    from leader_node import vote_threshold
+
+    np.random.seed(args.seed)
+    area = args.area * np.sqrt(args.n_drones / 5)
+    positions = np.random.rand(args.n_drones, 2) * area
+    velocities = np.random.normal(0, args.speed, size=positions.shape)
+    spoofed = np.random.choice(args.n_drones, args.n_attackers, replace=False)
+    emulation = DroneEmulation(positions, velocities, workers=args.workers, gnss_rate=args.gnss_rate,
+                               ins_rate=args.ins_rate, range_rate=args.range_rate, radius=args.radius, k=args.k,
+                               spoofed=spoofed, seed=args.seed)
+    with emulation:
+        for metrics in emulation.run(args.epochs, rate=args.rate, f=args.f,
+                                     T=vote_threshold() if args.T is None else args.T, backend=args.backend):
+            if args.verbose:
+                print(f"epoch {metrics['Epoch']:>4}: frame={metrics['Frame']} detected={metrics['Detected']} "
+                      f"false_alarms={metrics['False_Alarms']} gnss_age={metrics['Staleness_gnss_s'] * 1e3:.1f} ms "
+                      f"step={metrics['Step_Time_s'] * 1e3:.1f} ms")
+    report = emulation.report()
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print(f"N={report['n_drones']} in {report['workers']} drone processes, {report['elapsed_s']:.2f} s")
+        print("produced samples/s: " + ", ".join(f"{stream} {report[f'produced_{stream}_per_s']:.0f} "
+                                                 f"({report[f'produced_{stream}_fraction']:.0%} of nominal)"
+                                                 for stream in ("gnss", "ins", "range"))
+              + f"; frames published/s {report['published_frames_per_s']:.0f}")
+        print(f"consumed: {report['consumed_frames']} frames, {report['consumed_drones_per_s']:.0f} drones/s, "
+              f"{report['consumed_mb_per_s']:.1f} MB/s zero-copy; torn {report['torn_frames']}, "
+              f"fallback {report['fallback_frames']}, missed {report['missed_epochs']}; step p99 <= {report['step_p99_s'] * 1e3:.1f} ms")
+        print("staleness p99: " + ", ".join(f"{stream} {report[f'staleness_{stream}_p99_s'] * 1e3:.1f} ms"
+                                            for stream in ("gnss", "ins", "range")))
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="swarmraft", description="SwarmRaft simulation toolkit")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="simulate one consensus step under GNSS spoofing")
+    run.add_argument("--n_drones", type=int, default=5)
+    run.add_argument("--n_attackers", type=int, default=1)
+    run.add_argument("--f", type=int, default=1, help="max number of faulty nodes assumed by the leader")
+    run.add_argument("--bias", type=float, default=15.0, help="GNSS spoofing offset (m)")
+    run.add_argument("--area", type=float, default=20.0, help="side of the area for 5 drones (m)")
+    run.add_argument("--radius", type=float, default=None, help="ranging radius (neighbor-limited ranging)")
+    run.add_argument("--k", type=int, default=None, help="max ranging neighbors per drone")
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--recovery", default="median", choices=("median", "geometric_median", "trimmed_mean"),
+                     help="estimator for recovered positions")
+    run.add_argument("--backend", default=None, help="consensus kernel backend: numpy (default), numba, tiled or auto")
+    run.add_argument("--cluster_size", type=int, default=None,
+                     help="hierarchical consensus: spatial clusters of at most this many drones, one sub-leader each")
+    run.add_argument("--halo", type=float, default=None,
+                     help="with --cluster_size and full ranging: radius for votes across cluster borders (m)")
+    run.add_argument("--workers", type=int, default=None, help="processes for --cluster_size (default: all cores)")
+    run.add_argument("--sample_k", type=int, default=None,
+                     help="sub-sampled voting: each drone is checked by this many random peers (O(N*k))")
+    run.add_argument("--delta", type=float, default=1e-3,
+                     help="with --sample_k: allowed probability of more faulty peers in a sample than tolerated")
+    run.add_argument("--json", action="store_true", help="print metrics as one JSON line")
+    run.add_argument("--plot", default=None, help="save a figure of the step to this file (headless)")
+    run.add_argument("--show", action="store_true", help="open an interactive figure window")
+    run.set_defaults(handler=cmd_run)
+
+    sweep = commands.add_parser("sweep", add_help=False, help="parallel resumable sweep (see `swarmraft sweep -h`)")
+    sweep.set_defaults(handler=cmd_sweep)
+
+    record = commands.add_parser("record", help="record simulated epochs as a memory-mapped dataset")
+    record.add_argument("--out", required=True, help="output directory")
+    record.add_argument("--n_drones", type=int, default=50)
+    record.add_argument("--n_attackers", type=int, default=5)
+    record.add_argument("--epochs", type=int, default=10)
+    record.add_argument("--f", type=int, default=1)
+    record.add_argument("--area", type=float, default=20.0, help="side of the area for 5 drones (m)")
+    record.add_argument("--radius", type=float, default=None, help="ranging radius (neighbor-limited ranging)")
+    record.add_argument("--k", type=int, default=None, help="max ranging neighbors per drone")
+    record.add_argument("--width", type=int, default=None, help="neighbor columns stored per epoch (sparse ranging)")
+    record.add_argument("--seed", type=int, default=42)
+    record.set_defaults(handler=cmd_record)
+
+    replay = commands.add_parser("replay", help="run consensus over a recorded dataset without loading it into RAM")
+    replay.add_argument("path", help="recording directory")
+    replay.add_argument("--f", type=int, default=1)
+    replay.add_argument("--epochs", type=int, default=None, help="replay only the first EPOCHS epochs")
+    replay.add_argument("--T", type=float, default=None, help="voting threshold (default: drawn per epoch; not with --kalman)")
+    replay.add_argument("--seed", type=int, default=None,
+                        help="seed for the random threshold and fusion weights; replays are reproducible only with it")
+    replay.add_argument("--recovery", default="median", choices=("median", "geometric_median", "trimmed_mean"))
+    replay.add_argument("--backend", default=None, help="consensus kernel backend: numpy (default), numba, tiled or auto")
+    replay.add_argument("--kalman", action="store_true",
+                        help="carry a swarm Kalman filter across epochs (fusion prior, alpha weights, threshold; excludes --T)")
+    replay.add_argument("--json", action="store_true", help="print one JSON line per epoch")
+    replay.set_defaults(handler=cmd_replay)
+
+    animate = commands.add_parser("animate", help="render a recorded dataset as an animation (headless)")
+    animate.add_argument("path", help="recording directory")
+    animate.add_argument("--output", default="swarmraft_replay.gif", help=".mp4/.webm (needs ffmpeg), .gif or a directory")
+    animate.add_argument("--fps", type=int, default=10)
+    animate.add_argument("--dpi", type=int, default=100)
+    animate.add_argument("--f", type=int, default=1)
+    animate.add_argument("--epochs", type=int, default=None, help="render only the first EPOCHS epochs")
+    animate.add_argument("--backend", default=None, help="consensus kernel backend: numpy (default), numba, tiled or auto")
+    animate.set_defaults(handler=cmd_animate)
+
+    realtime = commands.add_parser("realtime", help="fixed-rate consensus loop; certify N against a latency budget")
+    realtime.add_argument("--n_drones", type=int, default=100)
+    realtime.add_argument("--n_attackers", type=int, default=10)
+    realtime.add_argument("--f", type=int, default=1)
+    realtime.add_argument("--bias", type=float, default=15.0, help="GNSS spoofing offset (m)")
+    realtime.add_argument("--area", type=float, default=20.0, help="side of the area for 5 drones (m)")
+    realtime.add_argument("--radius", type=float, default=None, help="ranging radius (neighbor-limited ranging)")
+    realtime.add_argument("--k", type=int, default=None, help="max ranging neighbors per drone")
+    realtime.add_argument("--rate", type=float, default=50.0, help="control rate (Hz)")
+    realtime.add_argument("--deadline", type=float, default=None, help="step budget (s); default 1 / rate")
+    realtime.add_argument("--ticks", type=int, default=200)
+    realtime.add_argument("--states", type=int, default=8, help="distinct pre-generated measurement sets to cycle")
+    realtime.add_argument("--T", type=float, default=None,
+                          help="voting threshold (default: 2 sigma of the default GNSS and ranging noise)")
+    realtime.add_argument("--fallback", default="last", choices=("last", "gnss"),
+                          help="position of faulty nodes not recovered before the deadline")
+    realtime.add_argument("--backend", default=None, help="consensus kernel backend: numpy (default), numba, tiled or auto")
+    realtime.add_argument("--seed", type=int, default=42)
+    realtime.add_argument("--json", action="store_true", help="print the summary as one JSON line")
+    realtime.set_defaults(handler=cmd_realtime)
+
+    emulate = commands.add_parser("emulate", help="drone processes over shared-memory ring buffers; ingest limits")
+    emulate.add_argument("--n_drones", type=int, default=1000)
+    emulate.add_argument("--n_attackers", type=int, default=10)
+    emulate.add_argument("--f", type=int, default=1)
+    emulate.add_argument("--workers", type=int, default=2, help="drone processes (each owns a block of drones)")
+    emulate.add_argument("--gnss_rate", type=float, default=10.0, help="GNSS sample rate per drone (Hz)")
+    emulate.add_argument("--ins_rate", type=float, default=50.0, help="INS sample rate per drone (Hz)")
+    emulate.add_argument("--range_rate", type=float, default=5.0, help="ranging rate per drone (Hz)")
+    emulate.add_argument("--rate", type=float, default=10.0, help="leader epoch rate (Hz)")
+    emulate.add_argument("--epochs", type=int, default=50)
+    emulate.add_argument("--speed", type=float, default=1.0, help="std of drone velocities (m/s)")
+    emulate.add_argument("--area", type=float, default=20.0, help="side of the area for 5 drones (m)")
+    emulate.add_argument("--radius", type=float, default=None, help="ranging radius (neighbor-limited ranging)")
+    emulate.add_argument("--k", type=int, default=None, help="max ranging neighbors per drone")
+    emulate.add_argument("--T", type=float, default=None,
+                         help="voting threshold (default: 2 sigma of the emulated GNSS and ranging noise)")
+    emulate.add_argument("--backend", default=None, help="consensus kernel backend: numpy (default), numba, tiled or auto")
+    emulate.add_argument("--seed", type=int, default=42)
+    emulate.add_argument("--verbose", action="store_true", help="print one line per epoch")
+    emulate.add_argument("--json", action="store_true", help="print the report as one JSON line")
+    emulate.set_defaults(handler=cmd_emulate)
+
+    plot = commands.add_parser("plot", help="plot MAE/RMSE vs attacked drones from a results store")
+    plot.add_argument("--results", default="swarmraft_results")
+    plot.add_argument("--n_drones", type=int, default=None)
+    plot.add_argument("--output", default="swarmraft_errors.png")
+    plot.set_defaults(handler=cmd_plot)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    # Аргументы `sweep` разбирает сам sweep.main, остальным подкомандам лишние аргументы — ошибка
+    args, extra = parser.parse_known_args(argv)
+    args.extra = extra
+    if args.extra and args.command != "sweep":
+        parser.error(f"unrecognized arguments: {' '.join(args.extra)}")
+    if args.command == "replay" and args.kalman and args.T is not None:
+        parser.error("--T cannot be combined with --kalman: the Kalman filter sets the threshold every epoch")
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
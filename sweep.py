@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import results_store
+from monte_carlo import COLUMNS, simulate_batch
+from online_stats import MetricAggregator
+from result_cache import ResultCache, cached_trials
+
+# Ячейка свипа: chunk — номер блока повторов внутри (N, f, bias)
+Cell = namedtuple("Cell", ["N", "f", "bias", "chunk", "repeats"])
+
+SWEEP_COLUMNS = COLUMNS[:2] + ("Bias", "Repeat") + COLUMNS[2:]
+
+MANIFEST = "_sweep.json"  # "_" — Parquet-датасет не считает файл данными
+GRID_KEYS = ("N_values", "biases")  # оси сетки, которые можно расширять в том же каталоге
+
+
+def build_cells(N_values, biases, repeats, chunk_size=100):
+    """
+    Разбивает свип на ячейки (N, f, bias, chunk). Разбиение зависит только от параметров свипа,
+    но не от числа процессов, поэтому результаты воспроизводимы при любом числе воркеров.
+    :param N_values: размеры роя
+    :param biases: величины спуфинга GNSS
+    :param repeats: число повторов на (N, f, bias)
+    :param chunk_size: число повторов в одной ячейке
+    :return: список Cell
+    """
+    cells = []
+    for N in N_values:
+        for f in range(1, N):
+            for bias in biases:
+                for chunk, start in enumerate(range(0, repeats, chunk_size)):
+                    cells.append(Cell(N, f, float(bias), chunk, min(chunk_size, repeats - start)))
+    return cells
+
+
+def cell_seed(root_seed, cell):
+    """
+    Независимый поток случайных чисел для ячейки: выводится из корневого seed и ключа ячейки,
+    а не из порядка выполнения.
+    :return: np.random.SeedSequence
+    """
+    bias_bits = int(np.float64(cell.bias).view(np.uint64))
+    return np.random.SeedSequence(root_seed, spawn_key=(cell.N, cell.f, bias_bits, cell.chunk))
+
+
+def shard_name(cell):
+    return f"b{cell.bias!r}_c{cell.chunk}"
+
+
+def shard_path(out_dir, cell):
+    return results_store.shard_path(out_dir, {"Num_Drones": cell.N, "Num_Attacked": cell.f}, shard_name(cell))
+
+
+def run_cell(cell, root_seed, out_dir, chunk_size, engine_kwargs, cache=None):
+    """
+    Считает одну ячейку (или берёт её из кэша результатов) и атомарно записывает её Parquet-шард
+    в раздел Num_Drones=N/Num_Attacked=f.
+    :param cache: result_cache.ResultCache, общий для свипов с разными out_dir
+    :return: путь к шарду
+    """
+    columns, _ = cached_trials(cache, cell.N, cell.f, cell.repeats, cell_seed(root_seed, cell),
+                               batch_size=chunk_size, bias=cell.bias, **engine_kwargs)
+    columns = dict(columns)
+    columns["Bias"] = np.full(cell.repeats, cell.bias)
+    columns["Repeat"] = cell.chunk * chunk_size + np.arange(cell.repeats)
+    # шард появляется целиком или не появляется вовсе
+    return results_store.write_shard(out_dir, columns, shard_name(cell))
+
+
+def _check_manifest(out_dir, config):
+    """
+    Сверяет параметры свипа с манифестом каталога. Сетка (GRID_KEYS) может расширяться: шарды
+    адресуются ячейкой, а seed ячейки не зависит от остальной сетки, поэтому новые N или bias
+    просто дописываются в манифест. Остальные параметры (seed, повторы, модель) должны совпадать.
+    """
+    path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(path):
+        with open(path) as fh:
+            saved = json.load(fh)
+        conflicts = sorted(k for k in set(saved) | set(config) if k not in GRID_KEYS and saved.get(k) != config.get(k))
+        if conflicts:
+            raise ValueError(f"{out_dir} holds shards of a sweep with different {', '.join(conflicts)}: "
+                             f"{ {k: saved.get(k) for k in conflicts} }")
+        merged = {**saved, **{k: sorted(set(saved[k]) | set(config[k])) for k in GRID_KEYS}}
+        if merged == saved:
+            return
+    else:
+        merged = config
+    tmp = path + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump(merged, fh, indent=2)
+    os.replace(tmp, path)
+
+
+def run_sweep(N_values, biases=(15.0,), repeats=10, root_seed=42, workers=None,
+              out_dir="sweep_shards", chunk_size=100, cache=None, **engine_kwargs):
+    """
+    Параллельный свип по (N, f, bias, chunk) с возобновлением: уже записанные шарды не пересчитываются.
+    :param workers: число процессов (None — по числу ядер, 1 — без пула)
+    :param out_dir: каталог для шардов
+    :param cache: result_cache.ResultCache — ячейки, уже посчитанные любым свипом с той же конфигурацией,
+                  берутся из кэша (например, после добавления одного N в N_values)
+    :param engine_kwargs: параметры модели для monte_carlo.simulate_batch
+    :return: DataFrame со всеми испытаниями (для больших свипов — results_store.aggregate по out_dir)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    config = {
+        "N_values": list(N_values), "biases": [float(b) for b in biases], "repeats": repeats,
+        "root_seed": root_seed, "chunk_size": chunk_size, "engine": engine_kwargs,
+    }
+    _check_manifest(out_dir, config)
+
+    cells = build_cells(N_values, biases, repeats, chunk_size)
+    pending = [c for c in cells if not os.path.exists(shard_path(out_dir, c))]
+    print(f"{len(cells) - len(pending)}/{len(cells)} cells already done, {len(pending)} to run")
+
+    _execute(run_cell, pending, workers, root_seed, out_dir, chunk_size, engine_kwargs, cache)
+    return load_sweep(out_dir, cells)
+
+
+def _execute(fn, pending, workers, *args):
+    """Запускает fn(cell, *args) для всех ячеек: в пуле процессов или (workers=1) последовательно."""
+    if workers == 1:
+        for k, cell in enumerate(pending, 1):
+            fn(cell, *args)
+            print(f"[{k}/{len(pending)}] {cell}")
+    elif pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(fn, c, *args): c for c in pending}
+            for k, future in enumerate(as_completed(futures), 1):
+                future.result()
+                print(f"[{k}/{len(pending)}] {futures[future]}")
+
+
+def load_sweep(out_dir, cells):
+    """
+    Собирает шарды в один DataFrame в каноническом порядке ячеек.
+    """
+    df = results_store.read_results(out_dir, filters={"Num_Drones": sorted({c.N for c in cells})})
+    df = df[df["Bias"].isin({c.bias for c in cells})]  # каталог может хранить и другие bias расширенной сетки
+    df = df[list(SWEEP_COLUMNS)].astype({"Num_Drones": np.int64, "Num_Attacked": np.int64})
+    return df.sort_values(["Num_Drones", "Num_Attacked", "Bias", "Repeat"], ignore_index=True)
+
+
+def run_adaptive_cell(cell, root_seed, out_dir, tolerance, confidence, batch_size, min_repeats, engine_kwargs):
+    """
+    Ячейка с ранней остановкой: пачки по batch_size испытаний идут в онлайн-агрегаты, пока
+    доверительные интервалы всех метрик не станут уже tolerance (или не исчерпается cell.repeats).
+    Пишет одну строку агрегатов.
+    :return: путь к шарду
+    """
+    rng = np.random.default_rng(cell_seed(root_seed, cell))
+    aggregator = MetricAggregator()
+    while aggregator.count < cell.repeats:
+        size = min(batch_size, cell.repeats - aggregator.count)
+        aggregator.update(simulate_batch(cell.N, cell.f, size, rng=rng, bias=cell.bias, **engine_kwargs))
+        if aggregator.count >= min_repeats and aggregator.converged(tolerance, confidence):
+            break
+    row = {"Num_Drones": cell.N, "Num_Attacked": cell.f, "Bias": cell.bias,
+           **aggregator.summary(confidence), "Converged": aggregator.converged(tolerance, confidence)}
+    return results_store.write_shard(out_dir, {k: np.array([v]) for k, v in row.items()}, shard_name(cell))
+
+
+def run_adaptive_sweep(N_values, biases=(15.0,), tolerance=0.05, confidence=0.95, max_repeats=100_000,
+                       min_repeats=30, batch_size=100, root_seed=42, workers=None, out_dir="sweep_adaptive",
+                       **engine_kwargs):
+    """
+    Свип с онлайн-агрегацией и ранней остановкой по ширине доверительного интервала: вместо
+    фиксированного числа повторов каждая ячейка (N, f, bias) считается, пока не достигнет точности.
+    Хранится одна строка агрегатов на ячейку (O(1) памяти), возобновление — как у run_sweep.
+    :param tolerance: допустимая полуширина доверительного интервала средних MAE/RMSE, м
+    :param confidence: уровень доверия интервала
+    :param max_repeats: предел числа испытаний на ячейку
+    :param min_repeats: минимум испытаний до проверки остановки (оценка дисперсии по малой выборке ненадёжна)
+    :param batch_size: испытаний между проверками остановки
+    :return: DataFrame, одна строка на ячейку: <metric>_mean/_std/_ci/_p50/_p95, Repeats, Converged
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    config = {
+        "N_values": list(N_values), "biases": [float(b) for b in biases], "tolerance": tolerance,
+        "confidence": confidence, "max_repeats": max_repeats, "min_repeats": min_repeats,
+        "batch_size": batch_size, "root_seed": root_seed, "engine": engine_kwargs,
+    }
+    _check_manifest(out_dir, config)
+
+    # Одна ячейка на (N, f, bias): chunk = 0, repeats — верхний предел
+    cells = build_cells(N_values, biases, max_repeats, chunk_size=max_repeats)
+    pending = [c for c in cells if not os.path.exists(shard_path(out_dir, c))]
+    print(f"{len(cells) - len(pending)}/{len(cells)} cells already done, {len(pending)} to run")
+    _execute(run_adaptive_cell, pending, workers, root_seed, out_dir, tolerance, confidence, batch_size,
+             min_repeats, engine_kwargs)
+
+    df = results_store.read_results(out_dir, filters={"Num_Drones": sorted(set(N_values))})
+    df = df[df["Bias"].isin({float(b) for b in biases})]
+    df = df.astype({"Num_Drones": np.int64, "Num_Attacked": np.int64})
+    df = df[["Num_Drones", "Num_Attacked"] + [c for c in df.columns if c not in ("Num_Drones", "Num_Attacked")]]
+    return df.sort_values(["Num_Drones", "Num_Attacked", "Bias"], ignore_index=True)
+
+
+def main(argv=None, prog=None):
+    """CLI свипа; argv=None — аргументы командной строки (используется и `swarmraft sweep`)."""
+    parser = argparse.ArgumentParser(prog=prog, description="Parallel, resumable SwarmRaft attack sweep")
+    parser.add_argument("--n_values", type=int, nargs="+", default=[5, 10, 15])
+    parser.add_argument("--biases", type=float, nargs="+", default=[15.0])
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--chunk_size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out_dir", default="sweep_shards")
+    parser.add_argument("--csv", default="swarmraft_scaling_experiment.csv")
+    parser.add_argument("--cache_dir", default=None, help="content-addressed cache of finished cells shared by sweeps (fixed-repeat mode)")
+    parser.add_argument("--cache_gb", type=float, default=1.0, help="cache size limit before eviction")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="adaptive mode: stop each cell once its CI half-width (m) is below this; "
+                             "--repeats becomes the per-cell cap and one aggregate row is kept per cell")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--min_repeats", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    if args.tolerance is None:
+        df = run_sweep(args.n_values, args.biases, args.repeats, root_seed=args.seed, workers=args.workers,
+                       out_dir=args.out_dir, chunk_size=args.chunk_size,
+                       cache=None if args.cache_dir is None else ResultCache(args.cache_dir, args.cache_gb * 1e9))
+    else:
+        df = run_adaptive_sweep(args.n_values, args.biases, tolerance=args.tolerance, confidence=args.confidence,
+                                max_repeats=args.repeats, min_repeats=args.min_repeats, batch_size=args.chunk_size,
+                                root_seed=args.seed, workers=args.workers, out_dir=args.out_dir)
+    df.to_csv(args.csv, index=False)
+    print(f"\n✅ CSV saved as: {args.csv}")
+    print(df.head())
+    return 0
+
+
+if __name__ == "__main__":
+    main()
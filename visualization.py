@@ -0,0 +1,220 @@
+import itertools
+import os
+import subprocess
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# Слои рисунка: каждый — одна коллекция (PathCollection) на весь рой, а не scatter/text на дрон.
+# FAULT — тоже одна коллекция: маркер-надпись mathtext под восстановленной позицией.
+LAYERS = {
+    "true": dict(c="green", marker="o", s=100, label="True", zorder=1),
+    "ins": dict(c="red", marker="^", s=100, label="INS", zorder=2),
+    "recovered": dict(c="black", marker="*", s=120, label="Recovered", zorder=3),
+    "gnss": dict(c="blue", marker="x", s=140, linewidths=3, label="GNSS", zorder=4),
+    "fault": dict(c="crimson", marker="$FAULT$", s=900, linewidths=0.5, zorder=5),
+}
+LABEL_LIMIT = 50   # подписи D<id> — отдельные Text, поэтому только для небольших роёв
+FAULT_OFFSET = 1.0  # метка FAULT ниже позиции, м
+VIDEO_FORMATS = (".mp4", ".webm", ".mkv", ".avi")
+
+
+def _as_arrays(state, positions, faulty):
+    """Позиции и неисправные в виде массивов: словари/множества по ID из step_consensus или массивы."""
+    if isinstance(positions, dict):
+        positions = np.array([positions[i] for i in state.ids])
+    faulty_mask = np.zeros(state.n, dtype=bool)
+    if isinstance(faulty, np.ndarray) and faulty.dtype == bool:
+        faulty_mask[:] = faulty
+    elif faulty:
+        index = {drone_id: k for k, drone_id in enumerate(state.ids)}
+        faulty_mask[[index[i] for i in faulty]] = True
+    return np.asarray(positions, dtype=float), faulty_mask
+
+
+def marker_scale(n):
+    """Масштаб маркеров: для больших роёв точки уменьшаются, чтобы слои не сливались."""
+    return min(1.0, np.sqrt(LABEL_LIMIT / max(n, 1)))
+
+
+class SwarmPlot:
+    def __init__(self, ax, n, extent=None, labels=None, title="SwarmRaft Consensus & Recovery", animated=False):
+        """
+        Слои роя на осях ax; update() только меняет смещения коллекций.
+        :param ax: matplotlib Axes
+        :param n: число дронов (масштаб маркеров и подписи)
+        :param extent: (xmin, xmax, ymin, ymax); None — автомасштаб по первому кадру
+        :param labels: рисовать подписи D<id> (None — только при n <= LABEL_LIMIT)
+        :param title: заголовок
+        :param animated: артисты исключаются из обычной отрисовки (для блиттинга)
+        """
+        self.ax = ax
+        self.labels = n <= LABEL_LIMIT if labels is None else labels
+        scale = marker_scale(n)
+        empty = np.empty((0, 2))
+        self.layers = {}
+        for name, style in LAYERS.items():
+            style = dict(style, s=style["s"] * scale)
+            if "linewidths" in style:
+                style["linewidths"] = max(style["linewidths"] * scale, 0.5)
+            self.layers[name] = ax.scatter(empty[:, 0], empty[:, 1], animated=animated, **style)
+        self.texts = []
+        self._animated = animated
+        self._extent = extent
+        if extent is not None:
+            ax.set_xlim(*extent[:2])
+            ax.set_ylim(*extent[2:])
+        ax.set_title(title)
+        ax.set_xlabel("X Coordinate (m)")
+        ax.set_ylabel("Y Coordinate (m)")
+        ax.grid(True)
+        ax.set_aspect("equal", adjustable="datalim" if extent is None else "box")
+        ax.legend(loc="upper right")
+
+    @property
+    def artists(self):
+        return list(self.layers.values()) + self.texts
+
+    def update(self, state, positions, faulty):
+        """
+        Обновляет слои по шагу консенсуса.
+        :param state: SwarmState шага
+        :param positions: итоговые позиции: {id: позиция} или (N, d)
+        :param faulty: множество ID неисправных или маска (N,)
+        :return: список изменённых артистов
+        """
+        positions, faulty = _as_arrays(state, positions, faulty)
+        self.layers["true"].set_offsets(state.x_true[:, :2])
+        self.layers["ins"].set_offsets(state.x_ins[:, :2])
+        self.layers["recovered"].set_offsets(positions[:, :2])
+        self.layers["gnss"].set_offsets(state.z_gnss[:, :2])
+        self.layers["fault"].set_offsets(positions[faulty, :2] - [0.0, FAULT_OFFSET])
+        if self.labels:
+            if len(self.texts) != state.n:
+                for text in self.texts:
+                    text.remove()
+                self.texts = [self.ax.text(0, 0, f"D{i}", fontsize=9, zorder=5, animated=self._animated)
+                              for i in state.ids]
+            for text, (x, y) in zip(self.texts, state.x_true[:, :2] + 0.3):
+                text.set_position((x, y))
+        if self._extent is None:
+            points = np.concatenate([state.x_true, state.z_gnss, state.x_ins, positions])[:, :2]
+            self.ax.update_datalim(points)
+            self.ax.autoscale_view()
+        return self.artists
+
+
+def _figure(figsize=(8, 8), dpi=100):
+    """Фигура без pyplot: рендер Agg вне экрана, не зависит от выбранного бэкенда."""
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def frame_extent(state, positions, margin=0.1):
+    """Границы кадра по всем слоям с запасом margin (для анимации — фиксированный фон)."""
+    positions = np.array(list(positions.values())) if isinstance(positions, dict) else np.asarray(positions)
+    points = np.concatenate([state.x_true, state.z_gnss, state.x_ins, positions])[:, :2]
+    lo, hi = np.nanmin(points, axis=0), np.nanmax(points, axis=0)
+    pad = (hi - lo) * margin + FAULT_OFFSET
+    return lo[0] - pad[0], hi[0] + pad[0], lo[1] - pad[1], hi[1] + pad[1]
+
+
+def render(state, positions, faulty, path, title="SwarmRaft Consensus & Recovery", figsize=(8, 8), dpi=120,
+           extent=None, labels=None):
+    """
+    Рисунок одного шага консенсуса в файл (вне экрана, без pyplot).
+    :param path: файл изображения (формат по расширению)
+    :return: путь
+    """
+    fig = _figure(figsize, dpi)
+    plot = SwarmPlot(fig.add_subplot(), state.n, extent=extent, labels=labels, title=title)
+    plot.update(state, positions, faulty)
+    fig.savefig(path)
+    return path
+
+
+class _FrameSink:
+    """
+    Приёмник RGBA-кадров: видео через ffmpeg (кадры идут в pipe, не копятся), GIF через Pillow
+    (кадры в памяти с палитрой, 1 байт на пиксель) или каталог PNG.
+    """
+
+    def __init__(self, path, size, fps):
+        self.path = path
+        self.size = size
+        self.fps = fps
+        self.count = 0
+        ext = os.path.splitext(path)[1].lower()
+        self._process = None
+        self._gif = None
+        if ext in VIDEO_FORMATS:
+            width, height = size
+            command = ["ffmpeg", "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgba",
+                       "-s", f"{width}x{height}", "-r", str(fps), "-i", "-", "-pix_fmt", "yuv420p", path]
+            try:
+                self._process = subprocess.Popen(command, stdin=subprocess.PIPE)
+            except FileNotFoundError as exc:
+                raise RuntimeError(f"exporting {ext} requires ffmpeg on PATH; use .gif or a directory") from exc
+        elif ext == ".gif":
+            self._gif = []
+        else:
+            os.makedirs(path, exist_ok=True)
+
+    def write(self, rgba):
+        if self._process is not None:
+            self._process.stdin.write(rgba.tobytes())
+        elif self._gif is not None:
+            from PIL import Image
+
+            self._gif.append(Image.fromarray(rgba[..., :3]).quantize(colors=64))
+        else:
+            from PIL import Image
+
+            Image.fromarray(rgba).save(os.path.join(self.path, f"frame_{self.count:05d}.png"))
+        self.count += 1
+
+    def close(self):
+        if self._process is not None:
+            self._process.stdin.close()
+            if self._process.wait() != 0:
+                raise RuntimeError(f"ffmpeg failed writing {self.path}")
+        elif self._gif:
+            self._gif[0].save(self.path, save_all=True, append_images=self._gif[1:],
+                              duration=int(1000 / self.fps), loop=0)
+
+
+def export_animation(frames, path, fps=10, extent=None, figsize=(8, 8), dpi=100, labels=False,
+                     title="SwarmRaft Consensus & Recovery"):
+    """
+    Анимация по эпохам с блиттингом: фон (оси, сетка, легенда) рисуется один раз, в каждом кадре
+    восстанавливается из буфера и поверх перерисовываются только слои роя.
+    :param frames: итерируемое (state, positions, faulty) по эпохам (например, генератор recording.replay)
+    :param path: .mp4/.webm/.mkv/.avi (нужен ffmpeg), .gif или каталог PNG-кадров
+    :param fps: кадров в секунду
+    :param extent: границы кадра (None — по первому кадру, см. frame_extent)
+    :param labels: подписи D<id> (для больших роёв выключены)
+    :return: число записанных кадров
+    """
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        return 0
+    fig = _figure(figsize, dpi)
+    plot = SwarmPlot(fig.add_subplot(), first[0].n, extent=extent or frame_extent(first[0], first[1]),
+                     labels=labels, title=title, animated=True)
+    canvas = fig.canvas
+    canvas.draw()  # фон без animated-артистов
+    background = canvas.copy_from_bbox(fig.bbox)
+    sink = _FrameSink(path, canvas.get_width_height(), fps)
+    try:
+        for state, positions, faulty in itertools.chain([first], frames):
+            canvas.restore_region(background)
+            for artist in plot.update(state, positions, faulty):
+                plot.ax.draw_artist(artist)
+            sink.write(np.asarray(canvas.buffer_rgba()))
+    finally:
+        sink.close()
+    return sink.count
+
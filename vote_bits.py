@@ -0,0 +1,134 @@
+import numpy as np
+
+WORD_BITS = 64
+WORD = np.dtype("<u8")  # бит b слова w — столбец 64 * w + b
+
+_POPCOUNT8 = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+
+def popcount(words):
+    """
+    Число единичных бит в каждом слове uint64. np.bitwise_count (NumPy >= 2.0) или таблица по байтам.
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    as_bytes = np.ascontiguousarray(words).view(np.uint8)
+    return _POPCOUNT8[as_bytes].reshape(*words.shape, 8).sum(axis=-1, dtype=np.uint8)
+
+
+def n_words(width):
+    return (width + WORD_BITS - 1) // WORD_BITS
+
+
+def pack_bits(mask):
+    """
+    Булева матрица (N, K) -> слова (N, ceil(K / 64)) uint64.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    n, width = mask.shape
+    packed = np.packbits(mask, axis=1, bitorder="little")
+    padded = np.zeros((n, n_words(width) * 8), dtype=np.uint8)
+    padded[:, :packed.shape[1]] = packed
+    return padded.view(WORD)
+
+
+def unpack_bits(words, width):
+    """Слова (N, W) uint64 -> булева матрица (N, width)."""
+    words = np.ascontiguousarray(words, dtype=WORD)
+    return np.unpackbits(words.view(np.uint8), axis=1, count=width, bitorder="little").astype(bool)
+
+
+def fault_rule(cast, negative, f):
+    """
+    Правило SwarmRaft по счётчикам голосов: сумма <= -max(участники - f, 1), участники = поданные + 1.
+    :return: булева маска той же формы, что и cast
+    """
+    return cast - 2 * negative <= -np.maximum(cast + 1 - np.asarray(f), 1)
+
+
+class PackedVotes:
+    def __init__(self, cast, negative, width):
+        """
+        Матрица голосов в двух битовых плоскостях по 64 голоса в слове: cast — голос подан (±1),
+        negative — голос «против». 2 бита на пару вместо int8/int64; подсчёт — popcount по словам.
+        :param cast: (N, W) uint64
+        :param negative: (N, W) uint64, подмножество бит cast
+        :param width: число столбцов исходной матрицы (K)
+        """
+        self.cast = cast
+        self.negative = negative
+        self.width = width
+
+    @classmethod
+    def empty(cls, n, width):
+        shape = (n, n_words(width))
+        return cls(np.zeros(shape, dtype=WORD), np.zeros(shape, dtype=WORD), width)
+
+    @classmethod
+    def from_matrix(cls, votes):
+        """
+        :param votes: матрица (N, K) со значениями -1, 0, 1
+        """
+        votes = np.asarray(votes)
+        return cls(pack_bits(votes != 0), pack_bits(votes < 0), votes.shape[1])
+
+    @property
+    def shape(self):
+        return self.cast.shape[0], self.width
+
+    @property
+    def nbytes(self):
+        return self.cast.nbytes + self.negative.nbytes
+
+    def set_rows(self, start, votes):
+        """Перезаписывает строки start .. start + len(votes) блоком голосов (N_block, K)."""
+        stop = start + len(votes)
+        self.cast[start:stop] = pack_bits(votes != 0)
+        self.negative[start:stop] = pack_bits(votes < 0)
+
+    def set_pairs(self, rows, cols, votes):
+        """
+        Точечное обновление голосов пар (rows[k], cols[k]) без распаковки строк.
+        """
+        rows, cols, votes = np.asarray(rows), np.asarray(cols), np.asarray(votes)
+        words = cols // WORD_BITS
+        bits = np.left_shift(np.uint64(1), (cols % WORD_BITS).astype(np.uint64))
+        for plane, on in ((self.cast, votes != 0), (self.negative, votes < 0)):
+            np.bitwise_and.at(plane, (rows, words), ~bits)
+            np.bitwise_or.at(plane, (rows[on], words[on]), bits[on])
+
+    def select(self, mask):
+        """
+        Голоса только из выбранных столбцов (например, наблюдателей одного кластера).
+        :param mask: булева маска (K,) или (N, K); False — голос отбрасывается
+        :return: PackedVotes той же формы
+        """
+        mask = np.asarray(mask, dtype=bool)
+        words = pack_bits(np.atleast_2d(mask))
+        return PackedVotes(self.cast & words, self.negative & words, self.width)
+
+    def to_matrix(self):
+        """Распаковка в матрицу (N, K) int8 со значениями -1, 0, 1."""
+        cast = unpack_bits(self.cast, self.width)
+        negative = unpack_bits(self.negative, self.width)
+        return cast.astype(np.int8) - 2 * negative.astype(np.int8)
+
+    def counts(self):
+        """
+        :return: (поданные голоса, голоса против) по строкам, два массива (N,) int64
+        """
+        return (popcount(self.cast).sum(axis=1, dtype=np.int64),
+                popcount(self.negative).sum(axis=1, dtype=np.int64))
+
+    def totals(self):
+        """Сумма голосов строки: (+1) * за + (-1) * против = поданные - 2 * против."""
+        cast, negative = self.counts()
+        return cast - 2 * negative
+
+    def faulty_rows(self, f):
+        """
+        Правило SwarmRaft без распаковки (см. fault_rule).
+        :param f: макс. число неисправных узлов (скаляр или массив (N,))
+        :return: булева маска (N,)
+        """
+        return fault_rule(*self.counts(), f)